@@ -0,0 +1,377 @@
+"""
+Benchmarks for this harness.
+
+These measure how long the harness takes to create, use and destroy
+clusters, rather than how DC/OS behaves.
+Results are written as JSON so that they can be compared between runs.
+
+Run ``python benchmarks/benchmark_harness.py --help`` for options.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from dcos_e2e.cluster import (
+    Backends,
+    Cluster,
+    Transports,
+    wait_for_teardown,
+)
+from dcos_e2e.nodes import run_on_nodes
+from dcos_e2e.timing import PhaseTiming
+
+LOGGER = logging.getLogger(__name__)
+
+# Phases of a cluster's lifecycle which are reported by the ``lifecycle``
+# benchmark.
+_LIFECYCLE_PHASES = (
+    'prepare',
+    'make_start',
+    'make_genconf',
+    'make_install',
+    'wait_for_nodes',
+    'discover_nodes',
+    'destroy',
+)
+
+
+def _summary(samples: List[float]) -> Dict[str, Any]:
+    """
+    Return summary statistics of samples, in seconds.
+    """
+    return {
+        'samples': samples,
+        'count': len(samples),
+        'min': min(samples),
+        'max': max(samples),
+        'mean': statistics.mean(samples),
+        'median': statistics.median(samples),
+    }
+
+
+def _result(
+    benchmark: str,
+    parameters: Dict[str, Any],
+    samples: List[float],
+) -> Dict[str, Any]:
+    """
+    Return a record of the samples taken by a benchmark.
+    """
+    result = {
+        'benchmark': benchmark,
+        'parameters': parameters,
+    }  # type: Dict[str, Any]
+    result.update(_summary(samples=samples))
+    LOGGER.info(
+        '%s %s: median %.3f seconds over %d samples.',
+        benchmark,
+        json.dumps(parameters, sort_keys=True),
+        result['median'],
+        result['count'],
+    )
+    return result
+
+
+def _time(function: Callable[[], Any]) -> float:
+    """
+    Return the number of seconds taken to call a function.
+    """
+    start = time.monotonic()
+    function()
+    return time.monotonic() - start
+
+
+def _add_phase_durations(
+    phases: Dict[str, List[float]],
+    timings: List[PhaseTiming],
+) -> None:
+    """
+    Add the durations of lifecycle phases to a mapping of phase names to
+    durations.
+    """
+    for timing in timings:
+        if timing.phase in _LIFECYCLE_PHASES:
+            phases.setdefault(timing.phase, []).append(timing.duration)
+
+
+def benchmark_lifecycle(
+    backend: Backends,
+    repeat: int,
+) -> List[Dict[str, Any]]:
+    """
+    Measure the time taken to create, discover the nodes of and destroy a
+    cluster with one node of each role.
+
+    Args:
+        backend: The backend to create clusters with.
+        repeat: The number of clusters to create.
+
+    Returns:
+        One result for the whole lifecycle and one result for each phase.
+    """
+    totals = []  # type: List[float]
+    phases = {}  # type: Dict[str, List[float]]
+
+    for _ in range(repeat):
+        timings = []  # type: List[PhaseTiming]
+        start = time.monotonic()
+        with Cluster(backend=backend, on_phase=timings.append) as cluster:
+            # Accessing nodes for the first time discovers them.
+            cluster.masters  # pylint: disable=pointless-statement
+        # Clusters are destroyed in the background, and the destroy phase is
+        # only recorded once the teardown is finished.
+        wait_for_teardown()
+        totals.append(time.monotonic() - start)
+        _add_phase_durations(phases=phases, timings=timings)
+
+    results = [
+        _result(benchmark='lifecycle', parameters={}, samples=totals),
+    ]
+    for phase, samples in sorted(phases.items()):
+        results.append(
+            _result(
+                benchmark='lifecycle_phase',
+                parameters={'phase': phase},
+                samples=samples,
+            )
+        )
+    return results
+
+
+def benchmark_run_as_root(
+    backend: Backends,
+    repeat: int,
+) -> List[Dict[str, Any]]:
+    """
+    Measure the latency of running a trivial command on a node, over SSH
+    with and without reusing connections, and with ``docker exec``.
+
+    Args:
+        backend: The backend to create clusters with.
+        repeat: The number of commands to run for each setting.
+
+    Returns:
+        One result for each setting of ``transport`` and
+        ``reuse_ssh_connections``.
+        Fake clusters always use ``docker exec``, so only that setting is
+        measured on them.
+    """
+    settings = [
+        (Transports.SSH, False),
+        (Transports.SSH, True),
+        (Transports.DOCKER_EXEC, False),
+    ]
+    if backend == Backends.FAKE:
+        # SSH settings are ignored by fake clusters, and results labelled
+        # with them would really be for ``docker exec``.
+        settings = [(Transports.DOCKER_EXEC, False)]
+    results = []
+    for transport, reuse_ssh_connections in settings:
+        with Cluster(
+            agents=0,
+            public_agents=0,
+            backend=backend,
+            reuse_ssh_connections=reuse_ssh_connections,
+            transport=transport,
+        ) as cluster:
+            (master, ) = cluster.masters
+            samples = [
+                _time(partial(master.run_as_root, args=['true']))
+                for _ in range(repeat)
+            ]
+        results.append(
+            _result(
+                benchmark='run_as_root',
+                parameters={
+                    'transport': transport.name,
+                    'reuse_ssh_connections': reuse_ssh_connections,
+                },
+                samples=samples,
+            )
+        )
+    return results
+
+
+def benchmark_batch(
+    backend: Backends,
+    repeat: int,
+    commands: int=10,
+) -> List[Dict[str, Any]]:
+    """
+    Measure the time taken to run many trivial commands on a node, one at a
+    time with ``run_as_root`` and all at once with ``run_batch``.
+
+    Args:
+        backend: The backend to create clusters with.
+        repeat: The number of times to run the commands each way.
+        commands: The number of commands to run.
+
+    Returns:
+        One result for each way of running the commands.
+    """
+    args = [['true']] * commands
+    with Cluster(agents=0, public_agents=0, backend=backend) as cluster:
+        (master, ) = cluster.masters
+        one_at_a_time = [
+            _time(lambda: [master.run_as_root(args=arg) for arg in args])
+            for _ in range(repeat)
+        ]
+        batched = [
+            _time(lambda: master.run_batch(commands=args))
+            for _ in range(repeat)
+        ]
+
+    return [
+        _result(
+            benchmark='batch',
+            parameters={'commands': commands, 'batched': False},
+            samples=one_at_a_time,
+        ),
+        _result(
+            benchmark='batch',
+            parameters={'commands': commands, 'batched': True},
+            samples=batched,
+        ),
+    ]
+
+
+def benchmark_fan_out(
+    backend: Backends,
+    repeat: int,
+    agent_counts: List[int],
+) -> List[Dict[str, Any]]:
+    """
+    Measure the time taken to run a trivial command on every node of
+    clusters of different sizes.
+
+    Args:
+        backend: The backend to create clusters with.
+        repeat: The number of times to run the command on all nodes of each
+            cluster.
+        agent_counts: The numbers of agents of the clusters to create.
+
+    Returns:
+        One result for each cluster size. Each result includes the number of
+        commands run per second.
+    """
+    results = []
+    for agents in agent_counts:
+        with Cluster(
+            agents=agents,
+            public_agents=0,
+            backend=backend,
+            reuse_ssh_connections=True,
+        ) as cluster:
+            nodes = cluster.masters | cluster.agents
+            samples = [
+                _time(
+                    partial(run_on_nodes, nodes=nodes, args=['true']),
+                ) for _ in range(repeat)
+            ]
+        result = _result(
+            benchmark='fan_out',
+            parameters={'nodes': len(nodes)},
+            samples=samples,
+        )
+        result['commands_per_second'] = len(nodes) / result['median']
+        results.append(result)
+    return results
+
+
+def main(argv: Optional[List[str]]=None) -> int:
+    """
+    Run benchmarks and write their results.
+
+    Args:
+        argv: The arguments to this script. By default, the arguments given
+            on the command line.
+
+    Returns:
+        The exit code of this script.
+    """
+    backend_names = [backend.name for backend in Backends.iterconstants()]
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--backend',
+        choices=backend_names,
+        default=Backends.DCOS_DOCKER.name,
+        help='The backend to create clusters with.',
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        help='The number of samples to take for each measurement.',
+    )
+    parser.add_argument(
+        '--agent-counts',
+        type=int,
+        nargs='+',
+        default=[1, 3],
+        help='The numbers of agents to measure fan out across.',
+    )
+    parser.add_argument(
+        '--benchmark',
+        dest='benchmarks',
+        action='append',
+        choices=['lifecycle', 'run_as_root', 'batch', 'fan_out'],
+        help='A benchmark to run. By default, all benchmarks are run.',
+    )
+    parser.add_argument(
+        '--output',
+        type=Path,
+        help='A file to write JSON results to. By default, results are '
+        'written to stdout.',
+    )
+    args = parser.parse_args(argv)
+
+    # ``dcos_e2e`` configures logging at the debug level when it is
+    # imported, so ``basicConfig`` would do nothing.
+    logging.getLogger().setLevel(logging.INFO)
+    backend = Backends.lookupByName(args.backend)
+    benchmarks = args.benchmarks or [
+        'lifecycle',
+        'run_as_root',
+        'batch',
+        'fan_out',
+    ]
+
+    results = []  # type: List[Dict[str, Any]]
+    if 'lifecycle' in benchmarks:
+        results += benchmark_lifecycle(backend=backend, repeat=args.repeat)
+    if 'run_as_root' in benchmarks:
+        results += benchmark_run_as_root(backend=backend, repeat=args.repeat)
+    if 'batch' in benchmarks:
+        results += benchmark_batch(backend=backend, repeat=args.repeat)
+    if 'fan_out' in benchmarks:
+        results += benchmark_fan_out(
+            backend=backend,
+            repeat=args.repeat,
+            agent_counts=args.agent_counts,
+        )
+
+    report = {
+        'backend': args.backend,
+        'created': time.time(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'results': results,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output is None:
+        print(output)
+    else:
+        args.output.write_text(output + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
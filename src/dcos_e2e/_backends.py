@@ -0,0 +1,105 @@
+"""
+The backends which clusters can be created with.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from constantly import NamedConstant, Names
+
+from ._common import Transports
+from ._dcos_docker import DCOS_Docker
+from ._fake import Fake
+from .genconf_cache import GenconfCache
+from .timing import PhaseTimer
+
+
+class UnsupportedClusterBackend(Exception):
+    """
+    Raised if an unsupported cluster backend is given.
+    """
+
+
+class Backends(Names):
+    """
+    Constants representing various ``Cluster`` backends.
+    """
+
+    DCOS_DOCKER = NamedConstant()
+    FAKE = NamedConstant()
+
+
+def create_backend(
+    backend: Backends,
+    masters: int,
+    agents: int,
+    public_agents: int,
+    extra_config: Optional[Dict[str, Any]],
+    custom_ca_key: Optional[Path],
+    log_output_live: bool,
+    files_to_copy_to_installer: Optional[Dict[Path, Path]],
+    reuse_ssh_connections: bool,
+    genconf_cache: Optional[GenconfCache],
+    timer: PhaseTimer,
+    transport: Transports=Transports.SSH,
+) -> Union[DCOS_Docker, Fake]:
+    """
+    Prepare to create a cluster with the given backend.
+
+    No nodes are created until the backend's ``create_containers`` method is
+    called.
+
+    Args:
+        backend: The backend to use for creating a cluster.
+        masters: The number of master nodes to create.
+        agents: The number of agent nodes to create.
+        public_agents: The number of public agent nodes to create.
+        extra_config: Extra installation configuration variables to add to
+            the backend's base configuration, or `None` for none.
+        custom_ca_key: A CA key to use as the cluster's root CA key.
+        log_output_live: If `True`, log output of subprocesses live.
+        files_to_copy_to_installer: A mapping of host paths to paths on the
+            installer node, or `None` for no files.
+        reuse_ssh_connections: If `True`, commands run on a node share one
+            SSH connection.
+        genconf_cache: A cache of configuration generation output, or `None`
+            to not use a cache.
+        timer: A record of how long each phase of the cluster's lifecycle
+            takes.
+        transport: The way to run commands on nodes.
+
+    Installation options are ignored by the fake backend.
+    See ``Cluster`` for details of each option.
+
+    Raises:
+        UnsupportedClusterBackend: An unsupported `backend` was chosen.
+    """
+    if backend == Backends.FAKE:
+        # Fake nodes do not run DC/OS, so installation options are ignored.
+        # They do not run SSH servers, so commands are always run with
+        # ``docker exec``.
+        return Fake(
+            masters=masters,
+            agents=agents,
+            public_agents=public_agents,
+            timer=timer,
+        )
+
+    if backend == Backends.DCOS_DOCKER:
+        return DCOS_Docker(
+            masters=masters,
+            agents=agents,
+            public_agents=public_agents,
+            extra_config=dict(extra_config or {}),
+            generate_config_path=Path('/tmp/dcos_generate_config.sh'),
+            dcos_docker_path=Path('/tmp/dcos-docker'),
+            custom_ca_key=custom_ca_key,
+            log_output_live=log_output_live,
+            files_to_copy_to_installer=dict(files_to_copy_to_installer or {}),
+            reuse_ssh_connections=reuse_ssh_connections,
+            genconf_cache=genconf_cache,
+            timer=timer,
+            transport=transport,
+        )
+
+    raise UnsupportedClusterBackend()
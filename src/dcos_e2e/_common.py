@@ -2,55 +2,146 @@
 Common utilities for end to end tests.
 """
 
+import asyncio
+import base64
+import fcntl
 import logging
+import os
+import shlex
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from ipaddress import IPv4Address
-from pathlib import Path
+from pathlib import Path, PurePosixPath
+from shutil import copyfileobj
 from subprocess import (
+    DEVNULL,
     PIPE,
     STDOUT,
     CalledProcessError,
     CompletedProcess,
     Popen,
+    run,
 )
-from typing import List, Optional, Union
+from threading import Lock, Thread
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    MutableSequence,
+    Optional,
+    Set,
+    Union,
+)
+
+from constantly import NamedConstant, Names
+
+from .timing import PhaseTimer
 
 logging.basicConfig(level=logging.DEBUG)
 LOGGER = logging.getLogger(__name__)
 
+# Only this many of the last lines of the error output of processes which
+# stream data are kept, for error reporting.
+_STREAMING_STDERR_LINES = 1000
 
-class Node:
+# Each line of the output of a batch script which starts with this describes
+# the result of one command.
+_BATCH_RESULT_MARKER = 'dcos-e2e-batch-result'
+
+# Integration test output can be very long.
+# Only this many of the last lines are kept in memory, which includes the
+# summary of test results.
+INTEGRATION_TEST_OUTPUT_LINES = 10000
+
+
+class UnsupportedOperation(Exception):
     """
-    A record of a DC/OS cluster node.
+    Raised if an operation on a cluster is not supported by the cluster's
+    backend.
+    """
+
+
+class Transports(Names):
+    """
+    Constants representing ways of running commands on nodes.
+    """
+
+    # Commands are run over SSH.
+    SSH = NamedConstant()
+    # Commands are run with ``docker exec``, for nodes which are containers
+    # on this host.
+    DOCKER_EXEC = NamedConstant()
+
+
+class Transport:
+    """
+    A way of running commands on a node.
+    """
+
+    def command_args(self, args: List[str]) -> List[str]:
+        """
+        Return the arguments for a local process which runs a command on the
+        node as ``root``.
+
+        Args:
+            args: The command to run on the node. The arguments are joined
+                with spaces and run by a shell on the node.
+        """
+        raise NotImplementedError
+
+    async def command_args_async(self, args: List[str]) -> List[str]:
+        """
+        Return the arguments for a local process which runs a command on the
+        node as ``root``, without blocking the event loop.
+
+        See ``command_args``.
+        """
+        return self.command_args(args=args)
+
+    def close(self) -> None:
+        """
+        Close any persistent connection to the node.
+        """
+
+
+class SSHTransport(Transport):
+    """
+    Runs commands on a node over SSH.
     """
 
-    def __init__(self, ip_address: IPv4Address, ssh_key_path: Path) -> None:
+    def __init__(
+        self,
+        ip_address: IPv4Address,
+        ssh_key_path: Path,
+        ssh_control_directory: Optional[Path]=None,
+    ) -> None:
         """
         Args:
             ip_address: The IP address of the node.
             ssh_key_path: The path to an SSH key which can be used to SSH to
                 the node as the `root` user.
+            ssh_control_directory: A directory in which to keep sockets for
+                persistent SSH connections. If this is `None`, a new SSH
+                connection is made for each command.
         """
         self._ip_address = ip_address
         self._ssh_key_path = ssh_key_path
+        self._ssh_control_directory = ssh_control_directory
+        self._master_lock = Lock()
+        # A master connection which is being started from an event loop.
+        self._master_start = None  # type: Optional[asyncio.Future]
 
-    def run_as_root(self, args: List[str],
-                    log_output_live: bool=False) -> CompletedProcess:
+    def _ssh_args(self) -> List[str]:
         """
-        Run a command on this node as ``root``.
-
-        Args:
-            args: The command to run on the node.
-            log_output_live: If `True`, log output live. If `True`, stderr is
-                merged into stdout in the return value.
-
-        Returns:
-            The representation of the finished process.
-
-        Raises:
-            CalledProcessError: The process exited with a non-zero code.
+        Return SSH options which are used for every connection to the node.
         """
-        ssh_args = [
-            'ssh',
+        return [
             # Suppress warnings.
             # In particular, we don't care about remote host identification
             # changes.
@@ -67,25 +158,686 @@ class Node:
             # Bypass password checking.
             "-o",
             "PreferredAuthentications=publickey",
+        ]
+
+    def _control_path(self) -> Path:
+        """
+        Return the path to the socket of the master connection to the node.
+        """
+        assert self._ssh_control_directory is not None
+        # Socket paths are limited to around 100 characters, so we use a
+        # short name.
+        return self._ssh_control_directory / 'root@{ip_address}:22'.format(
+            ip_address=self._ip_address,
+        )
+
+    def _ssh_control_args(self, master: str='no') -> List[str]:
+        """
+        Return SSH options which make SSH share one connection to the node
+        between commands.
+
+        Args:
+            master: The ``ControlMaster`` setting to use.
+        """
+        if self._ssh_control_directory is None:
+            return []
+
+        return [
+            "-o",
+            "ControlMaster={master}".format(master=master),
+            "-o",
+            "ControlPath={control_path}".format(
+                control_path=self._control_path(),
+            ),
+            # Keep the master connection open while it is not used.
+            # The connection is closed explicitly when the cluster is
+            # destroyed, and this timeout cleans up if that does not happen.
+            "-o",
+            "ControlPersist=600",
+        ]
+
+    def _start_master(self) -> None:
+        """
+        Start a master connection to the node in the background if there is
+        not one.
+
+        The master connection is started by its own process, with its output
+        discarded.
+        If the first command started the master connection instead, the
+        master connection would keep that command's output pipes open, and
+        reading its output would not finish until the master connection
+        closed.
+
+        If the master connection cannot be started, such as while the node
+        is starting, commands make their own connections.
+        """
+        if self._ssh_control_directory is None:
+            return
+
+        with self._master_lock:
+            if self._control_path().exists():
+                return
+            run(
+                args=self._master_args(),
+                stdin=DEVNULL,
+                stdout=DEVNULL,
+                stderr=DEVNULL,
+            )
+
+    def _master_args(self) -> List[str]:
+        """
+        Return the arguments to start a master connection to the node.
+        """
+        return ['ssh'] + self._ssh_args() + self._ssh_control_args(
+            master='yes',
+        ) + [
+            # Do not run a command, and go to the background once
+            # connected.
+            '-N',
+            '-f',
+            str(self._ip_address),
+        ]
+
+    async def _start_master_async(self) -> None:
+        """
+        Start a master connection to the node in the background if there is
+        not one, without blocking the event loop.
+
+        See ``_start_master``.
+        """
+        if self._ssh_control_directory is None:
+            return
+        if self._control_path().exists():
+            return
+
+        # Commands which are run at once wait for the same master
+        # connection to start, rather than each starting one.
+        if self._master_start is None:
+
+            async def start() -> None:
+                """
+                Start the master connection.
+                """
+                process = await asyncio.create_subprocess_exec(
+                    *self._master_args(),
+                    stdin=DEVNULL,
+                    stdout=DEVNULL,
+                    stderr=DEVNULL
+                )
+                await process.wait()
+
+            self._master_start = asyncio.ensure_future(start())
+        master_start = self._master_start
+        try:
+            await asyncio.shield(master_start)
+        finally:
+            if self._master_start is master_start and master_start.done():
+                self._master_start = None
+
+    def close(self) -> None:
+        """
+        Close any persistent SSH connection to the node.
+        """
+        if self._ssh_control_directory is None:
+            return
+
+        args = ['ssh', '-q'] + self._ssh_control_args() + [
+            '-O',
+            'exit',
+            '-l',
+            'root',
+            str(self._ip_address),
+        ]
+        try:
+            run_subprocess(args=args, log_output_live=False)
+        except CalledProcessError:
+            # There is no master connection to close.
+            pass
+
+    def command_args(self, args: List[str]) -> List[str]:
+        """
+        Return the arguments for a local process which runs a command on the
+        node as ``root``.
+
+        If connections are shared, a master connection is started first.
+
+        Args:
+            args: The command to run on the node.
+        """
+        self._start_master()
+        return self._ssh_command_args(args=args)
+
+    async def command_args_async(self, args: List[str]) -> List[str]:
+        """
+        Return the arguments for a local process which runs a command on the
+        node as ``root``.
+
+        If connections are shared, a master connection is started first
+        without blocking the event loop.
+
+        Args:
+            args: The command to run on the node.
+        """
+        await self._start_master_async()
+        return self._ssh_command_args(args=args)
+
+    def _ssh_command_args(self, args: List[str]) -> List[str]:
+        """
+        Return the arguments for an SSH client which runs a command on the
+        node as ``root``.
+        """
+        return ['ssh'] + self._ssh_args() + self._ssh_control_args() + [
             str(self._ip_address),
         ] + args
 
-        return run_subprocess(args=ssh_args, log_output_live=log_output_live)
+
+class DockerExecTransport(Transport):
+    """
+    Runs commands on a node which is a container on this host, with
+    ``docker exec``.
+
+    This avoids making an SSH connection for each command.
+    """
+
+    def __init__(self, container_name: str) -> None:
+        """
+        Args:
+            container_name: The name of the node's container.
+        """
+        self._container_name = container_name
+
+    def command_args(self, args: List[str]) -> List[str]:
+        """
+        Return the arguments for a local process which runs a command on the
+        node as ``root``.
+
+        Like SSH, the arguments are joined with spaces and run by a shell.
+        This means that commands such as ``['echo', '$USER']`` behave the same
+        with either transport.
+
+        Args:
+            args: The command to run on the node.
+        """
+        return [
+            'docker',
+            'exec',
+            # Input is passed to the command, for example when files are
+            # sent to the node.
+            '--interactive',
+            '--user',
+            'root',
+            # SSH sets these variables and some commands rely on them.
+            '--env',
+            'USER=root',
+            '--env',
+            'HOME=/root',
+            self._container_name,
+            '/bin/bash',
+            '-c',
+            ' '.join(args),
+        ]
+
+
+class Node:
+    """
+    A record of a DC/OS cluster node.
+    """
+
+    def __init__(
+        self,
+        ip_address: IPv4Address,
+        transport: Transport,
+        timer: Optional[PhaseTimer]=None,
+    ) -> None:
+        """
+        Args:
+            ip_address: The IP address of the node.
+            transport: The way to run commands on the node.
+            timer: A record of how long commands run on this node take.
+        """
+        self._ip_address = ip_address
+        self._transport = transport
+        self._timer = timer or PhaseTimer()
+
+    def __eq__(self, other: Any) -> bool:
+        """
+        ``Node``s are equal if they have the same IP address.
+
+        A cluster's nodes may be found again, for example after agents are
+        added, and nodes which were found before are the same machines.
+        """
+        if not isinstance(other, Node):
+            return NotImplemented
+        return self._ip_address == other._ip_address
+
+    def __hash__(self) -> int:
+        """
+        ``Node``s which are equal have the same hash.
+        """
+        return hash(self._ip_address)
+
+    @property
+    def ip_address(self) -> IPv4Address:
+        """
+        Return the IP address of this node.
+        """
+        return self._ip_address
+
+    def close_connection(self) -> None:
+        """
+        Close any persistent connection to this node.
+        """
+        self._transport.close()
+
+    def command_args(self, args: List[str]) -> List[str]:
+        """
+        Return the arguments for a local process which runs a command on this
+        node as ``root``.
+
+        Args:
+            args: The command to run on the node.
+        """
+        return self._transport.command_args(args=args)
+
+    async def command_args_async(self, args: List[str]) -> List[str]:
+        """
+        Return the arguments for a local process which runs a command on this
+        node as ``root``, without blocking the event loop.
+
+        Args:
+            args: The command to run on the node.
+        """
+        return await self._transport.command_args_async(args=args)
+
+    def run_as_root(
+        self,
+        args: List[str],
+        log_output_live: bool=False,
+        output_callback: Optional[Callable[[str], None]]=None,
+        max_output_lines: Optional[int]=None,
+    ) -> CompletedProcess:
+        """
+        Run a command on this node as ``root``.
+
+        Args:
+            args: The command to run on the node.
+            log_output_live: If `True`, log output live. If `True`, stderr is
+                merged into stdout in the return value.
+            output_callback: A function to call with each line of output, as
+                text without its line ending, as soon as it is produced.
+            max_output_lines: The maximum number of lines of each of stdout
+                and stderr to keep in memory. If there are more lines, only
+                the last lines are in the return value or the raised error.
+                If this is `None`, all output is kept.
+
+        Returns:
+            The representation of the finished process.
+
+        Raises:
+            CalledProcessError: The process exited with a non-zero code.
+        """
+        with self._timer.phase('run_as_root'):
+            return run_subprocess(
+                args=self.command_args(args=args),
+                log_output_live=log_output_live,
+                output_callback=output_callback,
+                max_output_lines=max_output_lines,
+            )
+
+    def run_batch(
+        self,
+        commands: Iterable[List[str]],
+        stop_on_failure: bool=False,
+    ) -> List[CompletedProcess]:
+        """
+        Run many commands on this node as ``root``, one after another, with
+        one connection.
+
+        Each command is run as it would be by ``run_as_root``, in its own
+        shell and with no input.
+
+        Args:
+            commands: The commands to run on the node.
+            stop_on_failure: If `True`, commands after the first command
+                which exits with a non-zero code are not run.
+
+        Returns:
+            The result of each command which was run, in order. Commands
+            which exit with a non-zero code do not raise an exception.
+
+        Raises:
+            CalledProcessError: The commands could not be run.
+        """
+        commands = list(commands)
+        script = _batch_script(
+            commands=commands,
+            stop_on_failure=stop_on_failure,
+        )
+        output = []  # type: List[bytes]
+
+        def write_script(stream: IO[bytes]) -> None:
+            """
+            Write the batch script to a stream.
+            """
+            stream.write(script.encode('utf-8'))
+
+        def read_output(stream: IO[bytes]) -> None:
+            """
+            Read the output of the batch script from a stream.
+            """
+            output.append(stream.read())
+
+        with self._timer.phase('run_batch'):
+            run_streaming_subprocess(
+                args=self.command_args(args=['bash', '-s']),
+                write_stdin=write_script,
+                read_stdout=read_output,
+            )
+
+        results = []  # type: List[CompletedProcess]
+        for line in b''.join(output).decode('ascii').splitlines():
+            fields = line.split(' ')
+            if fields[0] != _BATCH_RESULT_MARKER:
+                continue
+            _, returncode, stdout, stderr = fields
+            results.append(
+                CompletedProcess(
+                    args=commands[len(results)],
+                    returncode=int(returncode),
+                    stdout=base64.b64decode(stdout),
+                    stderr=base64.b64decode(stderr),
+                ),
+            )
+        return results
+
+    def save_output(self, args: List[str], path: Path) -> None:
+        """
+        Run a command on this node as ``root`` and write its output to a
+        local file.
+
+        The output is written as it is received, so large output is not held
+        in memory.
+
+        Args:
+            args: The command to run on the node.
+            path: The local file to write the output to.
+
+        Raises:
+            CalledProcessError: The process exited with a non-zero code.
+        """
+        with path.open('wb') as output_file:
+            run_streaming_subprocess(
+                args=self.command_args(args=args),
+                read_stdout=lambda stream: copyfileobj(stream, output_file),
+            )
+
+    def send_files(self, sources: Iterable[Path], destination: Path) -> None:
+        """
+        Copy local files and directories into a directory on this node.
+
+        All files are sent as one ``tar`` stream over one connection.
+
+        Args:
+            sources: Local files and directories to copy. Each is copied to
+                ``destination`` with the same name.
+            destination: A directory on the node. It is created if it does
+                not exist.
+
+        Raises:
+            CalledProcessError: The files could not be copied.
+        """
+
+        def write_archive(stream: IO[bytes]) -> None:
+            """
+            Write an archive of the sources to a stream.
+            """
+            with tarfile.open(fileobj=stream, mode='w|') as archive:
+                for source in sources:
+                    archive.add(name=str(source), arcname=source.name)
+
+        with self._timer.phase('send_files'):
+            run_streaming_subprocess(
+                args=self._extract_args(destination=destination),
+                write_stdin=write_archive,
+            )
+
+    def send_archive(self, archive: Path, destination: Path) -> None:
+        """
+        Extract a local ``tar`` archive into a directory on this node.
+
+        Args:
+            archive: The path to a ``tar`` archive.
+            destination: A directory on the node. It is created if it does
+                not exist.
+
+        Raises:
+            CalledProcessError: The archive could not be extracted.
+        """
+        with self._timer.phase('send_files'):
+            with archive.open('rb') as archive_file:
+                run_streaming_subprocess(
+                    args=self._extract_args(destination=destination),
+                    stdin=archive_file,
+                )
+
+    def _extract_args(self, destination: Path) -> List[str]:
+        """
+        Return the arguments for a local process which extracts a ``tar``
+        stream from its input into a directory on this node.
+        """
+        quoted_destination = shlex.quote(str(destination))
+        return self.command_args(
+            args=[
+                'mkdir',
+                '--parents',
+                quoted_destination,
+                '&&',
+                'tar',
+                '--extract',
+                '--directory',
+                quoted_destination,
+            ],
+        )
+
+    def fetch_files(self, sources: Iterable[Path], destination: Path) -> None:
+        """
+        Copy files and directories on this node into a local directory.
+
+        All files are received as one ``tar`` stream over one connection.
+
+        Args:
+            sources: Absolute paths to files and directories on the node.
+                Each is copied to ``destination`` with the same name.
+            destination: A local directory. It is created if it does not
+                exist.
+
+        Raises:
+            CalledProcessError: The files could not be copied.
+            ValueError: The archive has a member which would be extracted
+                outside of ``destination``. Members before it may have been
+                extracted.
+        """
+        args = ['tar', '--create']
+        for source in sources:
+            # Each source is archived with only its name, rather than its
+            # full path.
+            args += [
+                '--directory',
+                shlex.quote(str(source.parent)),
+                shlex.quote(source.name),
+            ]
+
+        def read_archive(stream: IO[bytes]) -> None:
+            """
+            Extract an archive from a stream into the destination.
+            """
+            with tarfile.open(fileobj=stream, mode='r|') as archive:
+                archive.extractall(
+                    path=str(destination),
+                    members=_checked_members(
+                        archive=archive,
+                        destination=destination,
+                    ),
+                )
+
+        destination.mkdir(parents=True, exist_ok=True)
+        with self._timer.phase('fetch_files'):
+            run_streaming_subprocess(
+                args=self.command_args(args=args),
+                read_stdout=read_archive,
+            )
+
+
+def _checked_members(
+    archive: tarfile.TarFile,
+    destination: Path,
+) -> Iterator[tarfile.TarInfo]:
+    """
+    Yield the members of an archive, as they are read, if each would be
+    extracted inside ``destination``.
+
+    Each member is checked after the members before it have been extracted,
+    so symbolic links extracted earlier are followed when checking it.
+
+    Raises:
+        ValueError: A member, or the target of a link, has an absolute path
+            or a path with a ``..`` component. Or, a member would be extracted
+            through a symbolic link from earlier in the archive, or outside
+            of ``destination``.
+    """
+    root = os.path.realpath(str(destination))
+    symlinks = set()  # type: Set[PurePosixPath]
+    for member in archive:
+        message = (
+            'The archive member "{name}" is outside of the destination.'
+        ).format(name=member.name)
+        names = [member.name]
+        if member.islnk() or member.issym():
+            names.append(member.linkname)
+        for name in names:
+            path = PurePosixPath(name)
+            if path.is_absolute() or '..' in path.parts:
+                raise ValueError(message)
+
+        member_path = PurePosixPath(member.name)
+        if symlinks.intersection(member_path.parents):
+            raise ValueError(message)
+
+        target = os.path.realpath(os.path.join(root, member.name))
+        if os.path.commonpath([root, target]) != root:
+            raise ValueError(message)
+
+        if member.issym():
+            symlinks.add(member_path)
+        yield member
+
+
+def _batch_script(commands: List[List[str]], stop_on_failure: bool) -> str:
+    """
+    Return a ``bash`` script which runs commands and writes a line describing
+    the result of each command.
+
+    Output is written to files and encoded so that it can contain any bytes,
+    including line endings.
+    """
+    lines = [
+        'output_dir=$(mktemp --directory)',
+        'trap \'rm --recursive --force "$output_dir"\' EXIT',
+    ]
+    for args in commands:
+        lines += [
+            # Each command is run in a subshell so that changes such as
+            # ``cd`` do not affect later commands.
+            # Commands have no input, so that they cannot read the rest of
+            # the script.
+            '( {command}\n) </dev/null >"$output_dir/stdout" '
+            '2>"$output_dir/stderr"'.format(command=' '.join(args)),
+            'returncode=$?',
+            'echo {marker} "$returncode" '
+            '"$(base64 --wrap=0 "$output_dir/stdout")" '
+            '"$(base64 --wrap=0 "$output_dir/stderr")"'.format(
+                marker=_BATCH_RESULT_MARKER,
+            ),
+        ]
+        if stop_on_failure:
+            lines.append('[ "$returncode" -eq 0 ] || exit 0')
+    return '\n'.join(lines) + '\n'
+
+
+def _decode_line(line: bytes) -> str:
+    """
+    Return a line of process output as text, without its line ending.
+    """
+    return line.decode('utf-8', errors='replace').rstrip('\r\n')
+
+
+def _handle_line(
+    line: bytes,
+    lines: MutableSequence[bytes],
+    log_output_live: bool,
+    output_callback: Optional[Callable[[str], None]],
+) -> None:
+    """
+    Handle a line of process output.
+
+    Args:
+        line: The line of output.
+        lines: The output kept so far. The line is added to this.
+        log_output_live: If `True`, log the line.
+        output_callback: A function to call with the line as text, or `None`.
+    """
+    if log_output_live or output_callback is not None:
+        text = _decode_line(line=line)
+        if log_output_live:
+            LOGGER.debug(text)
+        if output_callback is not None:
+            output_callback(text)
+    lines.append(line)
+
+
+def _read_lines(
+    stream: IO[bytes],
+    lines: MutableSequence[bytes],
+    log_output_live: bool,
+    output_callback: Optional[Callable[[str], None]],
+) -> None:
+    """
+    Handle each line of a process's output stream until the stream is closed.
+
+    See ``_handle_line``.
+    """
+    for line in stream:
+        _handle_line(
+            line=line,
+            lines=lines,
+            log_output_live=log_output_live,
+            output_callback=output_callback,
+        )
 
 
 def run_subprocess(
     args: List[str],
     log_output_live: bool,
-    cwd: Optional[Union[bytes, str]]=None
+    cwd: Optional[Union[bytes, str]]=None,
+    output_callback: Optional[Callable[[str], None]]=None,
+    max_output_lines: Optional[int]=None,
 ) -> CompletedProcess:
     """
     Run a command in a subprocess.
 
+    Output is handled line by line as it is produced.
+
     Args:
         args: See `subprocess.run`.
         log_output_live: If `True`, log output live. If `True`, stderr is
             merged into stdout in the return value.
         cwd: See `subprocess.run`.
+        output_callback: A function to call with each line of output, as
+            text without its line ending, as soon as it is produced.
+        max_output_lines: The maximum number of lines of each of stdout and
+            stderr to keep in memory. If there are more lines, only the last
+            lines are in the return value or the raised error. If this is
+            `None`, all output is kept.
 
     Returns:
         See `subprocess.run`.
@@ -101,29 +853,328 @@ def run_subprocess(
     else:
         process_stderr = PIPE
 
+    stdout_lines = deque(
+        maxlen=max_output_lines,
+    )  # type: MutableSequence[bytes]
+    stderr_lines = deque(
+        maxlen=max_output_lines,
+    )  # type: MutableSequence[bytes]
     with Popen(
         args=args,
         cwd=cwd,
         stdout=PIPE,
         stderr=process_stderr,
     ) as process:
+        # Both pipes must be read at the same time, or the process can block
+        # when one of them is full.
+        stderr_reader = None  # type: Optional[Thread]
+        if process.stderr is not None:
+            stderr_reader = Thread(
+                target=_read_lines,
+                kwargs={
+                    'stream': process.stderr,
+                    'lines': stderr_lines,
+                    'log_output_live': False,
+                    'output_callback': output_callback,
+                },
+                daemon=True,
+            )
+            stderr_reader.start()
         try:
-            if log_output_live:
-                stdout = b''
-                stderr = b''
-                for line in process.stdout:
-                    LOGGER.debug(line)
-                    stdout += line
-            else:
-                stdout, stderr = process.communicate()
+            _read_lines(
+                stream=process.stdout,
+                lines=stdout_lines,
+                log_output_live=log_output_live,
+                output_callback=output_callback,
+            )
+            if stderr_reader is not None:
+                stderr_reader.join()
         except:
             process.kill()
             process.wait()
             raise
-        retcode = process.poll()
+        retcode = process.wait()
+        stdout = b''.join(stdout_lines)
+        stderr = b''.join(stderr_lines)
         if retcode:
-            LOGGER.info(str(stderr))
+            LOGGER.info(_decode_line(line=stderr))
             raise CalledProcessError(
                 retcode, args, output=stdout, stderr=stderr
             )
     return CompletedProcess(args, retcode, stdout, stderr)
+
+
+def _write_stdin(
+    process: Popen,
+    write_stdin: Callable[[IO[bytes]], None],
+    errors: List[Exception],
+) -> None:
+    """
+    Write the input of a process and then close its input stream.
+
+    If writing fails, the process is killed so that its output is closed,
+    and the error is added to ``errors``.
+    """
+    try:
+        write_stdin(process.stdin)
+    except BrokenPipeError:
+        # The process exited before reading all of its input.
+        # Its exit code tells us why.
+        pass
+    except Exception as exc:  # pylint: disable=broad-except
+        # The error is raised by the thread which runs the process.
+        errors.append(exc)
+        process.kill()
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def run_streaming_subprocess(
+    args: List[str],
+    stdin: Optional[IO[bytes]]=None,
+    write_stdin: Optional[Callable[[IO[bytes]], None]]=None,
+    read_stdout: Optional[Callable[[IO[bytes]], None]]=None,
+) -> None:
+    """
+    Run a command in a subprocess whose input or output is a stream of
+    bytes, such as an archive, rather than lines of text.
+
+    At most one of ``stdin`` and ``write_stdin`` may be given.
+
+    Args:
+        args: See ``run_subprocess``.
+        stdin: A file to use as the input of the process.
+        write_stdin: A function to call with the input stream of the process.
+            The stream is closed when the function returns. This is called
+            in another thread, while output is read, so that a process which
+            writes output before it reads all of its input does not block.
+        read_stdout: A function to call with the output stream of the
+            process. It must read the stream until it is closed. If this is
+            not given, output is discarded.
+
+    Raises:
+        CalledProcessError: The process exited with a non-zero code.
+    """
+    process_stdin = stdin  # type: Union[None, int, IO[bytes]]
+    if write_stdin is not None:
+        process_stdin = PIPE
+    elif stdin is None:
+        process_stdin = DEVNULL
+
+    stderr_lines = deque(
+        maxlen=_STREAMING_STDERR_LINES,
+    )  # type: MutableSequence[bytes]
+    with Popen(
+        args=args,
+        stdin=process_stdin,
+        stdout=DEVNULL if read_stdout is None else PIPE,
+        stderr=PIPE,
+    ) as process:
+        stderr_reader = Thread(
+            target=_read_lines,
+            kwargs={
+                'stream': process.stderr,
+                'lines': stderr_lines,
+                'log_output_live': False,
+                'output_callback': None,
+            },
+            daemon=True,
+        )
+        stderr_reader.start()
+        write_errors = []  # type: List[Exception]
+        stdin_writer = None  # type: Optional[Thread]
+        if write_stdin is not None:
+            stdin_writer = Thread(
+                target=_write_stdin,
+                kwargs={
+                    'process': process,
+                    'write_stdin': write_stdin,
+                    'errors': write_errors,
+                },
+                daemon=True,
+            )
+            stdin_writer.start()
+        try:
+            if read_stdout is not None:
+                read_stdout(process.stdout)
+            if stdin_writer is not None:
+                stdin_writer.join()
+            stderr_reader.join()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        retcode = process.wait()
+
+    if write_errors:
+        raise write_errors[0]
+
+    if retcode:
+        stderr = b''.join(stderr_lines)
+        LOGGER.info(_decode_line(line=stderr))
+        raise CalledProcessError(retcode, args, stderr=stderr)
+
+
+async def _read_lines_async(
+    stream: asyncio.StreamReader,
+    lines: MutableSequence[bytes],
+    log_output_live: bool,
+    output_callback: Optional[Callable[[str], None]],
+) -> None:
+    """
+    Handle each line of a process's output stream until the stream is closed,
+    without blocking the event loop.
+
+    See ``_handle_line``.
+    """
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        _handle_line(
+            line=line,
+            lines=lines,
+            log_output_live=log_output_live,
+            output_callback=output_callback,
+        )
+
+
+async def run_subprocess_async(
+    args: List[str],
+    log_output_live: bool,
+    cwd: Optional[Union[bytes, str]]=None,
+    output_callback: Optional[Callable[[str], None]]=None,
+    max_output_lines: Optional[int]=None,
+) -> CompletedProcess:
+    """
+    Run a command in a subprocess without blocking the event loop.
+
+    See ``run_subprocess``.
+    """
+    if log_output_live:
+        process_stderr = STDOUT
+    else:
+        process_stderr = PIPE
+
+    stdout_lines = deque(
+        maxlen=max_output_lines,
+    )  # type: MutableSequence[bytes]
+    stderr_lines = deque(
+        maxlen=max_output_lines,
+    )  # type: MutableSequence[bytes]
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        cwd=cwd,
+        stdout=PIPE,
+        stderr=process_stderr,
+    )
+    readers = [
+        _read_lines_async(
+            stream=process.stdout,
+            lines=stdout_lines,
+            log_output_live=log_output_live,
+            output_callback=output_callback,
+        ),
+    ]
+    if process.stderr is not None:
+        readers.append(
+            _read_lines_async(
+                stream=process.stderr,
+                lines=stderr_lines,
+                log_output_live=False,
+                output_callback=output_callback,
+            ),
+        )
+    try:
+        await asyncio.gather(*readers)
+        await process.wait()
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+        raise
+    retcode = process.returncode
+    stdout = b''.join(stdout_lines)
+    stderr = b''.join(stderr_lines)
+    if retcode:
+        LOGGER.info(_decode_line(line=stderr))
+        raise CalledProcessError(retcode, args, output=stdout, stderr=stderr)
+    return CompletedProcess(args, retcode, stdout, stderr)
+
+
+def integration_test_args(pytest_command: List[str]) -> List[str]:
+    """
+    Return the arguments to run integration tests on a master node.
+
+    Args:
+        pytest_command: The ``pytest`` command to run on the node.
+    """
+    environment_variables = {
+        'DCOS_LOGIN_UNAME': 'admin',
+        'DCOS_LOGIN_PW': 'admin',
+    }
+    set_env_variables = [
+        "{key}='{value}'".format(key=key, value=value)
+        for key, value in environment_variables.items()
+    ] + ['source', '/opt/mesosphere/environment.export']
+
+    test_dir = '/opt/mesosphere/active/dcos-integration-test/'
+    change_to_test_dir = ['cd', test_dir]
+    and_cmd = ['&&']
+    return (
+        change_to_test_dir + and_cmd + set_env_variables + and_cmd +
+        pytest_command
+    )
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    Hold an exclusive lock which is shared between processes.
+
+    Args:
+        path: The path to a file which is used as the lock. It is created if
+            it does not exist.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def map_nodes(
+    function: Callable[[Node], Any],
+    nodes: Iterable[Node],
+    max_workers: Optional[int]=None,
+) -> Dict[Node, Any]:
+    """
+    Call a function with each of the given nodes concurrently.
+
+    Args:
+        function: The function to call with each node.
+        nodes: The nodes to call the function with.
+        max_workers: The maximum number of calls to make at once. If this is
+            `None`, all calls are made at once.
+
+    Returns:
+        A mapping of each node to the value returned by the function for that
+        node, or to the exception raised by the function for that node.
+    """
+    nodes = list(nodes)
+    if not nodes:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(nodes)) as pool:
+        futures = {node: pool.submit(function, node) for node in nodes}
+
+    results = {}  # type: Dict[Node, Any]
+    for node, future in futures.items():
+        exception = future.exception()
+        results[node] = future.result() if exception is None else exception
+    return results
@@ -2,25 +2,39 @@
 Helpers for interacting with DC/OS Docker.
 """
 
-import subprocess
+import asyncio
 import uuid
 from ipaddress import IPv4Address
 from pathlib import Path
-from shutil import copyfile, copytree, ignore_patterns, rmtree
-from typing import Any, Dict, Optional, Set
+from shutil import rmtree
+from subprocess import DEVNULL, run
+from tempfile import mkdtemp
+from typing import Any, Dict, List, Optional, Set
 
 import docker
-import yaml
-from retry import retry
 
-from ._common import Node, run_subprocess
-
-
-class _ConflictingContainerError(Exception):
-    """
-    Raised when an existing container conflicts with a container which will be
-    created.
-    """
+from ._common import (
+    DockerExecTransport,
+    Node,
+    SSHTransport,
+    Transport,
+    Transports,
+)
+from ._dcos_docker_directory import DCOSDockerDirectory
+from ._node_cache import NodeCache
+from ._reaper import forget_cluster, record_cluster, remove_containers
+from ._reconfigure import reconfigure_nodes
+from ._scaling import add_agents, install_agents, remove_agents
+from ._snapshots import load_snapshot, save_snapshot
+from .genconf_cache import GenconfCache
+from .janitor import owner_labels
+from .timing import PhaseTimer
+
+# The phases of creating a cluster, in order.
+# Each is a DC/OS Docker `make` target.
+# `start` creates the node and installer containers, `genconf` generates the
+# DC/OS configuration and `install` installs DC/OS on the nodes.
+_CREATION_PHASES = ('start', 'genconf', 'install')
 
 
 class DCOS_Docker:  # pylint: disable=invalid-name
@@ -28,6 +42,21 @@ class DCOS_Docker:  # pylint: disable=invalid-name
     A record of a DC/OS Docker cluster.
     """
 
+    # A node is ready when the DC/OS components on it are healthy.
+    # ``dcos-diagnostics`` is called ``3dt`` in older versions of DC/OS.
+    readiness_probe_args = [
+        'source',
+        '/opt/mesosphere/environment.export',
+        '&&',
+        '(',
+        'dcos-diagnostics',
+        '--diag',
+        '||',
+        '3dt',
+        '--diag',
+        ')',
+    ]
+
     def __init__(
         self,
         masters: int,
@@ -39,9 +68,16 @@ class DCOS_Docker:  # pylint: disable=invalid-name
         custom_ca_key: Optional[Path],
         log_output_live: bool,
         files_to_copy_to_installer: Dict[Path, Path],
+        reuse_ssh_connections: bool=False,
+        genconf_cache: Optional[GenconfCache]=None,
+        timer: Optional[PhaseTimer]=None,
+        transport: Transports=Transports.SSH,
     ) -> None:
         """
-        Create a DC/OS Docker cluster.
+        Prepare to create a DC/OS Docker cluster.
+
+        No containers are created until ``create_containers`` or
+        ``create_containers_async`` is called.
 
         Args:
             masters: The number of master nodes to create.
@@ -60,118 +96,326 @@ class DCOS_Docker:  # pylint: disable=invalid-name
                 the installer node before installing DC/OS. Currently on DC/OS
                 Docker the only supported paths on the installer are in the
                 `/genconf` directory.
+            reuse_ssh_connections: If `True`, share one SSH connection to
+                each node between commands until the cluster is destroyed.
+            genconf_cache: A cache of configuration generation output to use
+                when installing DC/OS, or `None` to not use a cache.
+            timer: A record of how long each phase of the cluster's
+                lifecycle takes.
+            transport: The way to run commands on nodes.
         """
-        self.log_output_live = log_output_live
+        self._transport = transport
+        self._timer = timer or PhaseTimer()
+
+        # SSH control sockets must have short paths, so we do not put them in
+        # the DC/OS Docker directory.
+        self._ssh_control_directory = None  # type: Optional[Path]
+        if reuse_ssh_connections and transport == Transports.SSH:
+            self._ssh_control_directory = Path(
+                mkdtemp(prefix='dcos-ssh-', dir='/tmp'),
+            )
 
         # To avoid conflicts, we use random container names.
         # We use the same random string for each container in a cluster so
         # that they can be associated easily.
-        random = uuid.uuid4()
+        cluster_id = str(uuid.uuid4())
+
+        # One Docker client is shared by everything which queries this
+        # cluster's containers.
+        self._client = docker.from_env()
+
+        # Nodes are found once and then cached.
+        # See ``invalidate_nodes``.
+        self._nodes_cache = NodeCache(
+            discover=self._discover_nodes,
+            timer=self._timer,
+            is_complete=self._all_nodes_found,
+        )
 
         # We create a new instance of DC/OS Docker and we work in this
         # directory.
         # This reduces the chance of conflicts.
         # We put this in the `/tmp` directory because that is writable on
         # the Vagrant VM.
-        tmp = Path('/tmp')
-        self._path = tmp / 'dcos-docker-{random}'.format(random=random)
-
-        copytree(
-            src=str(dcos_docker_path),
-            dst=str(self._path),
-            # If there is already a config, we do not copy it as it will be
-            # overwritten and therefore copying it is wasteful.
-            ignore=ignore_patterns('dcos_generate_config.sh'),
+        path = Path('/tmp') / 'dcos-docker-{random}'.format(random=cluster_id)
+
+        # The cluster is recorded before anything is created so that it can
+        # be cleaned up if this process exits unexpectedly.
+        owned_paths = [path]
+        if self._ssh_control_directory is not None:
+            owned_paths.append(self._ssh_control_directory)
+        record_cluster(cluster_id=cluster_id, paths=owned_paths)
+        self._owned_paths = owned_paths
+
+        self._directory = DCOSDockerDirectory(
+            path=path,
+            cluster_id=cluster_id,
+            masters=masters,
+            agents=agents,
+            public_agents=public_agents,
+            extra_config=extra_config,
+            generate_config_path=generate_config_path,
+            dcos_docker_path=dcos_docker_path,
+            custom_ca_key=custom_ca_key,
+            log_output_live=log_output_live,
+            files_to_copy_to_installer=files_to_copy_to_installer,
+            genconf_cache=genconf_cache,
+            labels=owner_labels(cluster_id=cluster_id, paths=owned_paths),
+            host_storage_driver=self._client.info()['Driver'],
+            timer=self._timer,
         )
 
-        copyfile(
-            src=str(generate_config_path),
-            dst=str(self._path / 'dcos_generate_config.sh'),
-        )
+    @property
+    def completed_phases(self) -> List[str]:
+        """
+        Return the phases of creating the cluster which have finished, in
+        order.
+        """
+        return self._directory.completed_phases
+
+    def _next_phase(self) -> Optional[str]:
+        """
+        Prepare to run the next creation phase, and return its name, or
+        `None` if every phase has finished.
+        """
+        completed = self.completed_phases
+        remaining = [
+            phase for phase in _CREATION_PHASES if phase not in completed
+        ]
+        if not remaining:
+            return None
+
+        phase = remaining[0]
+        if phase == 'start':
+            # Containers which were created by a failed attempt are removed,
+            # as containers with the same names are created again.
+            remove_containers(client=self._client, cluster_id=self.cluster_id)
+        return phase
+
+    def create_containers(self) -> None:
+        """
+        Create containers for the cluster and install DC/OS on them.
+
+        Each phase of creation is recorded when it finishes.
+        If creation fails, calling this again resumes creation with the
+        phase which failed.
+
+        Raises:
+            CalledProcessError: The containers could not be created.
+        """
+        try:
+            phase = self._next_phase()
+            while phase is not None:
+                if phase == 'genconf':
+                    self._directory.make_base_config()
+                self._make(target=phase)
+                self._directory.checkpoint(
+                    phases=self.completed_phases + [phase],
+                )
+                phase = self._next_phase()
+        finally:
+            self.invalidate_nodes()
+
+    async def create_containers_async(self) -> None:
+        """
+        Create containers for the cluster and install DC/OS on them, without
+        blocking the event loop.
+
+        See ``create_containers``.
+        """
+        try:
+            phase = self._next_phase()
+            while phase is not None:
+                if phase == 'genconf':
+                    await self._directory.make_base_config_async()
+                await self._make_async(target=phase)
+                self._directory.checkpoint(
+                    phases=self.completed_phases + [phase],
+                )
+                phase = self._next_phase()
+        finally:
+            self.invalidate_nodes()
+
+    def reconfigure(self, extra_config: Dict[str, Any]) -> None:
+        """
+        Change the DC/OS configuration of the cluster in place.
 
-        # Files in the DC/OS Docker directory's genconf directory are mounted
-        # to the installer at `/genconf`.
-        # Therefore, every file which we want to copy to `/genconf` on the
-        # installer is put into the genconf directory in DC/OS Docker.
-        for host_path, installer_path in files_to_copy_to_installer.items():
-            relative_installer_path = installer_path.relative_to('/genconf')
-            destination_path = self._path / 'genconf' / relative_installer_path
-            copyfile(src=str(host_path), dst=str(destination_path))
-
-        master_ctr = 'dcos-master-{random}-'.format(random=random)
-        agent_ctr = 'dcos-agent-{random}-'.format(random=random)
-        public_agent_ctr = 'dcos-public-agent-{random}-'.format(random=random)
-        # Only overlay and aufs storage drivers are supported.
-        # This chooses the aufs driver so the host's driver is not used.
-        #
-        # This means that the tests will run even if the storage driver on
-        # the host is not one of these two.
-        #
-        # aufs was chosen as it is supported on the version of Docker on
-        # Travis CI.
-        client = docker.from_env()
-        host_storage_driver = client.info()['Driver']
-        supported_storage_drivers = ('overlay', 'aufs')
-        if host_storage_driver in supported_storage_drivers:
-            docker_storage_driver = host_storage_driver
-        else:
-            docker_storage_driver = 'aufs'
-        self._variables = {
-            'DOCKER_STORAGEDRIVER': docker_storage_driver,
-            # Some platforms support systemd and some do not.
-            # Disabling support makes all platforms consistent in this aspect.
-            'MESOS_SYSTEMD_ENABLE_SUPPORT': 'false',
-            # Number of nodes.
-            'MASTERS': str(masters),
-            'AGENTS': str(agents),
-            'PUBLIC_AGENTS': str(public_agents),
-            # Container names.
-            'MASTER_CTR': master_ctr,
-            'AGENT_CTR': agent_ctr,
-            'PUBLIC_AGENT_CTR': public_agent_ctr,
-        }  # type: Dict[str, str]
-
-        if extra_config:
-            self._variables['EXTRA_GENCONF_CONFIG'] = yaml.dump(
-                data=extra_config,
-                default_flow_style=False,
+        This uses a DC/OS configuration upgrade to the installed version, so
+        DC/OS is not reinstalled.
+        Masters are upgraded one at a time, and then all agents are upgraded
+        at once.
+
+        Args:
+            extra_config: Extra installation configuration variables which
+                replace those given when the cluster was created.
+
+        Raises:
+            CalledProcessError: The configuration could not be changed.
+        """
+        with self._timer.phase('reconfigure'):
+            reconfigure_nodes(
+                directory=self._directory,
+                masters=self.masters,
+                agents=self.agents | self.public_agents,
+                extra_config=extra_config,
+                timer=self._timer,
             )
 
-        if custom_ca_key is not None:
-            master_mount = '-v {custom_ca_key}:{path}'.format(
-                custom_ca_key=custom_ca_key,
-                path=Path('/var/lib/dcos/pki/tls/CA/private/custom_ca.key'),
+    def scale_agents(self, agents: int) -> None:
+        """
+        Add or remove agent nodes.
+
+        Agents are removed starting with the highest numbered agent.
+        New agents are created like the existing agents, with the next
+        numbers after them, and DC/OS is installed on them.
+
+        Args:
+            agents: The number of agents which the cluster should have.
+
+        Raises:
+            ValueError: ``agents`` is negative, or agents are added to a
+                cluster with no agents to copy.
+            CalledProcessError: DC/OS could not be installed on a new agent.
+        """
+        if agents < 0:
+            raise ValueError('A cluster cannot have fewer than 0 agents.')
+
+        with self._timer.phase('scale_agents'):
+            try:
+                self._scale_agents(agents=agents)
+            finally:
+                self.invalidate_nodes()
+
+    def _scale_agents(self, agents: int) -> None:
+        """
+        See ``scale_agents``.
+        """
+        current = self._directory.node_counts()['agent']
+        if agents < current:
+            remove_agents(
+                client=self._client,
+                directory=self._directory,
+                agents=agents,
+                nodes=self.agents,
+            )
+        elif agents > current:
+            new_ip_addresses = add_agents(
+                client=self._client,
+                directory=self._directory,
+                agents=agents,
             )
-            self._variables['MASTER_MOUNTS'] = master_mount
+            self.invalidate_nodes()
+            install_agents(
+                directory=self._directory,
+                nodes=set(
+                    node for node in self.agents
+                    if node.ip_address in new_ip_addresses
+                ),
+                timer=self._timer,
+            )
+
+    @property
+    def cluster_id(self) -> str:
+        """
+        Return the ID of this cluster, which is part of the name of every
+        container in the cluster.
+        """
+        return self._directory.cluster_id
+
+    def describe(self) -> Dict[str, Any]:
+        """
+        Return a description of the cluster which other processes can use
+        to run commands on its nodes and to destroy it.
+        """
+        containers = self._client.containers.list(
+            filters={'name': self.cluster_id},
+        )
+        nodes = {}  # type: Dict[str, List[Dict[str, str]]]
+        for role, base_name in self._directory.role_base_names().items():
+            nodes[role] = [
+                {
+                    'container_name': container.name,
+                    'ip_address':
+                    container.attrs['NetworkSettings']['IPAddress'],
+                } for container in containers
+                if container.name.startswith(base_name)
+            ]
+        return {
+            'cluster_id': self.cluster_id,
+            'nodes': nodes,
+            'transport': self._transport.name,
+            'ssh_key_path': str(self._directory.ssh_key_path),
+            'readiness_probe_args': self.readiness_probe_args,
+            'paths': [str(path) for path in self._owned_paths],
+        }
+
+    def snapshot(self, name: str) -> None:
+        """
+        Save the state of all nodes in the cluster so that new clusters can be
+        restored from it.
+
+        Each node container is committed to an image. The contents of the
+        node's volumes, files which are bind mounted from the cluster's
+        directory, and the SSH key which is authorized on the nodes, are
+        saved to files.
+        Therefore the snapshot can be restored after this cluster is
+        destroyed.
 
-        self._create_containers()
+        If the snapshot cannot be made, the files saved for it are removed,
+        so that it can be made again with the same name.
+
+        Args:
+            name: The name of the snapshot. This must be valid as part of a
+                Docker image tag.
 
-    @retry(exceptions=_ConflictingContainerError, delay=10, tries=30)
-    def _create_containers(self) -> None:
+        Raises:
+            FileExistsError: A snapshot with the given name exists.
+            ValueError: The name is not valid.
         """
-        Create containers for the cluster.
+        save_snapshot(
+            name=name,
+            client=self._client,
+            directory=self._directory,
+            timer=self._timer,
+        )
 
-        Creating clusters involves creating temporary installer containers.
-        These containers can conflict in name.
-        If a conflict occurs, retry.
+    def restore_snapshot(self, name: str) -> None:
         """
-        # The error substring differs on different versions of Docker.
-        conflict_error_substring = 'Conflict. The container name'
-        other_conflict_error_substring = 'Conflict. The name'
+        Create containers for the cluster from a snapshot rather than
+        installing DC/OS.
 
-        try:
-            self._make(target='all')
-        except subprocess.CalledProcessError as exc:
-            # Handle error in stderr or stdout.
-            # This is because if we log output live, stderr is redirected to
-            # stdout.
-            stderr = str(exc.stderr) + str(exc.stdout)
-            conflict = conflict_error_substring in stderr
-            conflict = conflict or other_conflict_error_substring in stderr
-            if conflict:
-                print(exc.stderr)
-                raise _ConflictingContainerError()
-            raise
+        Nodes keep the IP addresses which they had when the snapshot was
+        taken, as DC/OS configuration refers to them.
+        Therefore a snapshot cannot be restored while the cluster which it
+        was taken from exists.
+
+        Args:
+            name: The name of the snapshot.
+
+        Raises:
+            SnapshotRestoreError: The snapshot does not exist, an existing
+                container has an IP address which a node needs, or a node was
+                not given the IP address which it had in the snapshot.
+        """
+        with self._timer.phase('restore_snapshot'):
+            try:
+                load_snapshot(
+                    name=name,
+                    client=self._client,
+                    directory=self._directory,
+                )
+            finally:
+                self.invalidate_nodes()
+
+    def _make_args(self, target: str) -> List[str]:
+        """
+        Return the arguments to run `make` in the DC/OS Docker directory
+        using variables associated with this instance.
+
+        Args:
+            target: `make` target to run.
+        """
+        return self._directory.make_args(target=target)
 
     def _make(self, target: str) -> None:
         """
@@ -184,88 +428,195 @@ class DCOS_Docker:  # pylint: disable=invalid-name
         Raises:
             CalledProcessError: The process exited with a non-zero code.
         """
-        args = ['make'] + [
-            '{key}={value}'.format(key=key, value=value)
-            for key, value in self._variables.items()
-        ] + [target]
+        self._directory.make(
+            args=self._make_args(target=target),
+            target=target,
+        )
+
+    async def _make_async(self, target: str) -> None:
+        """
+        Run `make` without blocking the event loop.
 
-        run_subprocess(
-            args=args,
-            cwd=str(self._path),
-            log_output_live=self.log_output_live
+        See ``_make``.
+        """
+        await self._directory.make_async(
+            args=self._make_args(target=target),
+            target=target,
         )
 
-    def postflight(self) -> None:
+    def _close_ssh_connections(self) -> None:
         """
-        Wait for nodes to be ready to run tests against.
+        Close any persistent SSH connections to nodes in the cluster.
+
+        Nodes are not discovered, as the cluster may not have all of its
+        nodes if creating it failed.
+        Each socket in the control directory is for one master connection.
         """
-        self._make(target='postflight')
+        if self._ssh_control_directory is None:
+            return
+
+        with self._timer.phase('close_ssh_connections'):
+            for control_path in self._ssh_control_directory.glob('*'):
+                # Socket names are ``<user>@<host>:<port>``.
+                _, _, host = control_path.name.rpartition('@')
+                host, _, _ = host.rpartition(':')
+                run(
+                    args=[
+                        'ssh',
+                        '-q',
+                        '-o',
+                        'ControlPath={path}'.format(path=control_path),
+                        '-O',
+                        'exit',
+                        host,
+                    ],
+                    stdin=DEVNULL,
+                    stdout=DEVNULL,
+                    stderr=DEVNULL,
+                )
+            rmtree(path=str(self._ssh_control_directory), ignore_errors=True)
 
     def destroy(self) -> None:
         """
         Destroy all nodes in the cluster.
         """
-        self._make(target='clean')
-        rmtree(
-            path=str(self._path),
-            # Some files may be created in the container that we cannot clean
-            # up.
-            ignore_errors=True,
+        try:
+            self._close_ssh_connections()
+        finally:
+            # Containers are removed with the Docker API rather than with
+            # `make clean` so that they can be removed in parallel.
+            with self._timer.phase('remove_containers'):
+                remove_containers(
+                    client=self._client,
+                    cluster_id=self.cluster_id,
+                )
+            self.invalidate_nodes()
+            self._directory.remove()
+            forget_cluster(cluster_id=self.cluster_id)
+
+    async def destroy_async(self) -> None:
+        """
+        Destroy all nodes in the cluster, without blocking the event loop.
+        """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.destroy)
+
+    def invalidate_nodes(self) -> None:
+        """
+        Forget the cached nodes of this cluster.
+
+        The nodes are found again the next time that they are needed.
+        This should be called whenever containers are created or removed.
+        """
+        self._nodes_cache.invalidate()
+
+    def _discover_nodes(self) -> Dict[str, Set[Node]]:
+        """
+        Find all nodes in this cluster with one query to Docker.
+
+        Returns: A mapping of roles to ``Node``s corresponding to running
+            containers with names starting with the base name of that role.
+        """
+        base_names = self._directory.role_base_names()
+        nodes = {
+            role: set([])
+            for role in base_names
+        }  # type: Dict[str, Set[Node]]
+        # The name filter matches any part of a container's name.
+        containers = self._client.containers.list(
+            filters={'name': self.cluster_id},
+        )
+        for container in containers:
+            for role, base_name in base_names.items():
+                if not container.name.startswith(base_name):
+                    continue
+                ip_address = IPv4Address(
+                    container.attrs['NetworkSettings']['IPAddress'],
+                )
+                node = Node(
+                    ip_address=ip_address,
+                    transport=self._node_transport(
+                        ip_address=ip_address,
+                        container_name=container.name,
+                    ),
+                    timer=self._timer,
+                )
+                nodes[role].add(node)
+        return nodes
+
+    def _all_nodes_found(self, nodes: Dict[str, Set[Node]]) -> bool:
+        """
+        Return whether nodes were found for all containers.
+
+        Nodes are only cached once all containers are running, so that nodes
+        are not missing for the lifetime of the cache.
+        """
+        return all(
+            len(nodes[role]) == expected
+            for role, expected in self._directory.node_counts().items()
         )
 
-    def _nodes(self, container_base_name: str, num_nodes: int) -> Set[Node]:
+    def _node_transport(
+        self,
+        ip_address: IPv4Address,
+        container_name: str,
+    ) -> Transport:
+        """
+        Return the way to run commands on a node.
+        """
+        if self._transport == Transports.DOCKER_EXEC:
+            return DockerExecTransport(container_name=container_name)
+        return SSHTransport(
+            ip_address=ip_address,
+            ssh_key_path=self._directory.ssh_key_path,
+            ssh_control_directory=self._ssh_control_directory,
+        )
+
+    def _nodes(self, role: str) -> Set[Node]:
         """
         Args:
-            container_base_name: The start of the container names.
-            num_nodes: The number of nodes.
+            role: The role of the nodes.
 
         Returns: ``Node``s corresponding to containers with names starting
-            with ``container_base_name``.
-        """
-        client = docker.from_env()
-        nodes = set([])  # type: Set[Node]
+            with the base name of ``role``.
 
-        while len(nodes) < num_nodes:
-            container_name = '{container_base_name}{number}'.format(
-                container_base_name=container_base_name,
-                number=len(nodes) + 1,
+        Raises:
+            ValueError: The number of nodes found is not the number of nodes
+                with the role which the cluster should have.
+        """
+        found_nodes = self._nodes_cache.nodes(role=role)
+        num_nodes = self._directory.node_counts()[role]
+        if len(found_nodes) != num_nodes:
+            message = (
+                'Expected {num_nodes} nodes with names starting with {name}. '
+                'Found {found}.'
             )
-            container = client.containers.get(container_name)
-            ip_address = container.attrs['NetworkSettings']['IPAddress']
-            node = Node(
-                ip_address=IPv4Address(ip_address),
-                ssh_key_path=self._path / 'include' / 'ssh' / 'id_rsa',
+            raise ValueError(
+                message.format(
+                    num_nodes=num_nodes,
+                    name=self._directory.role_base_names()[role],
+                    found=len(found_nodes),
+                )
             )
-            nodes.add(node)
-
-        return nodes
+        return found_nodes
 
     @property
     def masters(self) -> Set[Node]:
         """
         Return all DC/OS master ``Node``s.
         """
-        return self._nodes(
-            container_base_name=self._variables['MASTER_CTR'],
-            num_nodes=int(self._variables['MASTERS']),
-        )
+        return self._nodes(role='master')
 
     @property
     def agents(self) -> Set[Node]:
         """
         Return all DC/OS agent ``Node``s.
         """
-        return self._nodes(
-            container_base_name=self._variables['AGENT_CTR'],
-            num_nodes=int(self._variables['AGENTS']),
-        )
+        return self._nodes(role='agent')
 
     @property
     def public_agents(self) -> Set[Node]:
         """
         Return all DC/OS public agent ``Node``s.
         """
-        return self._nodes(
-            container_base_name=self._variables['PUBLIC_AGENT_CTR'],
-            num_nodes=int(self._variables['PUBLIC_AGENTS']),
-        )
+        return self._nodes(role='public_agent')
@@ -0,0 +1,438 @@
+"""
+Helpers for the copy of DC/OS Docker in which a cluster is created.
+"""
+
+import json
+import os
+import shlex
+import uuid
+from pathlib import Path
+from shutil import copyfile, copytree, ignore_patterns, rmtree
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from ._common import run_subprocess, run_subprocess_async
+from .genconf_cache import GenconfCache
+from .timing import PhaseTimer
+
+# The phases which have finished are recorded in this file in the DC/OS
+# Docker directory.
+_CHECKPOINT_FILENAME = '.dcos-e2e-phases.json'
+
+# The configuration which DC/OS Docker writes for a cluster's nodes, before
+# extra configuration is added, is kept in this file in the DC/OS Docker
+# directory.
+# ``reconfigure`` adds new extra configuration to it.
+_BASE_CONFIG_FILENAME = '.dcos-e2e-base-config.yaml'
+
+# `make` output can be very long.
+# Only this many of the last lines are kept in memory, for error reporting.
+MAKE_OUTPUT_LINES = 1000
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """
+    Make a file available at a new path without copying its contents where
+    possible.
+
+    The file is hard linked, so it must not be modified at either path.
+    If a hard link cannot be made, for example because the paths are on
+    different file systems, the file is copied.
+
+    Args:
+        src: The path to an existing file.
+        dst: The path to make the file available at.
+    """
+    try:
+        os.link(src=str(src), dst=str(dst))
+    except OSError:
+        copyfile(src=str(src), dst=str(dst))
+
+
+def _make_variables(
+    cluster_id: str,
+    masters: int,
+    agents: int,
+    public_agents: int,
+    custom_ca_key: Optional[Path],
+    labels: Dict[str, str],
+    host_storage_driver: str,
+) -> Dict[str, str]:
+    """
+    Return the `make` variables which describe a cluster to DC/OS Docker.
+
+    Args:
+        cluster_id: The random string which is part of the name of every
+            container in the cluster.
+        masters: The number of master nodes.
+        agents: The number of agent nodes.
+        public_agents: The number of public agent nodes.
+        custom_ca_key: A CA key to use as the cluster's root CA key.
+        labels: The labels to give every node container.
+        host_storage_driver: The Docker storage driver of the host.
+    """
+    master_ctr = 'dcos-master-{random}-'.format(random=cluster_id)
+    agent_ctr = 'dcos-agent-{random}-'.format(random=cluster_id)
+    public_agent_ctr = 'dcos-public-agent-{random}-'.format(random=cluster_id)
+    # Creating a cluster involves running a temporary installer
+    # container.
+    # Giving each cluster its own installer container name means that
+    # many clusters can be created at once without conflicting.
+    installer_ctr = 'dcos-installer-{random}'.format(random=cluster_id)
+    # Only overlay and aufs storage drivers are supported.
+    # This chooses the aufs driver so the host's driver is not used.
+    #
+    # This means that the tests will run even if the storage driver on
+    # the host is not one of these two.
+    #
+    # aufs was chosen as it is supported on the version of Docker on
+    # Travis CI.
+    supported_storage_drivers = ('overlay', 'aufs')
+    if host_storage_driver in supported_storage_drivers:
+        docker_storage_driver = host_storage_driver
+    else:
+        docker_storage_driver = 'aufs'
+
+    # The `*_MOUNTS` variables are extra arguments to `docker run` for
+    # each role.
+    # Every node is labeled so that it can be found and cleaned up if
+    # this process exits without destroying the cluster.
+    label_args = ' '.join(
+        '--label ' + shlex.quote(key + '=' + value)
+        for key, value in sorted(labels.items())
+    )
+    master_mounts = label_args
+    if custom_ca_key is not None:
+        master_mounts += ' -v {custom_ca_key}:{path}'.format(
+            custom_ca_key=custom_ca_key,
+            path=Path('/var/lib/dcos/pki/tls/CA/private/custom_ca.key'),
+        )
+
+    return {
+        'DOCKER_STORAGEDRIVER': docker_storage_driver,
+        # Some platforms support systemd and some do not.
+        # Disabling support makes all platforms consistent in this aspect.
+        'MESOS_SYSTEMD_ENABLE_SUPPORT': 'false',
+        # Number of nodes.
+        'MASTERS': str(masters),
+        'AGENTS': str(agents),
+        'PUBLIC_AGENTS': str(public_agents),
+        # Container names.
+        'MASTER_CTR': master_ctr,
+        'AGENT_CTR': agent_ctr,
+        'PUBLIC_AGENT_CTR': public_agent_ctr,
+        'INSTALLER_CTR': installer_ctr,
+        'MASTER_MOUNTS': master_mounts,
+        'AGENT_MOUNTS': label_args,
+        'PUBLIC_AGENT_MOUNTS': label_args,
+    }
+
+
+class DCOSDockerDirectory:
+    """
+    A copy of DC/OS Docker which is used to create one cluster, and the
+    `make` variables which describe the cluster.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        cluster_id: str,
+        masters: int,
+        agents: int,
+        public_agents: int,
+        extra_config: Dict[str, Any],
+        generate_config_path: Path,
+        dcos_docker_path: Path,
+        custom_ca_key: Optional[Path],
+        log_output_live: bool,
+        files_to_copy_to_installer: Dict[Path, Path],
+        genconf_cache: Optional[GenconfCache],
+        labels: Dict[str, str],
+        host_storage_driver: str,
+        timer: PhaseTimer,
+    ) -> None:
+        """
+        Copy DC/OS Docker and the build artifact to a new directory.
+
+        Args:
+            path: The directory to copy DC/OS Docker to.
+            cluster_id: See ``_make_variables``.
+            masters: See ``_make_variables``.
+            agents: See ``_make_variables``.
+            public_agents: See ``_make_variables``.
+            extra_config: See ``DCOS_Docker``.
+            generate_config_path: See ``DCOS_Docker``.
+            dcos_docker_path: See ``DCOS_Docker``.
+            custom_ca_key: See ``_make_variables``.
+            log_output_live: See ``DCOS_Docker``.
+            files_to_copy_to_installer: See ``DCOS_Docker``.
+            genconf_cache: See ``DCOS_Docker``.
+            labels: See ``_make_variables``.
+            host_storage_driver: See ``_make_variables``.
+            timer: A record of how long each `make` target takes.
+        """
+        self.path = path
+        self.cluster_id = cluster_id
+        self.labels = labels
+        self.log_output_live = log_output_live
+        self._timer = timer
+
+        # Files in the DC/OS Docker directory are copied rather than linked
+        # because `make` writes to some of them.
+        copytree(
+            src=str(dcos_docker_path),
+            dst=str(self.path),
+            # If there is already a config, we do not copy it as it will be
+            # overwritten and therefore copying it is wasteful.
+            # The Git history of a DC/OS Docker clone is not used.
+            ignore=ignore_patterns('dcos_generate_config.sh', '.git'),
+        )
+
+        if genconf_cache is None:
+            _link_or_copy(
+                src=generate_config_path,
+                dst=self.path / 'dcos_generate_config.sh',
+            )
+        else:
+            # DC/OS Docker runs a script which wraps the artifact and uses
+            # the cache.
+            artifact_path = self.path / 'dcos_generate_config.artifact.sh'
+            _link_or_copy(src=generate_config_path, dst=artifact_path)
+            wrapper_script = genconf_cache.wrapper_script(
+                artifact_path=artifact_path,
+                artifact_digest=genconf_cache.artifact_digest(
+                    artifact_path=generate_config_path,
+                ),
+            )
+            wrapper_path = self.path / 'dcos_generate_config.sh'
+            wrapper_path.write_text(wrapper_script)
+            wrapper_path.chmod(0o755)
+
+        # Files in the DC/OS Docker directory's genconf directory are mounted
+        # to the installer at `/genconf`.
+        # Therefore, every file which we want to copy to `/genconf` on the
+        # installer is put into the genconf directory in DC/OS Docker.
+        for host_path, installer_path in files_to_copy_to_installer.items():
+            relative_installer_path = installer_path.relative_to('/genconf')
+            destination_path = self.path / 'genconf' / relative_installer_path
+            copyfile(src=str(host_path), dst=str(destination_path))
+
+        self.variables = _make_variables(
+            cluster_id=cluster_id,
+            masters=masters,
+            agents=agents,
+            public_agents=public_agents,
+            custom_ca_key=custom_ca_key,
+            labels=labels,
+            host_storage_driver=host_storage_driver,
+        )
+        self.set_extra_config(extra_config=extra_config)
+        self.checkpoint(phases=[])
+
+    def set_extra_config(self, extra_config: Dict[str, Any]) -> None:
+        """
+        Set the extra installation configuration which DC/OS Docker adds to
+        its configuration.
+        """
+        # The variable is only given when there is extra configuration.
+        if extra_config:
+            self.variables['EXTRA_GENCONF_CONFIG'] = yaml.dump(
+                data=extra_config,
+                default_flow_style=False,
+            )
+        else:
+            self.variables.pop('EXTRA_GENCONF_CONFIG', None)
+
+    def role_base_names(self) -> Dict[str, str]:
+        """
+        Return a mapping of node roles to the start of the names of
+        containers with that role.
+        """
+        return {
+            'master': self.variables['MASTER_CTR'],
+            'agent': self.variables['AGENT_CTR'],
+            'public_agent': self.variables['PUBLIC_AGENT_CTR'],
+        }
+
+    def node_counts(self) -> Dict[str, int]:
+        """
+        Return a mapping of node roles to the number of nodes with that role.
+        """
+        return {
+            'master': int(self.variables['MASTERS']),
+            'agent': int(self.variables['AGENTS']),
+            'public_agent': int(self.variables['PUBLIC_AGENTS']),
+        }
+
+    @property
+    def ssh_key_path(self) -> Path:
+        """
+        Return the path to the SSH key which is authorized on the nodes.
+        """
+        return self.path / 'include' / 'ssh' / 'id_rsa'
+
+    def checkpoint(self, phases: List[str]) -> None:
+        """
+        Record the creation phases which have finished.
+        """
+        checkpoint_path = self.path / _CHECKPOINT_FILENAME
+        # Write atomically so that a partial record is never read.
+        tmp_path = self.path / '.tmp-{random}'.format(random=uuid.uuid4())
+        tmp_path.write_text(json.dumps(phases))
+        tmp_path.rename(checkpoint_path)
+
+    @property
+    def completed_phases(self) -> List[str]:
+        """
+        Return the phases of creating the cluster which have finished, in
+        order.
+        """
+        checkpoint_path = self.path / _CHECKPOINT_FILENAME
+        return list(json.loads(checkpoint_path.read_text()))
+
+    @property
+    def config_path(self) -> Path:
+        """
+        Return the path to the configuration which DC/OS Docker writes.
+        """
+        return self.path / 'genconf' / 'config.yaml'
+
+    @property
+    def base_config_path(self) -> Path:
+        """
+        Return the path to the configuration which DC/OS Docker wrote without
+        extra configuration, once ``make_base_config`` has been run.
+        """
+        return self.path / _BASE_CONFIG_FILENAME
+
+    def _base_config_args(self) -> List[str]:
+        """
+        Return the arguments to run `make` to write DC/OS Docker's
+        configuration for the cluster's nodes without extra configuration.
+
+        Any configuration which was written before is removed first, so that
+        it is written again.
+        """
+        if self.config_path.exists():
+            self.config_path.unlink()
+        variables = dict(self.variables)
+        variables.pop('EXTRA_GENCONF_CONFIG', None)
+        # DC/OS Docker names the configuration target with the absolute path
+        # of its directory, which `make` finds with symbolic links resolved.
+        target = self.path.resolve() / 'genconf' / 'config.yaml'
+        return self.make_args(target=str(target), variables=variables)
+
+    def _keep_base_config(self) -> None:
+        """
+        Keep the configuration written with ``_base_config_args``.
+
+        It is moved out of the way, so that the ``genconf`` phase writes the
+        configuration again with extra configuration.
+        """
+        self.config_path.rename(self.base_config_path)
+
+    def make_base_config(self) -> None:
+        """
+        Write DC/OS Docker's configuration for the cluster's nodes without
+        extra configuration, and keep it at ``base_config_path``.
+
+        Raises:
+            CalledProcessError: The configuration could not be written.
+        """
+        with self._timer.phase('make_base_config'):
+            run_subprocess(
+                args=self._base_config_args(),
+                cwd=str(self.path),
+                log_output_live=self.log_output_live,
+                max_output_lines=MAKE_OUTPUT_LINES,
+            )
+        self._keep_base_config()
+
+    async def make_base_config_async(self) -> None:
+        """
+        Write the base configuration without blocking the event loop.
+
+        See ``make_base_config``.
+        """
+        with self._timer.phase('make_base_config'):
+            await run_subprocess_async(
+                args=self._base_config_args(),
+                cwd=str(self.path),
+                log_output_live=self.log_output_live,
+                max_output_lines=MAKE_OUTPUT_LINES,
+            )
+        self._keep_base_config()
+
+    def make_args(
+        self,
+        target: str,
+        variables: Optional[Dict[str, str]]=None,
+    ) -> List[str]:
+        """
+        Return the arguments to run `make` in the DC/OS Docker directory
+        using the variables which describe the cluster.
+
+        Creation phases which have finished are not run again, even if they
+        are prerequisites of the target.
+
+        Args:
+            target: `make` target to run.
+            variables: Variables to use in place of those which describe the
+                cluster.
+        """
+        if variables is None:
+            variables = self.variables
+        return ['make'] + [
+            '--assume-old={phase}'.format(phase=phase)
+            for phase in self.completed_phases
+        ] + [
+            '{key}={value}'.format(key=key, value=value)
+            for key, value in variables.items()
+        ] + [target]
+
+    def make(self, args: List[str], target: str) -> None:
+        """
+        Run `make` in the DC/OS Docker directory.
+
+        Args:
+            args: The arguments to run `make` with, from ``make_args``.
+            target: The `make` target which is run, which names the phase.
+
+        Raises:
+            CalledProcessError: The process exited with a non-zero code.
+        """
+        with self._timer.phase('make_{target}'.format(target=target)):
+            run_subprocess(
+                args=args,
+                cwd=str(self.path),
+                log_output_live=self.log_output_live,
+                max_output_lines=MAKE_OUTPUT_LINES,
+            )
+
+    async def make_async(self, args: List[str], target: str) -> None:
+        """
+        Run `make` without blocking the event loop.
+
+        See ``make``.
+        """
+        with self._timer.phase('make_{target}'.format(target=target)):
+            await run_subprocess_async(
+                args=args,
+                cwd=str(self.path),
+                log_output_live=self.log_output_live,
+                max_output_lines=MAKE_OUTPUT_LINES,
+            )
+
+    def remove(self) -> None:
+        """
+        Remove the DC/OS Docker directory.
+        """
+        with self._timer.phase('remove_files'):
+            rmtree(
+                path=str(self.path),
+                # Some files may be created in the container that we cannot
+                # clean up.
+                ignore_errors=True,
+            )
@@ -0,0 +1,319 @@
+"""
+A fake backend which creates plain containers in place of DC/OS nodes.
+
+This is much faster than installing DC/OS, and it is useful for testing code
+which only needs nodes to run commands on, such as this harness itself.
+"""
+
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import IPv4Address
+from typing import Any, Dict, List, Optional, Set
+
+import docker
+
+from ._common import (
+    DockerExecTransport,
+    Node,
+    Transports,
+    UnsupportedOperation,
+)
+from ._node_cache import NodeCache
+from ._reaper import forget_cluster, record_cluster, remove_containers
+from .janitor import owner_labels
+from .timing import PhaseTimer
+
+# Nodes are containers created from this image.
+# It has the same operating system as DC/OS Docker nodes.
+_IMAGE = 'centos:7'
+
+
+class Fake:
+    """
+    A record of a fake cluster.
+
+    Nodes are plain containers which do not run DC/OS.
+    """
+
+    # Nodes are ready as soon as commands can be run on them.
+    readiness_probe_args = ['true']
+
+    def __init__(
+        self,
+        masters: int,
+        agents: int,
+        public_agents: int,
+        timer: Optional[PhaseTimer]=None,
+    ) -> None:
+        """
+        Prepare to create a fake cluster.
+
+        No containers are created until ``create_containers`` or
+        ``create_containers_async`` is called.
+
+        Args:
+            masters: The number of master nodes to create.
+            agents: The number of agent nodes to create.
+            public_agents: The number of public agent nodes to create.
+            timer: A record of how long each phase of the cluster's
+                lifecycle takes.
+        """
+        self._timer = timer or PhaseTimer()
+        self._cluster_id = str(uuid.uuid4())
+        self._client = docker.from_env()
+        self._node_counts = {
+            'master': masters,
+            'agent': agents,
+            'public_agent': public_agents,
+        }
+        # The containers of each role, by name.
+        self._containers = {
+            role: []
+            for role in self._node_counts
+        }  # type: Dict[str, List[str]]
+        self._nodes_cache = NodeCache(
+            discover=self._discover_nodes,
+            timer=self._timer,
+        )
+        record_cluster(cluster_id=self._cluster_id, paths=[])
+        self._labels = owner_labels(cluster_id=self._cluster_id, paths=[])
+
+    @property
+    def cluster_id(self) -> str:
+        """
+        Return the ID of this cluster, which is part of the name of every
+        container in the cluster.
+        """
+        return self._cluster_id
+
+    def describe(self) -> Dict[str, Any]:
+        """
+        Return a description of the cluster which other processes can use
+        to run commands on its nodes and to destroy it.
+
+        See ``DCOS_Docker.describe``.
+        """
+        nodes = {
+            role: []
+            for role in self._containers
+        }  # type: Dict[str, List[Dict[str, str]]]
+        for role, names in self._containers.items():
+            for name in names:
+                container = self._client.containers.get(name)
+                nodes[role].append(
+                    {
+                        'container_name': name,
+                        'ip_address':
+                        container.attrs['NetworkSettings']['IPAddress'],
+                    }
+                )
+        return {
+            'cluster_id': self._cluster_id,
+            'nodes': nodes,
+            'transport': Transports.DOCKER_EXEC.name,
+            'ssh_key_path': None,
+            'readiness_probe_args': self.readiness_probe_args,
+            'paths': [],
+        }
+
+    def _container_name(self, role: str, number: int) -> str:
+        """
+        Return the name of a node container.
+        """
+        # Names start with ``dcos-`` like the names of DC/OS Docker
+        # containers, so the same clean up commands work.
+        return 'dcos-fake-{role}-{cluster_id}-{number}'.format(
+            role=role.replace('_', '-'),
+            cluster_id=self._cluster_id,
+            number=number,
+        )
+
+    def create_containers(self) -> None:
+        """
+        Create and start a container for each node.
+
+        If creation fails, calling this again creates all containers again.
+
+        Raises:
+            docker.errors.APIError: A container could not be created.
+        """
+        if self._container_names():
+            # Containers which were created by a failed attempt are removed,
+            # as containers with the same names are created again.
+            remove_containers(client=self._client, cluster_id=self._cluster_id)
+            for names in self._containers.values():
+                names.clear()
+
+        for role, count in self._node_counts.items():
+            for number in range(1, count + 1):
+                name = self._container_name(role=role, number=number)
+                self._containers[role].append(name)
+
+        names = self._container_names()
+        with self._timer.phase('create_containers'):
+            try:
+                with ThreadPoolExecutor(max_workers=len(names) or 1) as pool:
+                    # Consume the results so that errors are raised.
+                    list(pool.map(self._run_container, names))
+            finally:
+                self.invalidate_nodes()
+
+    def _container_names(self) -> List[str]:
+        """
+        Return the names of all node containers.
+        """
+        return [
+            name for role_names in self._containers.values()
+            for name in role_names
+        ]
+
+    def _run_container(self, name: str) -> None:
+        """
+        Create and start a node container.
+        """
+        self._client.containers.run(
+            image=_IMAGE,
+            command=['sleep', 'infinity'],
+            name=name,
+            detach=True,
+            labels=self._labels,
+        )
+
+    async def create_containers_async(self) -> None:
+        """
+        Create and start a container for each node, without blocking the
+        event loop.
+        """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.create_containers)
+
+    def snapshot(self, name: str) -> None:
+        """
+        Snapshots of fake clusters are not supported.
+
+        Raises:
+            UnsupportedOperation: Always.
+        """
+        raise UnsupportedOperation(
+            'Snapshots are not supported by the fake backend.',
+        )
+
+    def reconfigure(self, extra_config: Dict[str, Any]) -> None:
+        """
+        Fake nodes do not run DC/OS, so they cannot be reconfigured.
+
+        Raises:
+            UnsupportedOperation: Always.
+        """
+        raise UnsupportedOperation(
+            'Reconfiguration is not supported by the fake backend.',
+        )
+
+    def scale_agents(self, agents: int) -> None:
+        """
+        Add or remove agent nodes.
+
+        See ``DCOS_Docker.scale_agents``.
+
+        Args:
+            agents: The number of agents which the cluster should have.
+
+        Raises:
+            ValueError: ``agents`` is negative.
+        """
+        if agents < 0:
+            raise ValueError('A cluster cannot have fewer than 0 agents.')
+
+        names = self._containers['agent']
+        with self._timer.phase('scale_agents'):
+            try:
+                if agents < len(names):
+                    removed = names[agents:]
+                    del names[agents:]
+                    with ThreadPoolExecutor(max_workers=len(removed)) as pool:
+                        list(pool.map(self._remove_container, removed))
+                else:
+                    added = [
+                        self._container_name(role='agent', number=number)
+                        for number in range(len(names) + 1, agents + 1)
+                    ]
+                    names.extend(added)
+                    workers = len(added) or 1
+                    with ThreadPoolExecutor(max_workers=workers) as pool:
+                        list(pool.map(self._run_container, added))
+            finally:
+                self._node_counts['agent'] = agents
+                self.invalidate_nodes()
+
+    def _remove_container(self, name: str) -> None:
+        """
+        Remove a node container and its volumes.
+        """
+        self._client.containers.get(name).remove(force=True, v=True)
+
+    def destroy(self) -> None:
+        """
+        Destroy all nodes in the cluster.
+        """
+        with self._timer.phase('remove_containers'):
+            remove_containers(client=self._client, cluster_id=self._cluster_id)
+        for names in self._containers.values():
+            names.clear()
+        self.invalidate_nodes()
+        forget_cluster(cluster_id=self._cluster_id)
+
+    async def destroy_async(self) -> None:
+        """
+        Destroy all nodes in the cluster, without blocking the event loop.
+        """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.destroy)
+
+    def invalidate_nodes(self) -> None:
+        """
+        Forget the cached nodes of this cluster.
+        """
+        self._nodes_cache.invalidate()
+
+    def _discover_nodes(self) -> Dict[str, Set[Node]]:
+        """
+        Return a mapping of roles to the nodes with that role.
+        """
+        nodes = {
+            role: set()
+            for role in self._containers
+        }  # type: Dict[str, Set[Node]]
+        for role, names in self._containers.items():
+            for name in names:
+                container = self._client.containers.get(name)
+                ip_address = container.attrs['NetworkSettings']['IPAddress']
+                node = Node(
+                    ip_address=IPv4Address(ip_address),
+                    # The nodes do not run SSH servers.
+                    transport=DockerExecTransport(container_name=name),
+                    timer=self._timer,
+                )
+                nodes[role].add(node)
+        return nodes
+
+    @property
+    def masters(self) -> Set[Node]:
+        """
+        Return all master ``Node``s.
+        """
+        return self._nodes_cache.nodes(role='master')
+
+    @property
+    def agents(self) -> Set[Node]:
+        """
+        Return all agent ``Node``s.
+        """
+        return self._nodes_cache.nodes(role='agent')
+
+    @property
+    def public_agents(self) -> Set[Node]:
+        """
+        Return all public agent ``Node``s.
+        """
+        return self._nodes_cache.nodes(role='public_agent')
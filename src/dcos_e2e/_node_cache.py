@@ -0,0 +1,62 @@
+"""
+A cache of the nodes of a cluster, which all backends use.
+"""
+
+from threading import Lock
+from typing import Callable, Dict, Optional, Set
+
+from ._common import Node
+from .timing import PhaseTimer
+
+
+class NodeCache:
+    """
+    The nodes of a cluster, which are found once and then cached.
+
+    The nodes are found again after ``invalidate`` is called.
+    """
+
+    def __init__(
+        self,
+        discover: Callable[[], Dict[str, Set[Node]]],
+        timer: PhaseTimer,
+        is_complete: Optional[Callable[[Dict[str, Set[Node]]], bool]]=None,
+    ) -> None:
+        """
+        Args:
+            discover: A function which finds the nodes of the cluster, and
+                returns a mapping of roles to the nodes with that role.
+            timer: A record of how long finding the nodes takes.
+            is_complete: A function which returns whether nodes which were
+                found can be cached, or `None` to cache any nodes which are
+                found. Nodes which are not cached are found again the next
+                time that they are needed.
+        """
+        self._discover = discover
+        self._timer = timer
+        self._is_complete = is_complete
+        self._nodes = None  # type: Optional[Dict[str, Set[Node]]]
+        self._lock = Lock()
+
+    def invalidate(self) -> None:
+        """
+        Forget the cached nodes.
+
+        This should be called whenever containers are created or removed.
+        """
+        with self._lock:
+            self._nodes = None
+
+    def nodes(self, role: str) -> Set[Node]:
+        """
+        Return the nodes with the given role.
+        """
+        with self._lock:
+            if self._nodes is not None:
+                return set(self._nodes[role])
+
+            with self._timer.phase('discover_nodes'):
+                nodes = self._discover()
+            if self._is_complete is None or self._is_complete(nodes):
+                self._nodes = nodes
+            return set(nodes[role])
@@ -0,0 +1,407 @@
+"""
+Helpers for tearing down clusters in the background.
+
+Each cluster is recorded in a file when it is created, and the record is
+removed when the cluster is torn down.
+A cluster is owned by the process which created it, and by any processes
+which it is shared with.
+If all owners of a cluster exit before the cluster is torn down, the cluster
+is torn down by the next process which tears down a cluster.
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from shutil import rmtree
+from threading import RLock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import docker
+
+from ._common import file_lock
+
+LOGGER = logging.getLogger(__name__)
+
+# Each cluster which has not been torn down is described by a file in this
+# directory.
+_RECORDS_PATH = Path('/tmp/dcos-e2e-clusters')
+
+# Records are changed while this lock is held, so that changes made by
+# different processes at once are not lost.
+_RECORDS_LOCK_PATH = _RECORDS_PATH / '.lock'
+
+
+def _record_path(cluster_id: str) -> Path:
+    """
+    Return the path to the record of a cluster.
+    """
+    return _RECORDS_PATH / '{cluster_id}.json'.format(cluster_id=cluster_id)
+
+
+def _write_record(record: Dict[str, Any]) -> None:
+    """
+    Write the record of a cluster.
+    """
+    _RECORDS_PATH.mkdir(parents=True, exist_ok=True)
+    # Write atomically so that other processes never read a partial record.
+    tmp_path = _RECORDS_PATH / '.tmp-{random}'.format(random=uuid.uuid4())
+    tmp_path.write_text(json.dumps(record))
+    tmp_path.rename(_record_path(cluster_id=record['cluster_id']))
+
+
+def _owner(attachment_id: str) -> Dict[str, Any]:
+    """
+    Return a description of this process as an owner of a cluster.
+    """
+    return {
+        'attachment_id': attachment_id,
+        'owner_host': socket.gethostname(),
+        'owner_pid': os.getpid(),
+        'created': time.time(),
+    }
+
+
+def record_cluster(cluster_id: str, paths: Iterable[Path]) -> None:
+    """
+    Record that this process owns a cluster.
+
+    The ID of this process's attachment to the cluster is the cluster ID.
+
+    Args:
+        cluster_id: A string which is part of the name of every container in
+            the cluster, and of no other containers.
+        paths: Files and directories on the host which belong to the cluster.
+    """
+    record = {
+        'cluster_id': cluster_id,
+        'owners': [_owner(attachment_id=cluster_id)],
+        'paths': [str(path) for path in paths],
+    }
+    with file_lock(path=_RECORDS_LOCK_PATH):
+        _write_record(record=record)
+
+
+def add_owner(cluster_id: str, attachment_id: str) -> bool:
+    """
+    Record that this process also owns a cluster.
+
+    Args:
+        cluster_id: See ``record_cluster``.
+        attachment_id: A unique ID for this ownership, to give to
+            ``remove_owner``.
+
+    Returns:
+        Whether the cluster is recorded. A cluster which is not recorded has
+        been torn down or it is being torn down.
+    """
+    with file_lock(path=_RECORDS_LOCK_PATH):
+        try:
+            record_text = _record_path(cluster_id=cluster_id).read_text()
+        except FileNotFoundError:
+            return False
+        record = json.loads(record_text)
+        record['owners'].append(_owner(attachment_id=attachment_id))
+        _write_record(record=record)
+    return True
+
+
+def remove_owner(cluster_id: str, attachment_id: str) -> bool:
+    """
+    Record that an owner of a cluster no longer uses it.
+
+    Owners which have exited are also removed.
+    If there are no owners left, the record is removed, and the cluster
+    must be torn down by the caller.
+
+    Args:
+        cluster_id: See ``record_cluster``.
+        attachment_id: The ID given to ``add_owner``, or the cluster ID for
+            the process which created the cluster.
+
+    Returns:
+        Whether there are no owners left.
+    """
+    with file_lock(path=_RECORDS_LOCK_PATH):
+        try:
+            record_text = _record_path(cluster_id=cluster_id).read_text()
+        except FileNotFoundError:
+            return False
+        record = json.loads(record_text)
+        record['owners'] = [
+            owner for owner in record['owners']
+            if owner['attachment_id'] != attachment_id and _owner_exists(owner)
+        ]
+        if record['owners']:
+            _write_record(record=record)
+            return False
+        forget_cluster(cluster_id=cluster_id)
+    return True
+
+
+def is_owned(cluster_id: str) -> bool:
+    """
+    Return whether any owner of a recorded cluster exists.
+
+    Args:
+        cluster_id: See ``record_cluster``.
+    """
+    try:
+        record = json.loads(_record_path(cluster_id=cluster_id).read_text())
+    except (FileNotFoundError, ValueError):
+        return False
+    return any(_owner_exists(owner) for owner in record['owners'])
+
+
+def forget_cluster(cluster_id: str) -> None:
+    """
+    Remove the record of a cluster which has been torn down.
+
+    Args:
+        cluster_id: See ``record_cluster``.
+    """
+    try:
+        _record_path(cluster_id=cluster_id).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def remove_containers(client: docker.DockerClient, cluster_id: str) -> None:
+    """
+    Remove all containers in a cluster and their volumes, in parallel.
+
+    Args:
+        client: A Docker client.
+        cluster_id: See ``record_cluster``.
+    """
+    # The name filter matches any part of a container's name.
+    containers = client.containers.list(
+        all=True,
+        filters={'name': cluster_id},
+    )
+    if not containers:
+        return
+
+    def remove(container: Any) -> None:
+        """
+        Remove a container, unless it has already been removed.
+        """
+        try:
+            container.remove(force=True, v=True)
+        except docker.errors.NotFound:
+            pass
+
+    with ThreadPoolExecutor(max_workers=len(containers)) as pool:
+        # Consume the results so that errors are raised.
+        list(pool.map(remove, containers))
+
+
+def _process_start_time(pid: int) -> Optional[float]:
+    """
+    Return the time at which a process started, in seconds since the epoch,
+    or `None` if this is not known.
+    """
+    try:
+        process_stat = Path('/proc', str(pid), 'stat').read_text()
+        system_stat = Path('/proc', 'stat').read_text()
+    except OSError:
+        # There is no ``/proc`` file system, or the process has exited.
+        return None
+
+    # The process name may contain spaces, so fields are counted from the end
+    # of the name.
+    # The start time is the 22nd field, in clock ticks after boot.
+    fields = process_stat[process_stat.rindex(')') + 2:].split()
+    start_ticks = int(fields[19])
+    for line in system_stat.splitlines():
+        if line.startswith('btime '):
+            boot_time = int(line.split()[1])
+            return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
+    return None
+
+
+def owner_exists(owner_host: str, owner_pid: int, created: float) -> bool:
+    """
+    Return whether the process which created a cluster exists.
+
+    Processes on other hosts are assumed to exist.
+
+    Args:
+        owner_host: The host name of the machine which created the cluster.
+        owner_pid: The ID of the process which created the cluster.
+        created: The time at which the cluster was created, in seconds since
+            the epoch.
+    """
+    if owner_host != socket.gethostname():
+        return True
+
+    try:
+        os.kill(owner_pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists but it belongs to another user.
+        pass
+
+    # Process IDs are reused.
+    # A process which started after the cluster was created is not the
+    # owner of the cluster.
+    started = _process_start_time(pid=owner_pid)
+    if started is None:
+        return True
+    # The start time is only accurate to within a second.
+    return started <= created + 1
+
+
+def _owner_exists(owner: Dict[str, Any]) -> bool:
+    """
+    Return whether the process described by an owner in a record exists.
+    """
+    return owner_exists(
+        owner_host=owner['owner_host'],
+        owner_pid=owner['owner_pid'],
+        created=owner['created'],
+    )
+
+
+def _claim_orphan(record_path: Path) -> Optional[Dict[str, Any]]:
+    """
+    Remove the record of a cluster if all of its owners have exited.
+
+    Returns:
+        The removed record, or `None` if the cluster is not an orphan.
+    """
+    # The lock stops an owner from being added after the owners are
+    # checked.
+    with file_lock(path=_RECORDS_LOCK_PATH):
+        try:
+            record = json.loads(record_path.read_text())
+        except (FileNotFoundError, ValueError):
+            # The record was removed.
+            return None
+        if any(_owner_exists(owner) for owner in record['owners']):
+            return None
+        forget_cluster(cluster_id=record['cluster_id'])
+    return dict(record)
+
+
+def reap_orphans() -> List[str]:
+    """
+    Tear down clusters whose owning processes have all exited.
+
+    Returns:
+        The IDs of the clusters which were torn down.
+    """
+    if not _RECORDS_PATH.exists():
+        return []
+
+    client = docker.from_env()
+    reaped = []
+    for record_path in _RECORDS_PATH.glob('*.json'):
+        record = _claim_orphan(record_path=record_path)
+        if record is None:
+            continue
+
+        cluster_id = record['cluster_id']
+        LOGGER.info('Tearing down orphaned cluster %s.', cluster_id)
+        remove_containers(client=client, cluster_id=cluster_id)
+        for path in record['paths']:
+            rmtree(path=path, ignore_errors=True)
+        reaped.append(cluster_id)
+    return reaped
+
+
+def _log_failure(future: Future) -> None:
+    """
+    Log the error raised by a teardown which failed.
+    """
+    exception = future.exception()
+    if exception is not None:
+        LOGGER.error('A cluster could not be torn down: %r', exception)
+
+
+class _Reaper:
+    """
+    Tears down clusters in background threads.
+
+    The threads are waited for when the interpreter exits.
+    """
+
+    def __init__(self) -> None:
+        self._executor = ThreadPoolExecutor()
+        self._futures = set()  # type: Set[Future]
+        # The lock is re-entrant because callbacks of futures which are
+        # already done are called by the thread which adds them.
+        self._lock = RLock()
+        self._orphans_reaped = False
+
+    def _track(self, future: Future) -> None:
+        """
+        Remember a teardown until it is finished.
+        """
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        future.add_done_callback(_log_failure)
+
+    def _forget(self, future: Future) -> None:
+        """
+        Forget a teardown which is finished.
+        """
+        with self._lock:
+            self._futures.discard(future)
+
+    def submit(self, teardown: Callable[[], None]) -> Future:
+        """
+        Tear down a cluster in the background.
+
+        Orphaned clusters are also torn down, the first time that this is
+        called in a process.
+
+        Args:
+            teardown: A function which tears down a cluster.
+
+        Returns:
+            A future which is done when the cluster is torn down.
+        """
+        with self._lock:
+            if not self._orphans_reaped:
+                self._orphans_reaped = True
+                self._track(future=self._executor.submit(reap_orphans))
+            future = self._executor.submit(teardown)
+            self._track(future=future)
+        return future
+
+    def _pending(self) -> Set[Future]:
+        """
+        Return the teardowns which are not finished.
+        """
+        with self._lock:
+            return set(self._futures)
+
+    def wait(self, timeout: Optional[float]=None) -> None:
+        """
+        Wait for all teardowns which have started to finish.
+
+        Args:
+            timeout: The maximum number of seconds to wait for, or `None` to
+                wait forever.
+
+        Raises:
+            TimeoutError: Teardowns did not finish in time.
+        """
+        _, not_done = wait(self._pending(), timeout=timeout)
+        if not_done:
+            message = (
+                '{count} clusters were not torn down after {timeout} seconds.'
+            )
+            raise TimeoutError(
+                message.format(count=len(not_done), timeout=timeout),
+            )
+
+
+REAPER = _Reaper()
@@ -0,0 +1,124 @@
+"""
+Helpers for changing the DC/OS configuration of a DC/OS Docker cluster in
+place.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Set
+
+import yaml
+
+from ._common import Node, map_nodes, run_subprocess
+from ._dcos_docker_directory import MAKE_OUTPUT_LINES, DCOSDockerDirectory
+from .timing import PhaseTimer
+
+
+def _node_upgrade_script(
+    directory: DCOSDockerDirectory,
+    extra_config: Dict[str, Any],
+    version: str,
+    timer: PhaseTimer,
+) -> Path:
+    """
+    Write the new configuration and generate a script which upgrades a node
+    to it.
+
+    Args:
+        directory: The DC/OS Docker directory of the cluster.
+        extra_config: See ``reconfigure_nodes``.
+        version: The installed version of DC/OS.
+        timer: A record of how long generating the script takes.
+
+    Returns:
+        The path to the script.
+    """
+    # The configuration written by DC/OS Docker includes details of the
+    # nodes, so it is built from the configuration written when the
+    # cluster was created rather than generated again.
+    # Extra configuration may have replaced values in that
+    # configuration, which are used again if they are no longer
+    # replaced.
+    config = yaml.safe_load(directory.base_config_path.read_text())
+    config.update(extra_config)
+    directory.config_path.write_text(
+        yaml.dump(config, default_flow_style=False),
+    )
+    directory.set_extra_config(extra_config=extra_config)
+
+    with timer.phase('generate_node_upgrade_script'):
+        run_subprocess(
+            args=[
+                'bash',
+                str(directory.path / 'dcos_generate_config.sh'),
+                '--generate-node-upgrade-script',
+                version,
+            ],
+            cwd=str(directory.path),
+            log_output_live=directory.log_output_live,
+            max_output_lines=MAKE_OUTPUT_LINES,
+        )
+    # Each configuration has its own upgrade directory.
+    # The newest script is for the configuration which was just written.
+    upgrade_scripts = (directory.path / 'genconf' / 'serve' / 'upgrade'
+                       ).glob('*/dcos_node_upgrade.sh')
+    return max(
+        upgrade_scripts,
+        key=lambda path: path.stat().st_mtime,
+    )
+
+
+def reconfigure_nodes(
+    directory: DCOSDockerDirectory,
+    masters: Set[Node],
+    agents: Set[Node],
+    extra_config: Dict[str, Any],
+    timer: PhaseTimer,
+) -> None:
+    """
+    Change the DC/OS configuration of a cluster in place.
+
+    See ``DCOS_Docker.reconfigure``.
+
+    Args:
+        directory: The DC/OS Docker directory of the cluster.
+        masters: The master nodes of the cluster.
+        agents: The agent and public agent nodes of the cluster.
+        extra_config: Extra installation configuration variables which
+            replace those given when the cluster was created.
+        timer: A record of how long each phase of reconfiguration takes.
+
+    Raises:
+        CalledProcessError: The configuration could not be changed.
+    """
+    version_file = next(iter(masters)).run_as_root(
+        args=['cat', '/opt/mesosphere/etc/dcos-version.json'],
+    )
+    version = json.loads(version_file.stdout.decode())['version']
+    upgrade_script = _node_upgrade_script(
+        directory=directory,
+        extra_config=extra_config,
+        version=version,
+        timer=timer,
+    )
+
+    def upgrade(node: Node) -> None:
+        """
+        Upgrade one node to the new configuration.
+        """
+        destination = Path('/tmp/dcos-e2e-upgrade')
+        node.send_files(sources=[upgrade_script], destination=destination)
+        node.run_as_root(
+            args=['bash', str(destination / upgrade_script.name)],
+            log_output_live=directory.log_output_live,
+        )
+
+    with timer.phase('upgrade_nodes'):
+        # Masters are upgraded one at a time so that there is always a
+        # quorum of masters.
+        for master in masters:
+            upgrade(node=master)
+        results = map_nodes(function=upgrade, nodes=agents)
+    for result in results.values():
+        if isinstance(result, Exception):
+            raise result
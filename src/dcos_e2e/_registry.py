@@ -0,0 +1,307 @@
+"""
+Helpers for sharing clusters between processes.
+
+A shared cluster is described by a file, so that other processes on the
+same host can attach to it and run commands on its nodes.
+Each process which attaches to a cluster becomes an owner of the cluster,
+and the cluster is destroyed when its last owner detaches.
+"""
+
+import asyncio
+import json
+import uuid
+from contextlib import contextmanager
+from ipaddress import IPv4Address
+from pathlib import Path
+from shutil import rmtree
+from typing import Any, Dict, Iterator, Optional, Set
+
+import docker
+
+from ._common import (
+    DockerExecTransport,
+    Node,
+    SSHTransport,
+    Transport,
+    Transports,
+    UnsupportedOperation,
+    file_lock,
+)
+from ._reaper import add_owner, forget_cluster, remove_containers
+from .timing import PhaseTimer
+
+# Each shared cluster is described by a file in this directory.
+_REGISTRY_PATH = Path('/tmp/dcos-e2e-registry')
+
+
+class ClusterAttachError(Exception):
+    """
+    Raised if a shared cluster cannot be attached to.
+    """
+
+
+def _description_path(cluster_id: str) -> Path:
+    """
+    Return the path to the description of a shared cluster.
+    """
+    return _REGISTRY_PATH / '{cluster_id}.json'.format(cluster_id=cluster_id)
+
+
+def register(description: Dict[str, Any], name: Optional[str]=None) -> None:
+    """
+    Describe a cluster so that other processes can attach to it.
+
+    Args:
+        description: A description of the cluster from its backend's
+            ``describe`` method.
+        name: A name which other processes can find the cluster by.
+    """
+    description = dict(description)
+    description['name'] = name
+    _REGISTRY_PATH.mkdir(parents=True, exist_ok=True)
+    # Write atomically so that other processes never read a partial
+    # description.
+    tmp_path = _REGISTRY_PATH / '.tmp-{random}'.format(random=uuid.uuid4())
+    tmp_path.write_text(json.dumps(description))
+    tmp_path.rename(_description_path(cluster_id=description['cluster_id']))
+
+
+def unregister(cluster_id: str) -> None:
+    """
+    Remove the description of a shared cluster.
+
+    Args:
+        cluster_id: The ID of the cluster.
+    """
+    try:
+        _description_path(cluster_id=cluster_id).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def find(name: str) -> Optional[str]:
+    """
+    Return the ID of the shared cluster with a given name, or `None` if
+    there is no such cluster.
+
+    Args:
+        name: The name given to ``register``.
+    """
+    if not _REGISTRY_PATH.exists():
+        return None
+
+    for path in _REGISTRY_PATH.glob('*.json'):
+        try:
+            description = json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            continue
+        if description['name'] == name:
+            return str(description['cluster_id'])
+    return None
+
+
+@contextmanager
+def creation_lock(name: str) -> Iterator[None]:
+    """
+    Hold a lock which is held by one process at a time while it finds or
+    creates the shared cluster with a given name.
+
+    Args:
+        name: The name of the shared cluster.
+    """
+    lock_path = _REGISTRY_PATH / '{name}.lock'.format(name=name)
+    with file_lock(path=lock_path):
+        yield
+
+
+def attach(cluster_id: str) -> Dict[str, Any]:
+    """
+    Become an owner of a shared cluster.
+
+    Args:
+        cluster_id: The ID of the cluster.
+
+    Returns:
+        The description of the cluster, with an ``attachment_id`` which
+        identifies this ownership.
+
+    Raises:
+        ClusterAttachError: There is no shared cluster with the given ID, or
+            it is being destroyed.
+    """
+    try:
+        description = json.loads(
+            _description_path(cluster_id=cluster_id).read_text(),
+        )
+    except FileNotFoundError:
+        message = 'There is no shared cluster with the ID {cluster_id}.'
+        raise ClusterAttachError(message.format(cluster_id=cluster_id))
+
+    attachment_id = str(uuid.uuid4())
+    if not add_owner(cluster_id=cluster_id, attachment_id=attachment_id):
+        unregister(cluster_id=cluster_id)
+        message = 'The cluster {cluster_id} is being destroyed.'
+        raise ClusterAttachError(message.format(cluster_id=cluster_id))
+    description['attachment_id'] = attachment_id
+    return dict(description)
+
+
+class Attached:
+    """
+    A record of a cluster which was created by another process.
+    """
+
+    def __init__(
+        self,
+        description: Dict[str, Any],
+        timer: Optional[PhaseTimer]=None,
+    ) -> None:
+        """
+        Args:
+            description: The description of the cluster from ``attach``.
+            timer: A record of how long each phase of the cluster's
+                lifecycle takes.
+        """
+        self._description = description
+        self._timer = timer or PhaseTimer()
+        self.readiness_probe_args = [
+            str(arg) for arg in description['readiness_probe_args']
+        ]
+        self._nodes_by_role = {
+            role: set(
+                Node(
+                    ip_address=IPv4Address(node['ip_address']),
+                    transport=self._node_transport(
+                        ip_address=IPv4Address(node['ip_address']),
+                        container_name=node['container_name'],
+                    ),
+                    timer=self._timer,
+                ) for node in nodes
+            )
+            for role, nodes in description['nodes'].items()
+        }
+
+    def _node_transport(
+        self,
+        ip_address: IPv4Address,
+        container_name: str,
+    ) -> Transport:
+        """
+        Return the way to run commands on a node.
+        """
+        transport = Transports.lookupByName(self._description['transport'])
+        if transport == Transports.DOCKER_EXEC:
+            return DockerExecTransport(container_name=container_name)
+        # SSH connections are not reused, as the sockets would belong to
+        # the process which created the cluster.
+        return SSHTransport(
+            ip_address=ip_address,
+            ssh_key_path=Path(self._description['ssh_key_path']),
+        )
+
+    @property
+    def cluster_id(self) -> str:
+        """
+        Return the ID of this cluster.
+        """
+        return str(self._description['cluster_id'])
+
+    @property
+    def attachment_id(self) -> str:
+        """
+        Return the ID of this process's ownership of the cluster.
+        """
+        return str(self._description['attachment_id'])
+
+    def describe(self) -> Dict[str, Any]:
+        """
+        Return the description of this cluster.
+        """
+        return dict(self._description)
+
+    def create_containers(self) -> None:
+        """
+        Do nothing, as an attached cluster is already created.
+        """
+
+    def snapshot(self, name: str) -> None:
+        """
+        Snapshots of attached clusters are not supported.
+
+        Raises:
+            UnsupportedOperation: Always.
+        """
+        raise UnsupportedOperation(
+            'Snapshots are only supported by the process which created the '
+            'cluster.',
+        )
+
+    def reconfigure(self, extra_config: Dict[str, Any]) -> None:
+        """
+        Reconfiguration of attached clusters is not supported.
+
+        Raises:
+            UnsupportedOperation: Always.
+        """
+        raise UnsupportedOperation(
+            'Reconfiguration is only supported by the process which created '
+            'the cluster.',
+        )
+
+    def scale_agents(self, agents: int) -> None:
+        """
+        Scaling attached clusters is not supported.
+
+        Raises:
+            UnsupportedOperation: Always.
+        """
+        raise UnsupportedOperation(
+            'Scaling is only supported by the process which created the '
+            'cluster.',
+        )
+
+    def destroy(self) -> None:
+        """
+        Destroy all nodes in the cluster, and remove its files.
+        """
+        with self._timer.phase('remove_containers'):
+            remove_containers(
+                client=docker.from_env(),
+                cluster_id=self.cluster_id,
+            )
+        for path in self._description['paths']:
+            rmtree(path=path, ignore_errors=True)
+        forget_cluster(cluster_id=self.cluster_id)
+
+    async def destroy_async(self) -> None:
+        """
+        Destroy all nodes in the cluster, without blocking the event loop.
+        """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.destroy)
+
+    def invalidate_nodes(self) -> None:
+        """
+        Do nothing, as the nodes of an attached cluster do not change.
+        """
+
+    @property
+    def masters(self) -> Set[Node]:
+        """
+        Return all DC/OS master ``Node``s.
+        """
+        return set(self._nodes_by_role['master'])
+
+    @property
+    def agents(self) -> Set[Node]:
+        """
+        Return all DC/OS agent ``Node``s.
+        """
+        return set(self._nodes_by_role['agent'])
+
+    @property
+    def public_agents(self) -> Set[Node]:
+        """
+        Return all DC/OS public agent ``Node``s.
+        """
+        return set(self._nodes_by_role['public_agent'])
@@ -0,0 +1,246 @@
+"""
+Helpers for adding agents to and removing agents from a DC/OS Docker cluster.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import IPv4Address
+from pathlib import Path
+from subprocess import CalledProcessError
+from typing import Any, Dict, Set
+
+import docker
+
+from ._common import Node, map_nodes, run_subprocess
+from ._dcos_docker_directory import DCOSDockerDirectory
+from .timing import PhaseTimer
+
+# The number of seconds to wait for SSH to start on a new node.
+_SSH_START_TIMEOUT = 60
+
+
+def _agent_containers(
+    client: docker.DockerClient,
+    directory: DCOSDockerDirectory,
+) -> Dict[int, Any]:
+    """
+    Return the agent containers of a cluster, by their numbers.
+    """
+    base_name = directory.variables['AGENT_CTR']
+    return {
+        int(container.name[len(base_name):]): container
+        for container in client.containers.list(
+            all=True,
+            filters={'name': base_name},
+        ) if container.name.startswith(base_name)
+    }
+
+
+def remove_agents(
+    client: docker.DockerClient,
+    directory: DCOSDockerDirectory,
+    agents: int,
+    nodes: Set[Node],
+) -> None:
+    """
+    Remove the highest numbered agents of a cluster.
+
+    Args:
+        client: The Docker client which the cluster uses.
+        directory: The DC/OS Docker directory of the cluster.
+        agents: The number of agents to keep.
+        nodes: The agent nodes of the cluster.
+    """
+    removed = [
+        container
+        for number, container in _agent_containers(
+            client=client,
+            directory=directory,
+        ).items() if number > agents
+    ]
+    removed_ip_addresses = set(
+        IPv4Address(container.attrs['NetworkSettings']['IPAddress'])
+        for container in removed
+    )
+    for node in nodes:
+        if node.ip_address in removed_ip_addresses:
+            node.close_connection()
+    # There may be no containers to remove, for example if they were
+    # removed outside of this harness.
+    with ThreadPoolExecutor(max_workers=len(removed) or 1) as pool:
+        # Consume the results so that errors are raised.
+        list(
+            pool.map(
+                lambda container: container.remove(force=True, v=True),
+                removed,
+            )
+        )
+    directory.variables['AGENTS'] = str(agents)
+
+
+def add_agents(
+    client: docker.DockerClient,
+    directory: DCOSDockerDirectory,
+    agents: int,
+) -> Set[IPv4Address]:
+    """
+    Create agent containers, with the next numbers after the existing
+    agents, without installing DC/OS on them.
+
+    Args:
+        client: The Docker client which the cluster uses.
+        directory: The DC/OS Docker directory of the cluster.
+        agents: The number of agents which the cluster should have.
+
+    Returns:
+        The IP addresses of the new agents.
+
+    Raises:
+        ValueError: The cluster has no agents to copy.
+    """
+    containers = _agent_containers(client=client, directory=directory)
+    # New agents are created like an existing agent, as the DC/OS Docker
+    # `make` targets create every node of a role at once.
+    # Nodes of other roles have different mounts and settings, so they
+    # are not copied.
+    if not containers:
+        raise ValueError(
+            'Agents can only be added to a cluster with an agent to copy.',
+        )
+    template = next(iter(containers.values()))
+
+    base_name = directory.variables['AGENT_CTR']
+    current = int(directory.variables['AGENTS'])
+    names = [
+        base_name + str(number) for number in range(current + 1, agents + 1)
+    ]
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        new_ip_addresses = set(
+            pool.map(
+                lambda name: _start_node_container(
+                    client=client,
+                    template=template,
+                    name=name,
+                    labels=directory.labels,
+                ),
+                names,
+            )
+        )
+    directory.variables['AGENTS'] = str(agents)
+    return new_ip_addresses
+
+
+def install_agents(
+    directory: DCOSDockerDirectory,
+    nodes: Set[Node],
+    timer: PhaseTimer,
+) -> None:
+    """
+    Install DC/OS on new agents.
+
+    Args:
+        directory: The DC/OS Docker directory of the cluster.
+        nodes: The new agent nodes.
+        timer: A record of how long installing DC/OS takes.
+
+    Raises:
+        CalledProcessError: DC/OS could not be installed on an agent.
+    """
+    install_script = directory.path / 'genconf' / 'serve' / 'dcos_install.sh'
+
+    def install(node: Node) -> None:
+        """
+        Install DC/OS on one new agent.
+        """
+        destination = Path('/tmp/dcos-e2e-install')
+        node.send_files(sources=[install_script], destination=destination)
+        node.run_as_root(
+            args=[
+                'bash',
+                str(destination / install_script.name),
+                '--no-block-dcos-setup',
+                'slave',
+            ],
+            log_output_live=directory.log_output_live,
+        )
+
+    with timer.phase('install_agents'):
+        results = map_nodes(function=install, nodes=nodes)
+    for result in results.values():
+        if isinstance(result, Exception):
+            raise result
+
+
+def _start_node_container(
+    client: docker.DockerClient,
+    template: Any,
+    name: str,
+    labels: Dict[str, str],
+) -> IPv4Address:
+    """
+    Create and start a node container like an existing node container.
+
+    Args:
+        client: The Docker client to use.
+        template: The container to copy.
+        name: The name of the new container, which is also its host name.
+        labels: The labels to give the new container.
+
+    Returns:
+        The IP address of the new container.
+    """
+    api = client.api
+    config = template.attrs['Config']
+    host_config = template.attrs['HostConfig']
+    # DC/OS Docker sets this variable to the name of the container.
+    environment = [
+        variable for variable in config['Env'] or []
+        if not variable.startswith('container=')
+    ] + ['container=' + name]
+    # Volumes which are not bound to host paths are new for each node.
+    volumes = [
+        mount['Destination'] for mount in template.attrs['Mounts']
+        if mount['Type'] == 'volume'
+    ]
+    container = api.create_container(
+        image=config['Image'],
+        command=config['Cmd'],
+        name=name,
+        hostname=name,
+        environment=environment,
+        volumes=volumes,
+        labels=labels,
+        tty=True,
+        detach=True,
+        host_config=api.create_host_config(
+            binds=host_config['Binds'] or [],
+            privileged=host_config['Privileged'],
+            tmpfs=host_config.get('Tmpfs') or {},
+            security_opt=host_config['SecurityOpt'] or [],
+            extra_hosts=host_config['ExtraHosts'] or [],
+        ),
+    )
+    api.start(container=container['Id'])
+    attrs = api.inspect_container(container=container['Id'])
+    ip_address = IPv4Address(attrs['NetworkSettings']['IPAddress'])
+
+    # Like DC/OS Docker, start SSH once systemd is running.
+    deadline = time.monotonic() + _SSH_START_TIMEOUT
+    while True:
+        try:
+            run_subprocess(
+                args=[
+                    'docker',
+                    'exec',
+                    name,
+                    'systemctl',
+                    'start',
+                    'sshd.service',
+                ],
+                log_output_live=False,
+            )
+            return ip_address
+        except CalledProcessError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1)
@@ -0,0 +1,393 @@
+"""
+Helpers for saving DC/OS Docker clusters as snapshots and for restoring
+clusters from snapshots.
+"""
+
+import json
+from ipaddress import IPv4Address
+from pathlib import Path
+from shutil import copyfile, copyfileobj, copytree, rmtree
+from typing import Any, Dict, List
+
+import docker
+
+from ._dcos_docker_directory import DCOSDockerDirectory
+from .timing import PhaseTimer
+
+# Snapshots of clusters are described by files in this directory.
+# Container images of snapshot nodes are stored by Docker.
+_SNAPSHOTS_PATH = Path('/tmp/dcos-e2e-snapshots')
+_SNAPSHOT_IMAGE_REPOSITORY = 'dcos-e2e-snapshot'
+
+# Volumes at these paths are not included in snapshots.
+# `/var/lib/docker` holds images of tasks run on Docker in the node, which are
+# large and which are downloaded again when they are needed.
+_UNSNAPSHOTTED_VOLUMES = ('/var/lib/docker', )
+
+# Files which are bind mounted from a cluster's directory are saved in this
+# directory of a snapshot.
+_SNAPSHOT_FILES_DIRECTORY = 'files'
+
+
+class SnapshotRestoreError(Exception):
+    """
+    Raised if a cluster cannot be restored from a snapshot.
+    """
+
+
+def _snapshot_path(name: str) -> Path:
+    """
+    Return the directory which describes a cluster snapshot.
+
+    Args:
+        name: The name of the snapshot.
+
+    Raises:
+        ValueError: The name is not a single path component, so the
+            directory would not be in the snapshots directory.
+    """
+    if name in ('', '.', '..') or '/' in name:
+        message = 'The snapshot name "{name}" is not valid.'.format(name=name)
+        raise ValueError(message)
+    return _SNAPSHOTS_PATH / name
+
+
+def read_snapshot_manifest(name: str) -> Dict[str, Any]:
+    """
+    Return the description of a cluster snapshot.
+
+    Args:
+        name: The name of the snapshot.
+
+    Raises:
+        SnapshotRestoreError: There is no snapshot with the given name.
+        ValueError: The name is not valid.
+    """
+    manifest_path = _snapshot_path(name=name) / 'manifest.json'
+    try:
+        return dict(json.loads(manifest_path.read_text()))
+    except FileNotFoundError:
+        message = 'There is no snapshot named {name}.'.format(name=name)
+        raise SnapshotRestoreError(message)
+
+
+def remove_snapshot(name: str) -> None:
+    """
+    Remove a cluster snapshot and its container images.
+
+    Args:
+        name: The name of the snapshot.
+
+    Raises:
+        SnapshotRestoreError: There is no snapshot with the given name.
+        ValueError: The name is not valid.
+    """
+    manifest = read_snapshot_manifest(name=name)
+    client = docker.from_env()
+    for node in manifest['nodes']:
+        client.images.remove(image=node['image'], force=True)
+    rmtree(path=str(_snapshot_path(name=name)))
+
+
+def save_snapshot(
+    name: str,
+    client: docker.DockerClient,
+    directory: DCOSDockerDirectory,
+    timer: PhaseTimer,
+) -> None:
+    """
+    Save the state of all nodes in a cluster.
+
+    See ``DCOS_Docker.snapshot``.
+
+    Args:
+        name: The name of the snapshot.
+        client: The Docker client which the cluster uses.
+        directory: The DC/OS Docker directory of the cluster.
+        timer: A record of how long saving the snapshot takes.
+
+    Raises:
+        FileExistsError: A snapshot with the given name exists.
+        ValueError: The name is not valid.
+    """
+    snapshot_path = _snapshot_path(name=name)
+    snapshot_path.mkdir(parents=True)
+    try:
+        with timer.phase('snapshot'):
+            _save_nodes(
+                name=name,
+                client=client,
+                directory=directory,
+                snapshot_path=snapshot_path,
+            )
+    except Exception:
+        rmtree(path=str(snapshot_path))
+        raise
+
+
+def _save_nodes(
+    name: str,
+    client: docker.DockerClient,
+    directory: DCOSDockerDirectory,
+    snapshot_path: Path,
+) -> None:
+    """
+    See ``save_snapshot``.
+
+    Args:
+        name: The name of the snapshot.
+        client: The Docker client which the cluster uses.
+        directory: The DC/OS Docker directory of the cluster.
+        snapshot_path: The directory to save the snapshot's files in.
+    """
+    copyfile(
+        src=str(directory.ssh_key_path),
+        dst=str(snapshot_path / 'id_rsa'),
+    )
+
+    containers = client.containers.list(
+        filters={'name': directory.cluster_id},
+    )
+    nodes = []  # type: List[Dict[str, Any]]
+    for role, base_name in directory.role_base_names().items():
+        for container in containers:
+            if not container.name.startswith(base_name):
+                continue
+
+            number = container.name[len(base_name):]
+            node_name = '{role}-{number}'.format(role=role, number=number)
+            image = container.commit(
+                repository=_SNAPSHOT_IMAGE_REPOSITORY,
+                tag='{name}-{node_name}'.format(
+                    name=name,
+                    node_name=node_name,
+                ),
+            )
+
+            volumes = {}  # type: Dict[str, str]
+            for mount in container.attrs['Mounts']:
+                destination = mount['Destination']
+                if mount['Type'] != 'volume':
+                    continue
+                if destination in _UNSNAPSHOTTED_VOLUMES:
+                    continue
+                archive_name = '{node_name}-{number}.tar'.format(
+                    node_name=node_name,
+                    number=len(volumes),
+                )
+                stream, _ = container.get_archive(path=destination)
+                with (snapshot_path / archive_name).open('wb') as file:
+                    copyfileobj(stream, file)
+                volumes[destination] = archive_name
+
+            host_config = container.attrs['HostConfig']
+            binds = []  # type: List[str]
+            cluster_binds = []  # type: List[Dict[str, str]]
+            for bind in host_config['Binds'] or []:
+                source, _, target = bind.partition(':')
+                try:
+                    relative = Path(source).relative_to(directory.path)
+                except ValueError:
+                    # Files outside of the cluster's directory, such as the
+                    # host's cgroups, are not removed with the cluster.
+                    binds.append(bind)
+                    continue
+                # Files in the cluster's directory are removed when the
+                # cluster is destroyed, so they are saved with the snapshot.
+                _save_cluster_file(
+                    source=directory.path / relative,
+                    destination=(
+                        snapshot_path / _SNAPSHOT_FILES_DIRECTORY / relative
+                    ),
+                )
+                cluster_binds.append(
+                    {
+                        'path': str(relative),
+                        'target': target,
+                    }
+                )
+
+            nodes.append(
+                {
+                    'role': role,
+                    'number': number,
+                    'image': image.id,
+                    'hostname': container.attrs['Config']['Hostname'],
+                    'ip_address':
+                    container.attrs['NetworkSettings']['IPAddress'],
+                    'privileged': host_config['Privileged'],
+                    'binds': binds,
+                    'cluster_binds': cluster_binds,
+                    'tmpfs': host_config.get('Tmpfs') or {},
+                    'security_opt': host_config['SecurityOpt'] or [],
+                    'volumes': volumes,
+                }
+            )
+
+    node_counts = directory.node_counts()
+    manifest = {
+        'masters': node_counts['master'],
+        'agents': node_counts['agent'],
+        'public_agents': node_counts['public_agent'],
+        'nodes': nodes,
+    }
+    manifest_path = snapshot_path / 'manifest.json'
+    manifest_path.write_text(json.dumps(manifest, indent=4))
+
+
+def _save_cluster_file(source: Path, destination: Path) -> None:
+    """
+    Copy a file or directory in a cluster's directory to a snapshot, unless
+    it has been copied already.
+
+    Args:
+        source: The path to copy.
+        destination: The path to copy to in the snapshot's directory.
+    """
+    if destination.exists():
+        return
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    if source.is_dir():
+        copytree(src=str(source), dst=str(destination), symlinks=True)
+    else:
+        copyfile(src=str(source), dst=str(destination))
+
+
+def _restore_cluster_files(snapshot_path: Path, cluster_path: Path) -> None:
+    """
+    Copy files saved with a snapshot into a cluster's directory, in place of
+    any files there with the same paths.
+
+    Args:
+        snapshot_path: The snapshot's directory.
+        cluster_path: The cluster's directory.
+    """
+    files_path = snapshot_path / _SNAPSHOT_FILES_DIRECTORY
+    if not files_path.exists():
+        return
+    for source in files_path.glob('**/*'):
+        relative = source.relative_to(files_path)
+        destination = cluster_path / relative
+        if source.is_dir() and not source.is_symlink():
+            destination.mkdir(parents=True, exist_ok=True)
+            continue
+        if destination.is_symlink() or destination.is_file():
+            destination.unlink()
+        elif destination.is_dir():
+            rmtree(path=str(destination))
+        copyfile(
+            src=str(source),
+            dst=str(destination),
+            follow_symlinks=False,
+        )
+
+
+def _check_snapshot_addresses(
+    client: docker.DockerClient,
+    nodes: List[Dict[str, Any]],
+) -> None:
+    """
+    Check that no existing container has an IP address which a node of a
+    snapshot needs.
+
+    Raises:
+        SnapshotRestoreError: A container has one of the IP addresses.
+    """
+    needed = {node['ip_address'] for node in nodes}
+    for container in client.containers.list():
+        ip_address = container.attrs['NetworkSettings']['IPAddress']
+        if ip_address in needed:
+            message = (
+                'The container {name} has the IP address {ip_address} '
+                'which a node in the snapshot needs. '
+                'Destroy the cluster which the snapshot was taken from '
+                'before restoring the snapshot.'
+            ).format(
+                name=container.name,
+                ip_address=ip_address,
+            )
+            raise SnapshotRestoreError(message)
+
+
+def load_snapshot(
+    name: str,
+    client: docker.DockerClient,
+    directory: DCOSDockerDirectory,
+) -> None:
+    """
+    Create containers for a cluster from a snapshot.
+
+    See ``DCOS_Docker.restore_snapshot``.
+
+    Args:
+        name: The name of the snapshot.
+        client: The Docker client which the cluster uses.
+        directory: The DC/OS Docker directory of the cluster.
+
+    Raises:
+        SnapshotRestoreError: The snapshot does not exist, an existing
+            container has an IP address which a node needs, or a node was
+            not given the IP address which it had in the snapshot.
+    """
+    manifest = read_snapshot_manifest(name=name)
+    snapshot_path = _snapshot_path(name=name)
+    ssh_key_path = directory.ssh_key_path
+    ssh_key_path.parent.mkdir(parents=True, exist_ok=True)
+    copyfile(src=str(snapshot_path / 'id_rsa'), dst=str(ssh_key_path))
+    ssh_key_path.chmod(0o600)
+    _restore_cluster_files(
+        snapshot_path=snapshot_path,
+        cluster_path=directory.path,
+    )
+    _check_snapshot_addresses(client=client, nodes=manifest['nodes'])
+
+    base_names = directory.role_base_names()
+    # Docker gives the lowest free IP address to each new container.
+    # Creating containers in the order of their old IP addresses is the
+    # best chance of them getting the same IP addresses.
+    nodes = sorted(
+        manifest['nodes'],
+        key=lambda node: IPv4Address(node['ip_address']),
+    )
+    for node in nodes:
+        # Snapshots taken by older versions do not save files in the
+        # cluster's directory.
+        cluster_binds = [
+            '{source}:{target}'.format(
+                source=directory.path / bind['path'],
+                target=bind['target'],
+            ) for bind in node.get('cluster_binds', [])
+        ]
+        container = client.containers.create(
+            image=node['image'],
+            name=base_names[node['role']] + node['number'],
+            hostname=node['hostname'],
+            privileged=node['privileged'],
+            volumes=node['binds'] + cluster_binds,
+            tmpfs=node['tmpfs'],
+            security_opt=node['security_opt'],
+            # Labels from the snapshot image are replaced.
+            labels=directory.labels,
+            detach=True,
+        )
+        for destination, archive_name in node['volumes'].items():
+            # Archives contain the volume directory itself.
+            with (snapshot_path / archive_name).open('rb') as file:
+                container.put_archive(
+                    path=str(Path(destination).parent),
+                    data=file,
+                )
+        container.start()
+        container.reload()
+        ip_address = container.attrs['NetworkSettings']['IPAddress']
+        if ip_address != node['ip_address']:
+            message = (
+                'The {role} node {number} was given the IP address '
+                '{ip_address} but it had {expected} in the snapshot.'
+            ).format(
+                role=node['role'],
+                number=node['number'],
+                ip_address=ip_address,
+                expected=node['ip_address'],
+            )
+            raise SnapshotRestoreError(message)
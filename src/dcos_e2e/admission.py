@@ -0,0 +1,359 @@
+"""
+Admission control for creating many clusters at once on one host.
+
+Creating too many DC/OS Docker clusters at once exhausts the host's memory
+and disk, and installations time out.
+An ``AdmissionScheduler`` estimates the resources which a cluster needs from
+its number of nodes, and lets the cluster be created only when the host has
+those resources free.
+
+Clusters which are admitted but not yet created are recorded in files, so
+that schedulers in different processes on the same host, such as
+``pytest-xdist`` workers, take each other's clusters into account.
+"""
+
+import json
+import logging
+import os
+import shutil
+import socket
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+import docker
+
+from ._common import file_lock
+from ._reaper import owner_exists
+
+LOGGER = logging.getLogger(__name__)
+
+_GIB = 1024**3
+_MIB = 1024**2
+
+Resources = NamedTuple(
+    'Resources',
+    [
+        # Memory, in bytes.
+        ('memory', int),
+        # CPU cores.
+        ('cpus', float),
+        # Disk space, in bytes.
+        ('disk', int),
+    ],
+)
+
+NodeCosts = NamedTuple(
+    'NodeCosts',
+    [
+        # The resources needed by each node with each role.
+        ('master', Resources),
+        ('agent', Resources),
+        ('public_agent', Resources),
+    ],
+)
+
+# Estimates of the resources needed by nodes of DC/OS Docker clusters while
+# DC/OS is installed and soon after.
+DCOS_DOCKER_COSTS = NodeCosts(
+    master=Resources(memory=3 * _GIB, cpus=1.0, disk=4 * _GIB),
+    agent=Resources(memory=int(1.5 * _GIB), cpus=0.5, disk=3 * _GIB),
+    public_agent=Resources(memory=1 * _GIB, cpus=0.5, disk=3 * _GIB),
+)
+
+# Estimates of the resources needed by nodes of fake clusters.
+_FAKE_NODE_COST = Resources(memory=32 * _MIB, cpus=0.05, disk=16 * _MIB)
+FAKE_COSTS = NodeCosts(
+    master=_FAKE_NODE_COST,
+    agent=_FAKE_NODE_COST,
+    public_agent=_FAKE_NODE_COST,
+)
+
+# Each cluster which is admitted but not yet created is described by a file
+# in this directory.
+_RESERVATIONS_PATH = Path('/tmp/dcos-e2e-admission')
+
+# Admission decisions are made while this lock is held, so that two
+# processes do not admit clusters with the same free resources.
+_RESERVATIONS_LOCK_PATH = _RESERVATIONS_PATH / '.lock'
+
+
+def _add(first: Resources, second: Resources) -> Resources:
+    """
+    Return the sum of two amounts of resources.
+    """
+    return Resources(
+        memory=first.memory + second.memory,
+        cpus=first.cpus + second.cpus,
+        disk=first.disk + second.disk,
+    )
+
+
+def _subtract(first: Resources, second: Resources) -> Resources:
+    """
+    Return the difference between two amounts of resources.
+    """
+    return Resources(
+        memory=first.memory - second.memory,
+        cpus=first.cpus - second.cpus,
+        disk=first.disk - second.disk,
+    )
+
+
+def _fits(needed: Resources, available: Resources) -> bool:
+    """
+    Return whether every resource needed is available.
+    """
+    return all(need <= have for need, have in zip(needed, available))
+
+
+def _docker_root() -> Optional[Path]:
+    """
+    Return Docker's storage directory, or `None` if it is not on this host.
+    """
+    try:
+        root = Path(docker.from_env().info()['DockerRootDir'])
+    # Errors connecting to the Docker daemon are raised by ``requests``, and
+    # they are subclasses of ``OSError``.
+    except (docker.errors.DockerException, OSError, KeyError):
+        return None
+    # The Docker daemon may run in a virtual machine or on another host.
+    return root if root.exists() else None
+
+
+def _meminfo(field: str) -> int:
+    """
+    Return a field of ``/proc/meminfo``, in bytes.
+    """
+    for line in Path('/proc/meminfo').read_text().splitlines():
+        name, _, value = line.partition(':')
+        if name == field:
+            # Values are in kibibytes.
+            return int(value.split()[0]) * 1024
+    raise KeyError(field)
+
+
+def host_resources(paths: Iterable[Path]) -> Resources:
+    """
+    Return the resources which are free on this host.
+
+    Free CPU cores are the number of cores less the load average over the
+    last minute.
+
+    Args:
+        paths: Paths on the file systems which clusters use. The free disk
+            space is the least free space on any of them.
+    """
+    try:
+        memory = _meminfo(field='MemAvailable')
+    except (OSError, KeyError):
+        memory = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    cpus = max((os.cpu_count() or 1) - os.getloadavg()[0], 0.0)
+    disk = min(shutil.disk_usage(str(path)).free for path in paths)
+    return Resources(memory=memory, cpus=cpus, disk=disk)
+
+
+def host_capacity(paths: Iterable[Path]) -> Resources:
+    """
+    Return all resources of this host, whether or not they are used.
+
+    Args:
+        paths: See ``host_resources``.
+    """
+    try:
+        memory = _meminfo(field='MemTotal')
+    except (OSError, KeyError):
+        memory = os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    cpus = float(os.cpu_count() or 1)
+    disk = min(shutil.disk_usage(str(path)).total for path in paths)
+    return Resources(memory=memory, cpus=cpus, disk=disk)
+
+
+class AdmissionScheduler:
+    """
+    Lets clusters be created only when the host has the resources which they
+    need.
+
+    Clusters are admitted as soon as they fit, so as many clusters are
+    created at once as the host can bear.
+    Resources which an admitted cluster needs are held for it until the
+    cluster is created, as the host's free resources only fall as nodes
+    start.
+    A cluster which needs more than the whole host has is admitted when no
+    other cluster is being created, as it would otherwise never be admitted.
+
+    This is safe to use from many threads and processes at once.
+    """
+
+    def __init__(
+        self,
+        costs: NodeCosts=DCOS_DOCKER_COSTS,
+        headroom: Resources=Resources(memory=_GIB, cpus=0.0, disk=5 * _GIB),
+        poll_interval: float=5,
+    ) -> None:
+        """
+        Args:
+            costs: The resources needed by each node.
+            headroom: Resources to leave free for other processes on the
+                host.
+            poll_interval: The number of seconds to wait between checks of
+                the host's free resources while a cluster is waiting to be
+                admitted.
+        """
+        self.costs = costs
+        self.headroom = headroom
+        self._poll_interval = poll_interval
+        self._paths = None  # type: Optional[List[Path]]
+
+    def _measured_paths(self) -> List[Path]:
+        """
+        Return paths on the file systems which clusters use.
+        """
+        if self._paths is None:
+            # Installers and snapshots are in ``/tmp``, and node images and
+            # volumes are in Docker's storage directory.
+            paths = [Path('/tmp')]
+            docker_root = _docker_root()
+            if docker_root is not None:
+                paths.append(docker_root)
+            self._paths = paths
+        return self._paths
+
+    def cost(
+        self,
+        masters: int=1,
+        agents: int=1,
+        public_agents: int=1,
+        costs: Optional[NodeCosts]=None,
+    ) -> Resources:
+        """
+        Return an estimate of the resources needed by a cluster.
+
+        Args:
+            masters: The number of master nodes.
+            agents: The number of agent nodes.
+            public_agents: The number of public agent nodes.
+            costs: The resources needed by each node, or `None` to use the
+                costs of this scheduler.
+        """
+        if costs is None:
+            costs = self.costs
+        counts = (
+            (masters, costs.master),
+            (agents, costs.agent),
+            (public_agents, costs.public_agent),
+        )
+        return Resources(
+            memory=sum(count * cost.memory for count, cost in counts),
+            cpus=sum(count * cost.cpus for count, cost in counts),
+            disk=sum(count * cost.disk for count, cost in counts),
+        )
+
+    def _reserved(self) -> Resources:
+        """
+        Return the resources held for clusters which are admitted but not
+        yet created, by any process.
+
+        Records left by processes which have exited are removed.
+        This must be called with the reservations lock held.
+        """
+        total = Resources(memory=0, cpus=0.0, disk=0)
+        for path in _RESERVATIONS_PATH.glob('*.json'):
+            try:
+                record = json.loads(path.read_text())
+            except (FileNotFoundError, ValueError):
+                continue
+            if not owner_exists(
+                owner_host=record['owner_host'],
+                owner_pid=record['owner_pid'],
+                created=record['created'],
+            ):
+                path.unlink()
+                continue
+            total = _add(total, Resources(*record['resources']))
+        return total
+
+    def _try_reserve(self, cost: Resources) -> Optional[Path]:
+        """
+        Hold resources for a cluster if they are free.
+
+        Returns:
+            The path to the record of the reservation, or `None` if the
+            resources are not free.
+        """
+        paths = self._measured_paths()
+        with file_lock(path=_RESERVATIONS_LOCK_PATH):
+            reserved = self._reserved()
+            available = _subtract(
+                _subtract(host_resources(paths=paths), reserved),
+                self.headroom,
+            )
+            usable = _subtract(host_capacity(paths=paths), self.headroom)
+            alone = not _fits(cost, usable) and not any(reserved)
+            if not (_fits(cost, available) or alone):
+                return None
+
+            record = {
+                'resources': list(cost),
+                'owner_host': socket.gethostname(),
+                'owner_pid': os.getpid(),
+                'created': time.time(),
+            }
+            path = _RESERVATIONS_PATH / '{random}.json'.format(
+                random=uuid.uuid4(),
+            )
+            path.write_text(json.dumps(record))
+        return path
+
+    @contextmanager
+    def admit(
+        self,
+        masters: int=1,
+        agents: int=1,
+        public_agents: int=1,
+        timeout: Optional[float]=None,
+        costs: Optional[NodeCosts]=None,
+    ) -> Iterator[None]:
+        """
+        Wait until a cluster can be created, and hold the resources which it
+        needs while the cluster is created in this context.
+
+        Args:
+            masters: The number of master nodes.
+            agents: The number of agent nodes.
+            public_agents: The number of public agent nodes.
+            timeout: The maximum number of seconds to wait for, or `None` to
+                wait forever.
+            costs: The resources needed by each node, or `None` to use the
+                costs of this scheduler.
+
+        Raises:
+            TimeoutError: The cluster was not admitted in time.
+        """
+        cost = self.cost(
+            masters=masters,
+            agents=agents,
+            public_agents=public_agents,
+            costs=costs,
+        )
+        # A monotonic clock is not affected by changes to the system clock.
+        start = time.monotonic()
+        logged = False
+        while True:
+            path = self._try_reserve(cost=cost)
+            if path is not None:
+                break
+            if timeout is not None and time.monotonic() - start >= timeout:
+                message = 'A cluster was not admitted after {timeout} seconds.'
+                raise TimeoutError(message.format(timeout=timeout))
+            if not logged:
+                LOGGER.info('Waiting for host resources to create a cluster.')
+                logged = True
+            time.sleep(self._poll_interval)
+
+        try:
+            yield
+        finally:
+            path.unlink()
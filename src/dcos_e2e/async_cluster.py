@@ -0,0 +1,411 @@
+"""
+DC/OS Cluster management tools for use with ``asyncio``.
+
+These mirror the tools in ``dcos_e2e.cluster`` but do not block the event
+loop, so that one process can manage many clusters at once.
+"""
+
+import asyncio
+import logging
+import subprocess
+from functools import partial
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Union,
+)
+
+from ._backends import Backends, UnsupportedClusterBackend, create_backend
+from ._common import (
+    INTEGRATION_TEST_OUTPUT_LINES,
+    Node,
+    integration_test_args,
+    run_subprocess_async,
+)
+from ._dcos_docker import DCOS_Docker
+from ._fake import Fake
+from .cluster import Roles, Transports
+from .genconf_cache import GenconfCache
+from .readiness import READINESS_TIMEOUT, probe_delays
+from .timing import PhaseTimer, PhaseTiming
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncNode:
+    """
+    A record of a DC/OS cluster node which can run commands without blocking
+    the event loop.
+    """
+
+    def __init__(self, node: Node) -> None:
+        """
+        Args:
+            node: The node which commands are run on.
+        """
+        self._node = node
+
+    def __eq__(self, other: Any) -> bool:
+        """
+        ``AsyncNode``s are equal if they represent the same node.
+        """
+        if not isinstance(other, AsyncNode):
+            return NotImplemented
+        return self._node == other._node  # pylint: disable=protected-access
+
+    def __hash__(self) -> int:
+        """
+        ``AsyncNode``s which are equal have the same hash.
+        """
+        return hash(self._node)
+
+    async def run_as_root(
+        self,
+        args: List[str],
+        log_output_live: bool=False,
+        output_callback: Optional[Callable[[str], None]]=None,
+        max_output_lines: Optional[int]=None,
+    ) -> subprocess.CompletedProcess:
+        """
+        Run a command on this node as ``root``.
+
+        See ``Node.run_as_root``.
+        """
+        # Commands are timed in the same phase as commands run by the node.
+        timer = self._node._timer  # pylint: disable=protected-access
+        with timer.phase('run_as_root'):
+            return await run_subprocess_async(
+                args=await self._node.command_args_async(args=args),
+                log_output_live=log_output_live,
+                output_callback=output_callback,
+                max_output_lines=max_output_lines,
+            )
+
+
+class AsyncCluster:
+    """
+    A record of a DC/OS cluster which is managed without blocking the event
+    loop.
+
+    This is intended to be used as an asynchronous context manager.
+    The cluster is created when the context is entered.
+    """
+
+    def __init__(
+        self,
+        extra_config: Optional[Dict[str, Any]]=None,
+        masters: int=1,
+        agents: int=1,
+        public_agents: int=1,
+        custom_ca_key: Optional[Path]=None,
+        log_output_live: bool=False,
+        destroy_on_error: bool=True,
+        files_to_copy_to_installer: Optional[Dict[Path, Path]]=None,
+        backend: Backends=Backends.DCOS_DOCKER,
+        reuse_ssh_connections: bool=False,
+        genconf_cache: Optional[GenconfCache]=None,
+        on_phase: Optional[Callable[[PhaseTiming], None]]=None,
+        wait_for_roles: Iterable[Roles]=(
+            Roles.MASTER,
+            Roles.AGENT,
+            Roles.PUBLIC_AGENT,
+        ),
+        transport: Transports=Transports.SSH,
+    ) -> None:
+        """
+        Configure a DC/OS cluster.
+
+        The cluster is not created until ``create`` is awaited or the context
+        is entered.
+
+        Args:
+            extra_config: See ``Cluster``.
+            masters: See ``Cluster``.
+            agents: See ``Cluster``.
+            public_agents: See ``Cluster``.
+            custom_ca_key: See ``Cluster``.
+            log_output_live: See ``Cluster``.
+            destroy_on_error: See ``Cluster``.
+            files_to_copy_to_installer: See ``Cluster``.
+            backend: See ``Cluster``.
+            reuse_ssh_connections: See ``Cluster``.
+            genconf_cache: See ``Cluster``.
+            on_phase: See ``Cluster``.
+            wait_for_roles: See ``Cluster``.
+            transport: See ``Cluster``.
+
+        Raises:
+            UnsupportedClusterBackend: An unsupported `backend` was chosen.
+        """
+        self._destroy_on_error = destroy_on_error
+        self._log_output_live = log_output_live
+        self._timer = PhaseTimer(callbacks=[on_phase] if on_phase else [])
+
+        supported_backends = (Backends.DCOS_DOCKER, Backends.FAKE)
+        if backend not in supported_backends:
+            raise UnsupportedClusterBackend()
+
+        self._backend_factory = partial(
+            create_backend,
+            backend=backend,
+            masters=masters,
+            agents=agents,
+            public_agents=public_agents,
+            extra_config=extra_config,
+            custom_ca_key=custom_ca_key,
+            log_output_live=self._log_output_live,
+            files_to_copy_to_installer=files_to_copy_to_installer,
+            reuse_ssh_connections=reuse_ssh_connections,
+            genconf_cache=genconf_cache,
+            timer=self._timer,
+            transport=transport,
+        )
+        self._wait_for_roles = list(wait_for_roles)
+        self._backend = None  # type: Optional[Union[DCOS_Docker, Fake]]
+        # Each node is probed by a task on the event loop until it is ready.
+        self._probes = None  # type: Optional[Dict[Node, asyncio.Future]]
+
+    async def create(self) -> None:
+        """
+        Create the cluster and wait for it to be ready to run tests against.
+
+        If this fails, the cluster is destroyed unless ``destroy_on_error``
+        is `False`.
+
+        Raises:
+            CalledProcessError: The cluster could not be created.
+            TimeoutError: Nodes with the roles given by ``wait_for_roles``
+                were not ready in time.
+        """
+        try:
+            await self._create()
+        except Exception:
+            self._cancel_probes()
+            if self._destroy_on_error and self._backend is not None:
+                await self.destroy()
+            raise
+
+    async def _create(self) -> None:
+        """
+        See ``create``.
+        """
+        loop = asyncio.get_event_loop()
+        # Preparing the backend copies files but it does not wait for any
+        # other process.
+        with self._timer.phase('prepare'):
+            self._backend = await loop.run_in_executor(
+                None,
+                self._backend_factory,
+            )
+        await self._backend.create_containers_async()
+        backend = self._backend
+        all_nodes = backend.masters | backend.agents | backend.public_agents
+        self._probes = {
+            node: asyncio.ensure_future(
+                self._probe_until_ready(
+                    node=node,
+                    probe_args=backend.readiness_probe_args,
+                ),
+            )
+            for node in all_nodes
+        }
+        nodes_by_role = {
+            Roles.MASTER: backend.masters,
+            Roles.AGENT: backend.agents,
+            Roles.PUBLIC_AGENT: backend.public_agents,
+        }
+        nodes = set()  # type: Set[Node]
+        for role in self._wait_for_roles:
+            nodes |= nodes_by_role[role]
+        await self._wait_for_nodes(nodes=nodes)
+
+    async def _probe_until_ready(
+        self,
+        node: Node,
+        probe_args: List[str],
+    ) -> None:
+        """
+        Probe a node until it is ready.
+
+        After a failed probe, the node is probed again after a delay which
+        grows with each failure.
+        See ``dcos_e2e.readiness.ReadinessMonitor``.
+        """
+        delays = probe_delays()
+        while True:
+            try:
+                await AsyncNode(node=node).run_as_root(args=probe_args)
+            except subprocess.CalledProcessError as exc:
+                LOGGER.debug(
+                    'Node %s is not ready: exit code %d.',
+                    node.ip_address,
+                    exc.returncode,
+                )
+            else:
+                return
+
+            await asyncio.sleep(next(delays))
+
+    async def _wait_for_nodes(self, nodes: Optional[Set[Node]]=None) -> None:
+        """
+        Wait for nodes to be ready without blocking the event loop.
+
+        Args:
+            nodes: The nodes to wait for. By default, all nodes in the
+                cluster are waited for.
+
+        Raises:
+            RuntimeError: The cluster has not been created.
+            TimeoutError: The nodes were not ready in time.
+        """
+        if self._probes is None:
+            raise RuntimeError('The cluster has not been created.')
+
+        wanted = set(self._probes) if nodes is None else nodes
+        probes = [self._probes[node] for node in wanted]
+        with self._timer.phase('wait_for_nodes'):
+            if not probes:
+                return
+            # Probes which are not finished keep running so that they can
+            # be waited for again.
+            done, pending = await asyncio.wait(
+                probes,
+                timeout=READINESS_TIMEOUT,
+            )
+            for probe in done:
+                # Errors other than failed probes are raised.
+                probe.result()
+            if pending:
+                message = (
+                    '{count} nodes were not ready after {timeout} seconds.'
+                )
+                raise TimeoutError(
+                    message.format(
+                        count=len(pending),
+                        timeout=READINESS_TIMEOUT,
+                    )
+                )
+
+    async def wait_for_nodes(self) -> None:
+        """
+        Wait for all nodes in the cluster to be ready to use.
+
+        Raises:
+            RuntimeError: The cluster has not been created.
+            TimeoutError: The nodes were not ready in time.
+        """
+        await self._wait_for_nodes()
+
+    async def __aenter__(self) -> 'AsyncCluster':
+        """
+        Enter an asynchronous context manager.
+        The cluster is created and the context manager receives this
+        ``AsyncCluster`` instance.
+        """
+        await self.create()
+        return self
+
+    def _nodes(self, nodes: Set[Node]) -> Set[AsyncNode]:
+        """
+        Return ``AsyncNode``s for the given nodes.
+        """
+        return set(AsyncNode(node=node) for node in nodes)
+
+    @property
+    def _created_backend(self) -> Union[DCOS_Docker, Fake]:
+        """
+        Return the backend of this cluster.
+
+        Raises:
+            RuntimeError: The cluster has not been created.
+        """
+        if self._backend is None:
+            raise RuntimeError('The cluster has not been created.')
+        return self._backend
+
+    @property
+    def timings(self) -> List[PhaseTiming]:
+        """
+        See ``Cluster.timings``.
+        """
+        return self._timer.timings
+
+    def timing_report(self) -> str:
+        """
+        See ``Cluster.timing_report``.
+        """
+        return self._timer.report()
+
+    @property
+    def masters(self) -> Set[AsyncNode]:
+        """
+        Return all DC/OS master ``AsyncNode``s.
+        """
+        return self._nodes(nodes=self._created_backend.masters)
+
+    @property
+    def agents(self) -> Set[AsyncNode]:
+        """
+        Return all DC/OS agent ``AsyncNode``s.
+        """
+        return self._nodes(nodes=self._created_backend.agents)
+
+    @property
+    def public_agents(self) -> Set[AsyncNode]:
+        """
+        Return all DC/OS public_agent ``AsyncNode``s.
+        """
+        return self._nodes(nodes=self._created_backend.public_agents)
+
+    async def run_integration_tests(self, pytest_command: List[str]
+                                    ) -> subprocess.CompletedProcess:
+        """
+        Run integration tests on a random master node.
+
+        See ``Cluster.run_integration_tests``.
+        """
+        # Integration tests use every node in the cluster.
+        await self.wait_for_nodes()
+
+        # Tests are run on a random master node.
+        test_host = next(iter(self.masters))
+
+        return await test_host.run_as_root(
+            args=integration_test_args(pytest_command=pytest_command),
+            log_output_live=self._log_output_live,
+            max_output_lines=INTEGRATION_TEST_OUTPUT_LINES,
+        )
+
+    def _cancel_probes(self) -> None:
+        """
+        Stop probing nodes.
+        """
+        for probe in (self._probes or {}).values():
+            probe.cancel()
+
+    async def destroy(self) -> None:
+        """
+        Destroy all nodes in the cluster.
+        """
+        self._cancel_probes()
+        with self._timer.phase('destroy'):
+            await self._created_backend.destroy_async()
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[type],
+        exc_value: Optional[Exception],
+        traceback: Any,
+    ) -> bool:
+        """
+        On exiting, destroy all nodes in the cluster.
+        """
+        if exc_type is None or self._destroy_on_error:
+            await self.destroy()
+        return False
@@ -2,29 +2,108 @@
 DC/OS Cluster management tools. Independent of back ends.
 """
 
+import asyncio
+import concurrent.futures
+import logging
 import subprocess
-from contextlib import ContextDecorator
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ContextDecorator, ExitStack
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from constantly import NamedConstant, Names
 
-from ._common import Node
+from ._backends import Backends, create_backend
+# Re-exported so that users can catch it.
+from ._backends import UnsupportedClusterBackend  # noqa: F401
+from ._common import (
+    INTEGRATION_TEST_OUTPUT_LINES,
+    Node,
+    Transports,
+    integration_test_args,
+    map_nodes,
+)
+# Re-exported so that users can catch it.
+from ._common import UnsupportedOperation  # noqa: F401
 from ._dcos_docker import DCOS_Docker
+from ._fake import Fake
+from ._reaper import REAPER, remove_owner
+from ._registry import Attached, attach, register, unregister
+# Re-exported so that users can catch it.
+from ._snapshots import SnapshotRestoreError  # noqa: F401
+from ._snapshots import read_snapshot_manifest
+# Re-exported so that snapshots can be removed without a cluster.
+from ._snapshots import remove_snapshot  # noqa: F401
+from .genconf_cache import GenconfCache
+from .readiness import READINESS_TIMEOUT, ReadinessMonitor
+from .timing import PhaseTimer, PhaseTiming
 
+LOGGER = logging.getLogger(__name__)
 
-class UnsupportedClusterBackend(Exception):
+
+class Roles(Names):
     """
-    Raised if an unsupported cluster backend is given.
+    Constants representing the roles of nodes in a ``Cluster``.
     """
 
+    MASTER = NamedConstant()
+    AGENT = NamedConstant()
+    PUBLIC_AGENT = NamedConstant()
 
-class Backends(Names):
-    """
-    Constants representing various ``Cluster`` backends.
-    """
 
-    DCOS_DOCKER = NamedConstant()
+# Diagnostics collected from each node by ``Cluster.collect_diagnostics``.
+# Each is the name of a file and a command whose output is written to that
+# file.
+# Output is compressed on the node, and errors are included in the output
+# so that one missing source does not stop the others from being collected.
+_DIAGNOSTICS = (
+    # Logs of all DC/OS components, including Mesos and Exhibitor.
+    (
+        'journal.log.gz',
+        ['journalctl', '--no-pager', '--all', '2>&1', '|', 'gzip'],
+    ),
+    # Log files which are not in the journal, such as Mesos task logs.
+    (
+        'var-log.tar.gz',
+        [
+            'tar',
+            '--create',
+            '--gzip',
+            '--ignore-failed-read',
+            '--directory',
+            '/var',
+            'log',
+            '2>/dev/null',
+            '||',
+            'true',
+        ],
+    ),
+)
+
+# Options given when a ``Cluster`` is created which do not change.
+_Options = NamedTuple(
+    '_Options',
+    [
+        # See ``Cluster``.
+        ('destroy_on_error', bool),
+        ('diagnostics_path', Optional[Path]),
+        ('log_output_live', bool),
+        # The roles of the nodes which ``wait`` waits for.
+        ('wait_for_roles', Tuple[Roles, ...]),
+    ],
+)
 
 
 class Cluster(ContextDecorator):
@@ -45,6 +124,17 @@ class Cluster(ContextDecorator):
         destroy_on_error: bool=True,
         files_to_copy_to_installer: Optional[Dict[Path, Path]]=None,
         backend: Backends=Backends.DCOS_DOCKER,
+        reuse_ssh_connections: bool=False,
+        genconf_cache: Optional[GenconfCache]=None,
+        on_phase: Optional[Callable[[PhaseTiming], None]]=None,
+        wait_for_roles: Iterable[Roles]=(
+            Roles.MASTER,
+            Roles.AGENT,
+            Roles.PUBLIC_AGENT,
+        ),
+        diagnostics_path: Optional[Path]=None,
+        transport: Transports=Transports.SSH,
+        start: bool=True,
     ) -> None:
         """
         Create a DC/OS cluster.
@@ -64,29 +154,545 @@ class Cluster(ContextDecorator):
                 the installer node. These are files to copy from the host to
                 the installer node before installing DC/OS.
             backend: The backend to use for creating a cluster.
+            reuse_ssh_connections: If `True`, commands run on a node share
+                one SSH connection rather than each making a new connection.
+                Connections are closed when the cluster is destroyed.
+            genconf_cache: A cache of configuration generation output. If the
+                installer artifact, configuration and files copied to the
+                installer are the same as in an installation which used this
+                cache, generated configuration is reused.
+            on_phase: A function to call with a ``PhaseTiming`` each time a
+                phase of the cluster's lifecycle finishes, such as
+                installation or a command run on a node.
+            wait_for_roles: The roles of nodes which must be ready before the
+                cluster is returned. Other nodes are probed in the background
+                and they can be waited for with ``wait_for_nodes``.
+            diagnostics_path: If given, diagnostics are collected into this
+                directory with ``collect_diagnostics`` if there is an
+                exception raised in the context of this object, before the
+                cluster is destroyed.
+            transport: The way to run commands on nodes. With
+                ``Transports.DOCKER_EXEC``, commands are run on node
+                containers with ``docker exec`` rather than over SSH, which
+                is faster. This is only supported by backends whose nodes are
+                containers on this host.
+            start: If `False`, the cluster is created in the background and
+                this returns at once. Use ``wait`` to wait for the cluster.
 
         Raises:
             UnsupportedClusterBackend: An unsupported `backend` was chosen.
+            TimeoutError: Nodes with the given roles were not ready in time.
+        """
+        timer = PhaseTimer(callbacks=[on_phase] if on_phase else [])
+        with timer.phase('prepare'):
+            created = create_backend(
+                backend=backend,
+                masters=masters,
+                agents=agents,
+                public_agents=public_agents,
+                extra_config=extra_config,
+                custom_ca_key=custom_ca_key,
+                log_output_live=log_output_live,
+                files_to_copy_to_installer=files_to_copy_to_installer,
+                reuse_ssh_connections=reuse_ssh_connections,
+                genconf_cache=genconf_cache,
+                timer=timer,
+                transport=transport,
+            )
+        self._initialize(
+            backend=created,
+            timer=timer,
+            destroy_on_error=destroy_on_error,
+            diagnostics_path=diagnostics_path,
+            log_output_live=log_output_live,
+            wait_for_roles=wait_for_roles,
+        )
+        if not start:
+            self._creation = self._start_creation()
+            return
+
+        # The caller does not get a cluster to destroy if creation fails.
+        self._creation = _finished()
+        try:
+            self._create()
+        except Exception:
+            self._readiness.stop()
+            if destroy_on_error:
+                self.destroy()
+            raise
+        self._wait_or_destroy()
+
+    def _initialize(
+        self,
+        backend: Union[DCOS_Docker, Fake, Attached],
+        timer: PhaseTimer,
+        destroy_on_error: bool,
+        diagnostics_path: Optional[Path],
+        log_output_live: bool,
+        wait_for_roles: Iterable[Roles],
+        attachment_id: Optional[str]=None,
+    ) -> None:
+        """
+        Set the state of a cluster whose backend has been prepared.
+
+        No nodes are probed until the cluster is created.
+
+        Args:
+            backend: The backend of the cluster.
+            timer: The record of the cluster's lifecycle, which the backend
+                also uses.
+            destroy_on_error: See ``Cluster``.
+            diagnostics_path: See ``Cluster``.
+            log_output_live: See ``Cluster``.
+            wait_for_roles: See ``Cluster``.
+            attachment_id: The ID of this process's attachment to a shared
+                cluster, or `None` if this process created the cluster.
+        """
+        self._options = _Options(
+            destroy_on_error=destroy_on_error,
+            diagnostics_path=diagnostics_path,
+            log_output_live=log_output_live,
+            wait_for_roles=tuple(wait_for_roles),
+        )
+        # This is also set when the cluster is shared with other processes.
+        self._attachment_id = attachment_id
+        self._timer = timer
+        self._backend = backend
+        self._readiness = ReadinessMonitor(
+            nodes=[],
+            probe_args=self._backend.readiness_probe_args,
+        )
+        # Resources which an ``AdmissionScheduler`` holds for this cluster
+        # while it is created in the background.
+        # They are released when ``wait`` succeeds or when the cluster is
+        # destroyed, so that a cluster whose creation failed keeps them for
+        # ``resume``.
+        self._admission = ExitStack()
+
+    @classmethod
+    def _from_backend(
+        cls,
+        backend: Union[DCOS_Docker, Fake, Attached],
+        timer: PhaseTimer,
+        destroy_on_error: bool,
+        diagnostics_path: Optional[Path],
+        log_output_live: bool,
+        attachment_id: Optional[str]=None,
+    ) -> 'Cluster':
+        """
+        Return a cluster whose nodes already exist, once all of its nodes are
+        ready.
+
+        Args:
+            backend: See ``_initialize``.
+            timer: See ``_initialize``.
+            destroy_on_error: See ``Cluster``.
+            diagnostics_path: See ``Cluster``.
+            log_output_live: See ``Cluster``.
+            attachment_id: See ``_initialize``.
+
+        Raises:
+            TimeoutError: The nodes were not ready in time.
+        """
+        cluster = cls.__new__(cls)
+        cluster._initialize(
+            backend=backend,
+            timer=timer,
+            destroy_on_error=destroy_on_error,
+            diagnostics_path=diagnostics_path,
+            log_output_live=log_output_live,
+            wait_for_roles=(Roles.MASTER, Roles.AGENT, Roles.PUBLIC_AGENT),
+            attachment_id=attachment_id,
+        )
+        cluster._creation = _finished()
+        cluster._start_readiness_monitor()
+        cluster._wait_or_destroy()
+        return cluster
+
+    def _wait_or_destroy(self) -> None:
+        """
+        Wait for a cluster which is being created or used, and stop probing
+        its nodes if it is not ready.
+
+        The caller does not get a cluster to destroy if this fails, so the
+        cluster is destroyed here unless ``destroy_on_error`` is `False`.
+
+        Raises:
+            TimeoutError: The cluster was not ready in time.
+        """
+        try:
+            self.wait(timeout=READINESS_TIMEOUT)
+        except Exception:
+            self._readiness.stop()
+            if self._options.destroy_on_error:
+                if self._attachment_id is None:
+                    self.destroy()
+                else:
+                    self.detach()
+            raise
+
+    def _create(self) -> None:
+        """
+        Create the nodes of the cluster, resuming from the phase which failed
+        if creation failed before, and start probing them.
+        """
+        self._backend.create_containers()
+        self._start_readiness_monitor()
+
+    def _start_creation(self) -> Future:
+        """
+        Create the nodes of the cluster in the background.
+        """
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self._create)
+        # The thread exits when creation finishes.
+        executor.shutdown(wait=False)
+        return future
+
+    def resume(self) -> None:
+        """
+        Resume creating a cluster whose creation failed, in the background.
+
+        Phases of creation which finished are not run again.
+        The phase which failed is run again from its start.
+        Use ``wait`` to wait for the cluster.
+
+        Raises:
+            RuntimeError: The cluster is being created or it was created.
+        """
+        if not self._creation.done() or self._creation.exception() is None:
+            raise RuntimeError(
+                'Only a cluster whose creation failed can be resumed.',
+            )
+        self._creation = self._start_creation()
+
+    def wait(self, timeout: Optional[float]=None) -> None:
+        """
+        Wait for the cluster to be created, and for its nodes with the roles
+        given as ``wait_for_roles`` to be ready.
+
+        Args:
+            timeout: The maximum number of seconds to wait for, or `None` to
+                wait forever.
+
+        Raises:
+            TimeoutError: The cluster was not ready in time.
+            CalledProcessError: The cluster could not be created. Use
+                ``resume`` to try again.
+        """
+        # A monotonic clock is not affected by changes to the system clock.
+        start = time.monotonic()
+        try:
+            self._creation.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            message = 'The cluster was not created after {timeout} seconds.'
+            raise TimeoutError(message.format(timeout=timeout))
+
+        remaining = None
+        if timeout is not None:
+            remaining = max(timeout - (time.monotonic() - start), 0)
+        self.wait_for_nodes(
+            nodes=self._nodes_with_roles(roles=self._options.wait_for_roles),
+            timeout=remaining,
+        )
+        self._admission.close()
+
+    def __await__(self) -> Any:
         """
-        self._destroy_on_error = destroy_on_error
-        self._log_output_live = log_output_live
+        Wait for the cluster without blocking the event loop.
 
-        supported_backends = (Backends.DCOS_DOCKER, )
-        if backend not in supported_backends:
-            raise UnsupportedClusterBackend()
+        See ``wait``.
+        """
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(None, self.wait).__await__()
 
-        self._backend = DCOS_Docker(
-            masters=masters,
-            agents=agents,
-            public_agents=public_agents,
-            extra_config=dict(extra_config or {}),
+    @classmethod
+    def from_snapshot(
+        cls,
+        name: str,
+        log_output_live: bool=False,
+        destroy_on_error: bool=True,
+        reuse_ssh_connections: bool=False,
+        on_phase: Optional[Callable[[PhaseTiming], None]]=None,
+        diagnostics_path: Optional[Path]=None,
+        transport: Transports=Transports.SSH,
+    ) -> 'Cluster':
+        """
+        Create a DC/OS cluster from a snapshot made with ``snapshot``, rather
+        than installing DC/OS.
+
+        The snapshot cannot be restored while the cluster which it was taken
+        from exists, because nodes are given the IP addresses which they had
+        in that cluster.
+
+        Args:
+            name: The name of the snapshot.
+            log_output_live: See ``Cluster``.
+            destroy_on_error: See ``Cluster``.
+            reuse_ssh_connections: See ``Cluster``.
+            on_phase: See ``Cluster``.
+            diagnostics_path: See ``Cluster``.
+            transport: See ``Cluster``.
+
+        Raises:
+            SnapshotRestoreError: The cluster could not be restored from the
+                snapshot. Any nodes which were created are destroyed.
+            ValueError: The name is not valid.
+        """
+        timer = PhaseTimer(callbacks=[on_phase] if on_phase else [])
+        manifest = read_snapshot_manifest(name=name)
+        # The cluster which the snapshot was taken from may still be being
+        # torn down in the background, and its nodes have the IP addresses
+        # which the restored nodes need.
+        wait_for_teardown()
+        backend = DCOS_Docker(
+            masters=manifest['masters'],
+            agents=manifest['agents'],
+            public_agents=manifest['public_agents'],
+            extra_config={},
             generate_config_path=Path('/tmp/dcos_generate_config.sh'),
             dcos_docker_path=Path('/tmp/dcos-docker'),
-            custom_ca_key=custom_ca_key,
-            log_output_live=self._log_output_live,
-            files_to_copy_to_installer=dict(files_to_copy_to_installer or {}),
+            custom_ca_key=None,
+            log_output_live=log_output_live,
+            files_to_copy_to_installer={},
+            reuse_ssh_connections=reuse_ssh_connections,
+            timer=timer,
+            transport=transport,
         )
-        self._backend.postflight()
+        try:
+            backend.restore_snapshot(name=name)
+        except SnapshotRestoreError:
+            backend.destroy()
+            raise
+
+        return cls._from_backend(
+            backend=backend,
+            timer=timer,
+            destroy_on_error=destroy_on_error,
+            diagnostics_path=diagnostics_path,
+            log_output_live=log_output_live,
+        )
+
+    @classmethod
+    def attach(
+        cls,
+        cluster_id: str,
+        log_output_live: bool=False,
+        destroy_on_error: bool=True,
+        on_phase: Optional[Callable[[PhaseTiming], None]]=None,
+        diagnostics_path: Optional[Path]=None,
+    ) -> 'Cluster':
+        """
+        Use a cluster which another process on this host created and shared
+        with ``share``, rather than creating a cluster.
+
+        This process becomes an owner of the cluster until ``detach`` is
+        called.
+
+        Args:
+            cluster_id: The ID of the cluster.
+            log_output_live: See ``Cluster``.
+            destroy_on_error: See ``Cluster``.
+            on_phase: See ``Cluster``.
+            diagnostics_path: See ``Cluster``.
+
+        Raises:
+            ClusterAttachError: There is no shared cluster with the given ID,
+                or it is being destroyed.
+        """
+        timer = PhaseTimer(callbacks=[on_phase] if on_phase else [])
+        description = attach(cluster_id=cluster_id)
+        backend = Attached(description=description, timer=timer)
+
+        return cls._from_backend(
+            backend=backend,
+            timer=timer,
+            destroy_on_error=destroy_on_error,
+            diagnostics_path=diagnostics_path,
+            log_output_live=log_output_live,
+            attachment_id=backend.attachment_id,
+        )
+
+    @property
+    def cluster_id(self) -> str:
+        """
+        Return the ID of this cluster, which other processes can give to
+        ``Cluster.attach`` once the cluster is shared.
+        """
+        return self._backend.cluster_id
+
+    def share(self, name: Optional[str]=None) -> str:
+        """
+        Let other processes on this host attach to this cluster with
+        ``Cluster.attach``.
+
+        Once a cluster is shared, it is destroyed when the last process
+        which uses it calls ``detach``.
+
+        Args:
+            name: A name which other processes can find the cluster by, with
+                ``dcos_e2e.sharing.find_shared_cluster``.
+
+        Returns:
+            The ID of the cluster.
+        """
+        register(description=self._backend.describe(), name=name)
+        if self._attachment_id is None:
+            # The process which created a cluster owns it with the
+            # cluster's ID.
+            self._attachment_id = self.cluster_id
+        return self.cluster_id
+
+    def detach(self) -> Optional[Future]:
+        """
+        Stop using a shared cluster.
+
+        The cluster must not be used by this process after this is called.
+        If no other process uses the cluster, it is destroyed.
+
+        Returns:
+            A future which is done when the cluster is destroyed, or `None`
+            if other processes still use the cluster.
+        """
+        if self._attachment_id is None:
+            return self.destroy()
+
+        if remove_owner(
+            cluster_id=self.cluster_id,
+            attachment_id=self._attachment_id,
+        ):
+            unregister(cluster_id=self.cluster_id)
+            return self.destroy()
+
+        self._readiness.stop()
+        for node in self.masters | self.agents | self.public_agents:
+            node.close_connection()
+        return None
+
+    def _start_readiness_monitor(self) -> None:
+        """
+        Start probing all nodes in the cluster until they are ready.
+        """
+        self._readiness = ReadinessMonitor(
+            nodes=self.masters | self.agents | self.public_agents,
+            probe_args=self._backend.readiness_probe_args,
+        )
+
+    def _nodes_with_roles(self, roles: Iterable[Roles]) -> Set[Node]:
+        """
+        Return all nodes in the cluster with the given roles.
+        """
+        nodes_by_role = {
+            Roles.MASTER: self.masters,
+            Roles.AGENT: self.agents,
+            Roles.PUBLIC_AGENT: self.public_agents,
+        }
+        nodes = set()  # type: Set[Node]
+        for role in roles:
+            nodes |= nodes_by_role[role]
+        return nodes
+
+    @property
+    def ready_nodes(self) -> Set[Node]:
+        """
+        Return all nodes in the cluster which are ready to use.
+        """
+        return self._readiness.ready_nodes
+
+    def wait_for_nodes(
+        self,
+        nodes: Optional[Iterable[Node]]=None,
+        timeout: Optional[float]=None,
+    ) -> None:
+        """
+        Wait for nodes in the cluster to be ready to use.
+
+        Args:
+            nodes: The nodes to wait for. By default, all nodes in the
+                cluster are waited for.
+            timeout: The maximum number of seconds to wait for, or `None` to
+                wait forever.
+
+        Raises:
+            TimeoutError: The nodes were not ready in time.
+            CalledProcessError: The cluster could not be created.
+        """
+        # A monotonic clock is not affected by changes to the system clock.
+        start = time.monotonic()
+        # Nodes are not probed until the cluster is created.
+        try:
+            self._creation.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            message = 'The cluster was not created after {timeout} seconds.'
+            raise TimeoutError(message.format(timeout=timeout))
+
+        remaining = None
+        if timeout is not None:
+            remaining = max(timeout - (time.monotonic() - start), 0)
+        with self._timer.phase('wait_for_nodes'):
+            self._readiness.wait(nodes=nodes, timeout=remaining)
+
+    def snapshot(self, name: str) -> None:
+        """
+        Save the state of all nodes in the cluster so that clusters can be
+        created from it with ``Cluster.from_snapshot``.
+
+        Args:
+            name: The name of the snapshot. This must be valid as part of a
+                Docker image tag.
+
+        Raises:
+            UnsupportedOperation: The backend does not support snapshots.
+            FileExistsError: A snapshot with the given name exists.
+            ValueError: The name is not valid.
+        """
+        self._backend.snapshot(name=name)
+
+    def reconfigure(self, extra_config: Dict[str, Any]) -> None:
+        """
+        Change the DC/OS configuration of the cluster without reinstalling
+        DC/OS.
+
+        Args:
+            extra_config: Extra installation configuration variables which
+                replace the ``extra_config`` which the cluster was created
+                with.
+
+        Raises:
+            UnsupportedOperation: The backend does not support this.
+            CalledProcessError: The configuration could not be changed.
+            TimeoutError: Nodes were not ready in time after the change.
+        """
+        self._readiness.stop()
+        try:
+            self._backend.reconfigure(extra_config=extra_config)
+        finally:
+            self._start_readiness_monitor()
+        self.wait_for_nodes(timeout=READINESS_TIMEOUT)
+
+    def scale_agents(self, agents: int) -> None:
+        """
+        Add or remove agent nodes.
+
+        Agents are removed starting with the highest numbered agent, which
+        is the most recently added.
+
+        Args:
+            agents: The number of agents which the cluster should have.
+
+        Raises:
+            UnsupportedOperation: The backend does not support this.
+            ValueError: ``agents`` is negative, or the backend cannot add
+                agents to this cluster.
+            CalledProcessError: DC/OS could not be installed on a new agent.
+            TimeoutError: New agents were not ready in time.
+        """
+        self._readiness.stop()
+        try:
+            self._backend.scale_agents(agents=agents)
+        finally:
+            self._start_readiness_monitor()
+        self.wait_for_nodes(timeout=READINESS_TIMEOUT)
 
     def __enter__(self) -> 'Cluster':
         """
@@ -95,6 +701,21 @@ class Cluster(ContextDecorator):
         """
         return self
 
+    @property
+    def timings(self) -> List[PhaseTiming]:
+        """
+        Return the timings of all finished phases of this cluster's
+        lifecycle, in the order that they finished.
+        """
+        return self._timer.timings
+
+    def timing_report(self) -> str:
+        """
+        Return a human readable summary of the time taken by each phase of
+        this cluster's lifecycle.
+        """
+        return self._timer.report()
+
     @property
     def masters(self) -> Set[Node]:
         """
@@ -125,50 +746,147 @@ class Cluster(ContextDecorator):
             pytest_command: The ``pytest`` command to run on the node.
 
         Returns:
-            The result of the ``pytest`` command.
+            The result of the ``pytest`` command. Only the last lines of very
+            long output are kept.
 
         Raises:
             ``subprocess.CalledProcessError`` if the ``pytest`` command fails.
         """
-        environment_variables = {
-            'DCOS_LOGIN_UNAME': 'admin',
-            'DCOS_LOGIN_PW': 'admin',
-        }
-        set_env_variables = [
-            "{key}='{value}'".format(key=key, value=value)
-            for key, value in environment_variables.items()
-        ] + ['source', '/opt/mesosphere/environment.export']
-
-        test_dir = '/opt/mesosphere/active/dcos-integration-test/'
-        change_to_test_dir = ['cd', test_dir]
-        and_cmd = ['&&']
-        args = (
-            change_to_test_dir + and_cmd + set_env_variables + and_cmd +
-            pytest_command
-        )
+        # Integration tests use every node in the cluster.
+        self.wait_for_nodes(timeout=READINESS_TIMEOUT)
 
         # Tests are run on a random master node.
         test_host = next(iter(self.masters))
 
         return test_host.run_as_root(
-            args=args, log_output_live=self._log_output_live
+            args=integration_test_args(pytest_command=pytest_command),
+            log_output_live=self._options.log_output_live,
+            max_output_lines=INTEGRATION_TEST_OUTPUT_LINES,
         )
 
-    def destroy(self) -> None:
+    def collect_diagnostics(
+        self,
+        destination: Path,
+        max_workers: Optional[int]=None,
+    ) -> Dict[Node, Optional[Exception]]:
+        """
+        Copy compressed logs from every node in the cluster to a local
+        directory, from many nodes at once.
+
+        The logs of each node are put in a directory named after the node's
+        role and IP address, for example ``master/172.17.0.2``.
+        Logs are compressed on the node and written to disk as they are
+        received.
+
+        Args:
+            destination: The directory to put logs in. It is created if it
+                does not exist.
+            max_workers: The maximum number of nodes to copy logs from at
+                once. If this is `None`, logs are copied from all nodes at
+                once.
+
+        Returns:
+            A mapping of each node to `None` if its logs were copied, or to
+            the exception raised if they were not.
+        """
+        node_paths = {}  # type: Dict[Node, Path]
+        for role, nodes in (
+            ('master', self.masters),
+            ('agent', self.agents),
+            ('public_agent', self.public_agents),
+        ):
+            for node in nodes:
+                node_paths[node] = destination / role / str(node.ip_address)
+
+        def collect(node: Node) -> None:
+            """
+            Copy the logs of one node.
+            """
+            node_path = node_paths[node]
+            node_path.mkdir(parents=True, exist_ok=True)
+            for filename, args in _DIAGNOSTICS:
+                node.save_output(args=args, path=node_path / filename)
+
+        with self._timer.phase('collect_diagnostics'):
+            return map_nodes(
+                function=collect,
+                nodes=node_paths,
+                max_workers=max_workers,
+            )
+
+    def destroy(self) -> Future:
+        """
+        Start destroying all nodes in the cluster in the background.
+
+        The cluster must not be used after this is called.
+
+        Returns:
+            A future which is done when the cluster is destroyed.
+            See also ``wait_for_teardown``.
+        """
+        self._readiness.stop()
+        self._admission.close()
+        return REAPER.submit(teardown=self._destroy_backend)
+
+    def _destroy_backend(self) -> None:
         """
         Destroy all nodes in the cluster.
         """
-        self._backend.destroy()
+        # Nodes which are being created are destroyed when they are created.
+        concurrent.futures.wait([self._creation])
+        self._readiness.stop()
+        with self._timer.phase('destroy'):
+            self._backend.destroy()
 
     def __exit__(
         self,
         exc_type: Optional[type],
         exc_value: Optional[Exception],
         traceback: Any,
-    ) -> bool:
+    ) -> None:
         """
         On exiting, destroy all nodes in the cluster.
+        A shared cluster is only destroyed if no other process uses it.
+
+        If there was an error and a ``diagnostics_path`` was given,
+        diagnostics are collected first.
+        Errors are not suppressed.
         """
-        if exc_type is None or self._destroy_on_error:
-            self.destroy()
-        return False
+        try:
+            diagnostics_path = self._options.diagnostics_path
+            if exc_type is not None and diagnostics_path is not None:
+                self.collect_diagnostics(destination=diagnostics_path)
+        except Exception:  # pylint: disable=broad-except
+            # Failing to collect diagnostics must not hide the original
+            # error or stop the cluster from being destroyed.
+            LOGGER.exception('Diagnostics could not be collected.')
+        finally:
+            if exc_type is None or self._options.destroy_on_error:
+                if self._attachment_id is None:
+                    self.destroy()
+                else:
+                    self.detach()
+
+
+def wait_for_teardown(timeout: Optional[float]=None) -> None:
+    """
+    Wait for all clusters which this process has started destroying to be
+    destroyed.
+
+    Args:
+        timeout: The maximum number of seconds to wait for, or `None` to wait
+            forever.
+
+    Raises:
+        TimeoutError: Clusters were not destroyed in time.
+    """
+    REAPER.wait(timeout=timeout)
+
+
+def _finished() -> Future:
+    """
+    Return a future which is done, for clusters which are already created.
+    """
+    future = Future()  # type: Future
+    future.set_result(None)
+    return future
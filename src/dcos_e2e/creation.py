@@ -0,0 +1,100 @@
+"""
+Tools for creating many DC/OS clusters without overloading the host.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Any, Dict, List, Optional
+
+from .admission import FAKE_COSTS, AdmissionScheduler
+from .cluster import Backends, Cluster
+
+
+def admitted_cluster(
+    scheduler: Optional[AdmissionScheduler],
+    **kwargs: Any
+) -> Cluster:
+    """
+    Create a cluster once the host has the resources which it needs.
+
+    Fake clusters are admitted with ``FAKE_COSTS``, and other clusters with
+    the costs of the scheduler.
+    The resources are held until the cluster is created.
+    With ``start=False``, this is when ``wait`` succeeds, or when the cluster
+    is destroyed.
+
+    Args:
+        scheduler: The scheduler which admits the cluster, or `None` to
+            create the cluster at once.
+        kwargs: Keyword arguments to create a ``Cluster`` with.
+    """
+    if scheduler is None:
+        return Cluster(**kwargs)
+
+    if kwargs.get('backend', Backends.DCOS_DOCKER) == Backends.FAKE:
+        costs = FAKE_COSTS
+    else:
+        costs = scheduler.costs
+
+    with ExitStack() as admission:
+        admission.enter_context(
+            scheduler.admit(
+                masters=kwargs.get('masters', 1),
+                agents=kwargs.get('agents', 1),
+                public_agents=kwargs.get('public_agents', 1),
+                costs=costs,
+            ),
+        )
+        cluster = Cluster(**kwargs)
+        if not kwargs.get('start', True):
+            # The cluster is still being created in the background.
+            # pylint: disable=protected-access
+            cluster._admission.enter_context(admission.pop_all())
+    return cluster
+
+
+def create_clusters(
+    specs: List[Dict[str, Any]],
+    max_workers: Optional[int]=None,
+    scheduler: Optional[AdmissionScheduler]=None,
+) -> List[Cluster]:
+    """
+    Create many clusters at once.
+
+    Args:
+        specs: For each cluster, the keyword arguments to create a ``Cluster``
+            with.
+        max_workers: The maximum number of clusters to create at once. If
+            this is `None`, all clusters are created at once.
+        scheduler: If given, each cluster is created only when this
+            scheduler admits it, so that the host is not overloaded.
+
+    Returns:
+        The created clusters, in the order of ``specs``.
+
+    Raises:
+        Exception: The first error raised when creating a cluster. If any
+            cluster cannot be created, the clusters which were created are
+            destroyed.
+    """
+    if not specs:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(specs)) as pool:
+        futures = [
+            pool.submit(admitted_cluster, scheduler=scheduler, **spec)
+            for spec in specs
+        ]
+
+    clusters = [
+        future.result() for future in futures if future.exception() is None
+    ]
+    if len(clusters) < len(futures):
+        for cluster in clusters:
+            cluster.destroy()
+        for future in futures:
+            exception = future.exception()
+            if exception is not None:
+                raise exception
+
+    return clusters
@@ -0,0 +1,307 @@
+"""
+A cache of DC/OS installer configuration generation ("genconf") output.
+
+Generating configuration is part of every cluster's installation.
+If the installer artifact and every file given to the installer are the same
+as in a previous installation, the output of that installation is reused.
+
+This module is also run as a script, in place of the installer artifact, in
+the DC/OS Docker directory of clusters which use a cache.
+"""
+
+import argparse
+import hashlib
+import os
+import shlex
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+from shutil import copyfile, copytree, rmtree
+from typing import List, Optional
+
+# Files are read in chunks of this many bytes when they are hashed.
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _file_digest(path: Path) -> str:
+    """
+    Return the SHA-256 digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with path.open('rb') as file:
+        for chunk in iter(lambda: file.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _directory_size(path: Path) -> int:
+    """
+    Return the total size in bytes of all files in a directory.
+    """
+    size = 0
+    for directory, _, filenames in os.walk(str(path)):
+        for filename in filenames:
+            file_path = os.path.join(directory, filename)
+            try:
+                if not os.path.islink(file_path):
+                    size += os.path.getsize(file_path)
+            except FileNotFoundError:
+                # Another process removed the file.
+                continue
+    return size
+
+
+class GenconfCache:
+    """
+    A size-bounded cache of installer configuration generation output.
+
+    Entries are keyed on the installer artifact and on the contents of the
+    installer's `/genconf` directory, which includes the generated
+    configuration file and any files copied to the installer.
+    The configuration file includes the addresses of the cluster's nodes, and
+    those addresses are built into the generated output, so output is only
+    reused for a cluster whose nodes have the same addresses.
+    Docker gives new containers the lowest free addresses, so this is the
+    case when clusters with the same configuration are created one after
+    another on a host.
+    When the cache is too big, the least recently used entries are removed.
+    """
+
+    def __init__(self, path: Path, max_size: int=10 * 1024**3) -> None:
+        """
+        Args:
+            path: The directory to store the cache in. This can be shared by
+                many processes.
+            max_size: The maximum total size in bytes of cached output.
+        """
+        self.path = path
+        self.max_size = max_size
+
+    def _entries_path(self) -> Path:
+        """
+        Return the directory which holds one directory per cache entry.
+        """
+        return self.path / 'entries'
+
+    def artifact_digest(self, artifact_path: Path) -> str:
+        """
+        Return a digest of the contents of an installer artifact.
+
+        Artifacts are large, so digests are remembered for as long as the
+        artifact file is not changed.
+
+        Args:
+            artifact_path: The path to an installer artifact.
+        """
+        stat = artifact_path.stat()
+        file_identity = '{device}:{inode}:{size}:{mtime}'.format(
+            device=stat.st_dev,
+            inode=stat.st_ino,
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+        )
+        identity_digest = hashlib.sha256(file_identity.encode()).hexdigest()
+        digests_path = self.path / 'artifact-digests'
+        digest_path = digests_path / identity_digest
+        try:
+            return digest_path.read_text()
+        except FileNotFoundError:
+            pass
+
+        digest = _file_digest(path=artifact_path)
+        digests_path.mkdir(parents=True, exist_ok=True)
+        # Write atomically so that other processes never read a partial
+        # digest.
+        tmp_path = digests_path / '.tmp-{random}'.format(random=uuid.uuid4())
+        tmp_path.write_text(digest)
+        tmp_path.rename(digest_path)
+        return digest
+
+    def key(self, artifact_digest: str, genconf_path: Path) -> str:
+        """
+        Return the cache key for generating configuration.
+
+        Args:
+            artifact_digest: The digest of the installer artifact.
+            genconf_path: The installer's `/genconf` directory on the host,
+                before configuration is generated.
+        """
+        key = hashlib.sha256(artifact_digest.encode())
+        paths = sorted(
+            path for path in genconf_path.glob('**/*')
+            if path.is_file() and 'serve' not in path.relative_to(
+                genconf_path,
+            ).parts
+        )
+        for path in paths:
+            key.update(str(path.relative_to(genconf_path)).encode())
+            key.update(_file_digest(path=path).encode())
+        return key.hexdigest()
+
+    def restore(self, key: str, genconf_path: Path) -> bool:
+        """
+        Copy cached output into a `/genconf` directory.
+
+        Args:
+            key: The cache key.
+            genconf_path: The installer's `/genconf` directory on the host.
+
+        Returns:
+            Whether output was restored. If this is `False`, configuration
+            must be generated.
+        """
+        entry_path = self._entries_path() / key
+        try:
+            # Mark the entry as recently used.
+            os.utime(str(entry_path))
+            for cached_path in entry_path.iterdir():
+                destination = genconf_path / cached_path.name
+                if cached_path.is_dir():
+                    if destination.exists():
+                        rmtree(str(destination))
+                    copytree(src=str(cached_path), dst=str(destination))
+                else:
+                    copyfile(src=str(cached_path), dst=str(destination))
+        except OSError:
+            # The entry does not exist, or it was evicted while it was being
+            # copied.
+            return False
+        return True
+
+    def store(self, key: str, genconf_path: Path) -> None:
+        """
+        Store generated output in the cache and evict old entries if the
+        cache is too big.
+
+        Args:
+            key: The cache key.
+            genconf_path: The installer's `/genconf` directory on the host,
+                after configuration is generated.
+        """
+        entries_path = self._entries_path()
+        entries_path.mkdir(parents=True, exist_ok=True)
+        # Entries are built in a temporary directory and then moved, so that
+        # other processes never restore a partial entry.
+        tmp_path = entries_path / '.tmp-{random}'.format(random=uuid.uuid4())
+        try:
+            copytree(src=str(genconf_path), dst=str(tmp_path))
+            # Copying the directory also copies its modification time, which
+            # is used to find the least recently used entries.
+            os.utime(str(tmp_path))
+            tmp_path.rename(entries_path / key)
+        except OSError:
+            # Another process stored the same output, or some output could
+            # not be copied.
+            # The output is not cached.
+            rmtree(str(tmp_path), ignore_errors=True)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache is no bigger
+        than its maximum size.
+        """
+        entries_path = self._entries_path()
+        if not entries_path.exists():
+            return
+
+        entries = []
+        for path in entries_path.iterdir():
+            if path.name.startswith('.tmp-'):
+                continue
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                # Another process evicted this entry.
+                continue
+
+        total_size = 0
+        # Keep the most recently used entries.
+        for _, entry in sorted(entries, reverse=True):
+            total_size += _directory_size(path=entry)
+            if total_size > self.max_size:
+                rmtree(str(entry), ignore_errors=True)
+
+    def wrapper_script(self, artifact_path: Path, artifact_digest: str) -> str:
+        """
+        Return a script which can be run in place of an installer artifact.
+
+        The script runs the artifact, but it uses this cache when the artifact
+        is run to generate configuration.
+
+        DC/OS Docker runs the artifact on the host, in the DC/OS Docker
+        directory, and the artifact starts its own installer container.
+        Therefore the script can run this module with the host's Python
+        interpreter.
+
+        Args:
+            artifact_path: The path to an installer artifact.
+            artifact_digest: The digest of the installer artifact.
+        """
+        args = [
+            sys.executable,
+            '-m',
+            __name__,
+            '--cache-path',
+            str(self.path),
+            '--max-size',
+            str(self.max_size),
+            '--artifact-path',
+            str(artifact_path),
+            '--artifact-digest',
+            artifact_digest,
+        ]
+        return '#!/usr/bin/env bash\nexec {command} -- "$@"\n'.format(
+            command=' '.join(shlex.quote(arg) for arg in args),
+        )
+
+
+def main(argv: Optional[List[str]]=None) -> int:
+    """
+    Run an installer artifact, using a cache for configuration generation.
+
+    The artifact is run in the current directory, with a `genconf` directory
+    which is mounted to the installer at `/genconf`.
+
+    Args:
+        argv: The arguments to this script. By default, the arguments given
+            on the command line.
+
+    Returns:
+        The exit code of the artifact, or 0 if cached output was used.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cache-path', type=Path, required=True)
+    parser.add_argument('--max-size', type=int, required=True)
+    parser.add_argument('--artifact-path', type=Path, required=True)
+    parser.add_argument('--artifact-digest', required=True)
+    parser.add_argument('artifact_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    artifact_args = args.artifact_args
+    if artifact_args[:1] == ['--']:
+        artifact_args = artifact_args[1:]
+    command = ['bash', str(args.artifact_path)] + artifact_args
+
+    if '--genconf' not in artifact_args:
+        return subprocess.call(command)
+
+    cache = GenconfCache(path=args.cache_path, max_size=args.max_size)
+    genconf_path = Path.cwd() / 'genconf'
+    key = cache.key(
+        artifact_digest=args.artifact_digest,
+        genconf_path=genconf_path,
+    )
+    if cache.restore(key=key, genconf_path=genconf_path):
+        print('Using cached configuration {key}.'.format(key=key))
+        return 0
+
+    returncode = subprocess.call(command)
+    if returncode == 0:
+        cache.store(key=key, genconf_path=genconf_path)
+    return returncode
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Tools for reclaiming clusters which were not destroyed.
+
+Every node container is labeled with the ID of its cluster, the host and
+process which created it and the time at which it was created.
+A cluster is stale if the process which created it, and every process which
+it is shared with, no longer exist.
+Stale clusters are left behind when a process is killed before it destroys
+its clusters, and they use memory and disk space until they are reclaimed.
+
+This module can be run as a script to reclaim stale clusters.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from shutil import rmtree
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import docker
+
+from ._reaper import (
+    forget_cluster,
+    is_owned,
+    owner_exists,
+    remove_containers,
+)
+
+# Labels on node containers.
+CLUSTER_ID_LABEL = 'dcos_e2e.cluster_id'
+OWNER_HOST_LABEL = 'dcos_e2e.owner_host'
+OWNER_PID_LABEL = 'dcos_e2e.owner_pid'
+CREATED_LABEL = 'dcos_e2e.created'
+PATHS_LABEL = 'dcos_e2e.paths'
+
+LabeledCluster = NamedTuple(
+    'LabeledCluster',
+    [
+        # The ID of the cluster, which is part of every container name.
+        ('cluster_id', str),
+        # The host name of the machine which created the cluster.
+        ('owner_host', str),
+        # The ID of the process which created the cluster.
+        ('owner_pid', int),
+        # The time at which the cluster was created, in seconds since the
+        # epoch.
+        ('created', float),
+        # Files and directories on the host which belong to the cluster.
+        ('paths', List[str]),
+        # The names of the cluster's containers.
+        ('container_names', List[str]),
+    ],
+)
+
+
+def owner_labels(cluster_id: str, paths: Iterable[Path]) -> Dict[str, str]:
+    """
+    Return the labels to give each container in a cluster created by this
+    process.
+
+    Args:
+        cluster_id: A string which is part of the name of every container in
+            the cluster, and of no other containers.
+        paths: Files and directories on the host which belong to the cluster.
+    """
+    return {
+        CLUSTER_ID_LABEL: cluster_id,
+        OWNER_HOST_LABEL: socket.gethostname(),
+        OWNER_PID_LABEL: str(os.getpid()),
+        CREATED_LABEL: str(time.time()),
+        PATHS_LABEL: json.dumps([str(path) for path in paths]),
+    }
+
+
+def labeled_clusters(
+    client: Optional[docker.DockerClient]=None,
+) -> List[LabeledCluster]:
+    """
+    Return all clusters which have labeled containers.
+
+    Args:
+        client: The Docker client to use. By default, a client is created
+            from the environment.
+    """
+    client = client or docker.from_env()
+    containers = client.containers.list(
+        all=True,
+        filters={'label': CLUSTER_ID_LABEL},
+    )
+    clusters = {}  # type: Dict[str, LabeledCluster]
+    for container in containers:
+        labels = container.labels
+        cluster_id = labels[CLUSTER_ID_LABEL]
+        if cluster_id not in clusters:
+            clusters[cluster_id] = LabeledCluster(
+                cluster_id=cluster_id,
+                owner_host=labels[OWNER_HOST_LABEL],
+                owner_pid=int(labels[OWNER_PID_LABEL]),
+                created=float(labels[CREATED_LABEL]),
+                paths=json.loads(labels[PATHS_LABEL]),
+                container_names=[],
+            )
+        clusters[cluster_id].container_names.append(container.name)
+    return sorted(clusters.values(), key=lambda cluster: cluster.created)
+
+
+def is_stale(cluster: LabeledCluster, max_age: Optional[float]=None) -> bool:
+    """
+    Return whether a cluster is stale.
+
+    Args:
+        cluster: The cluster to check.
+        max_age: If given, clusters older than this many seconds are stale
+            even if the process which created them exists.
+    """
+    if max_age is not None and time.time() - cluster.created > max_age:
+        return True
+    if owner_exists(
+        owner_host=cluster.owner_host,
+        owner_pid=cluster.owner_pid,
+        created=cluster.created,
+    ):
+        return False
+    # Processes which the cluster is shared with are not in the labels.
+    return not is_owned(cluster_id=cluster.cluster_id)
+
+
+def reclaim(
+    clusters: Iterable[LabeledCluster],
+    client: Optional[docker.DockerClient]=None,
+    max_workers: Optional[int]=None,
+) -> None:
+    """
+    Remove the containers, volumes and files of clusters, many clusters at
+    once.
+
+    Args:
+        clusters: The clusters to reclaim.
+        client: The Docker client to use. By default, a client is created
+            from the environment.
+        max_workers: The maximum number of clusters to reclaim at once. By
+            default, all clusters are reclaimed at once.
+    """
+    clusters = list(clusters)
+    if not clusters:
+        return
+
+    docker_client = client or docker.from_env()
+
+    def reclaim_cluster(cluster: LabeledCluster) -> None:
+        """
+        Remove the containers, volumes and files of one cluster.
+        """
+        remove_containers(client=docker_client, cluster_id=cluster.cluster_id)
+        for path in cluster.paths:
+            rmtree(path=path, ignore_errors=True)
+        forget_cluster(cluster_id=cluster.cluster_id)
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(clusters)) as pool:
+        # Consume the results so that errors are raised.
+        list(pool.map(reclaim_cluster, clusters))
+
+
+def reclaim_stale_clusters(
+    max_age: Optional[float]=None,
+    dry_run: bool=False,
+) -> List[LabeledCluster]:
+    """
+    Find and reclaim stale clusters.
+
+    Args:
+        max_age: See ``is_stale``.
+        dry_run: If `True`, stale clusters are found but not reclaimed.
+
+    Returns:
+        The stale clusters.
+    """
+    client = docker.from_env()
+    stale = [
+        cluster for cluster in labeled_clusters(client=client)
+        if is_stale(cluster=cluster, max_age=max_age)
+    ]
+    if not dry_run:
+        reclaim(clusters=stale, client=client)
+    return stale
+
+
+def main(argv: Optional[List[str]]=None) -> int:
+    """
+    Reclaim stale clusters and print their IDs.
+
+    Args:
+        argv: The arguments to this script. By default, the arguments given
+            on the command line.
+
+    Returns:
+        The exit code of this script.
+    """
+    parser = argparse.ArgumentParser(description='Reclaim stale clusters.')
+    parser.add_argument(
+        '--max-age',
+        type=float,
+        help='Also reclaim clusters which are older than this many seconds, '
+        'even if the process which created them exists.',
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Print stale clusters without reclaiming them.',
+    )
+    args = parser.parse_args(argv)
+
+    stale = reclaim_stale_clusters(max_age=args.max_age, dry_run=args.dry_run)
+    for cluster in stale:
+        print(cluster.cluster_id)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Tools for running commands on and copying files to many nodes at once.
+"""
+
+import subprocess
+import tarfile
+from functools import partial
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from ._common import Node, map_nodes
+
+
+def run_on_nodes(
+    nodes: Iterable[Node],
+    args: List[str],
+    max_workers: Optional[int]=None,
+    log_output_live: bool=False,
+    output_callback: Optional[Callable[[Node, str], None]]=None,
+) -> Dict[Node, Union[subprocess.CompletedProcess, Exception]]:
+    """
+    Run a command on many nodes at once.
+
+    Args:
+        nodes: The nodes to run the command on.
+        args: The command to run on each node.
+        max_workers: The maximum number of nodes to run the command on at
+            once. If this is `None`, the command is run on all nodes at
+            once.
+        log_output_live: See ``Node.run_as_root``.
+        output_callback: A function to call with a node and each line of
+            output from that node, as text without its line ending, as
+            soon as it is produced. It may be called from many threads
+            at once.
+
+    Returns:
+        A mapping of each node to the result of running the command on
+        that node. If the command fails on a node, the result is the
+        exception raised, usually a ``subprocess.CalledProcessError``.
+        Failures do not stop the command from being run on other nodes.
+    """
+
+    def run(node: Node) -> subprocess.CompletedProcess:
+        """
+        Run the command on one node.
+        """
+        node_callback = None  # type: Optional[Callable[[str], None]]
+        if output_callback is not None:
+            node_callback = partial(output_callback, node)
+        return node.run_as_root(
+            args=args,
+            log_output_live=log_output_live,
+            output_callback=node_callback,
+        )
+
+    return map_nodes(function=run, nodes=nodes, max_workers=max_workers)
+
+
+def send_files(
+    nodes: Iterable[Node],
+    sources: Iterable[Path],
+    destination: Path,
+    max_workers: Optional[int]=None,
+) -> Dict[Node, Optional[Exception]]:
+    """
+    Copy local files and directories into a directory on many nodes at
+    once.
+
+    The files are archived once, and the archive is sent to each node
+    over one connection.
+
+    Args:
+        nodes: The nodes to copy the files to.
+        sources: See ``Node.send_files``.
+        destination: See ``Node.send_files``.
+        max_workers: The maximum number of nodes to copy the files to at
+            once. If this is `None`, the files are copied to all nodes at
+            once.
+
+    Returns:
+        A mapping of each node to `None` if the files were copied to that
+        node, or to the exception raised if they were not.
+    """
+    with TemporaryDirectory() as tmp_dir:
+        archive_path = Path(tmp_dir) / 'files.tar'
+        with tarfile.open(name=str(archive_path), mode='w') as archive:
+            for source in sources:
+                archive.add(name=str(source), arcname=source.name)
+
+        return map_nodes(
+            function=lambda node: node.send_archive(
+                archive=archive_path,
+                destination=destination,
+            ),
+            nodes=nodes,
+            max_workers=max_workers,
+        )
@@ -0,0 +1,214 @@
+"""
+Pools of DC/OS clusters which are created before they are needed.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from queue import Queue
+from threading import Lock
+from typing import Any, Dict, Iterator, Optional
+
+from .admission import AdmissionScheduler
+from .cluster import Backends, Cluster, Transports
+from .creation import admitted_cluster
+
+LOGGER = logging.getLogger(__name__)
+
+# This is put in the queue of clusters when the pool is closed, to wake
+# callers which are waiting for a cluster.
+_CLOSED = None
+
+
+class ClusterPool:
+    """
+    A pool of DC/OS clusters which all have the same configuration.
+
+    Clusters are created in the background. Each cluster is leased to at most
+    one caller. When a cluster is released, it is destroyed and a replacement
+    is created in the background.
+
+    This is intended to be used as context manager.
+    """
+
+    def __init__(
+        self,
+        size: int=1,
+        extra_config: Optional[Dict[str, Any]]=None,
+        masters: int=1,
+        agents: int=1,
+        public_agents: int=1,
+        custom_ca_key: Optional[Path]=None,
+        log_output_live: bool=False,
+        files_to_copy_to_installer: Optional[Dict[Path, Path]]=None,
+        backend: Backends=Backends.DCOS_DOCKER,
+        reuse_ssh_connections: bool=False,
+        transport: Transports=Transports.SSH,
+        scheduler: Optional[AdmissionScheduler]=None,
+    ) -> None:
+        """
+        Start creating clusters in the background.
+
+        Args:
+            size: The number of clusters to keep ready or leased.
+            extra_config: See ``Cluster``.
+            masters: See ``Cluster``.
+            agents: See ``Cluster``.
+            public_agents: See ``Cluster``.
+            custom_ca_key: See ``Cluster``.
+            log_output_live: See ``Cluster``.
+            files_to_copy_to_installer: See ``Cluster``.
+            backend: See ``Cluster``.
+            reuse_ssh_connections: See ``Cluster``.
+            transport: See ``Cluster``.
+            scheduler: If given, each cluster is created only when this
+                scheduler admits it, so that the host is not overloaded.
+
+        Raises:
+            ValueError: ``size`` is less than 1.
+        """
+        if size < 1:
+            message = 'A pool must have at least 1 cluster, not {size}.'
+            raise ValueError(message.format(size=size))
+
+        self._cluster_kwargs = {
+            'extra_config': extra_config,
+            'masters': masters,
+            'agents': agents,
+            'public_agents': public_agents,
+            'custom_ca_key': custom_ca_key,
+            'log_output_live': log_output_live,
+            'files_to_copy_to_installer': files_to_copy_to_installer,
+            'backend': backend,
+            'reuse_ssh_connections': reuse_ssh_connections,
+            'transport': transport,
+        }  # type: Dict[str, Any]
+        self._scheduler = scheduler
+
+        # Each item is a cluster which is being created or which is ready.
+        self._clusters = Queue()  # type: Queue
+        self._executor = ThreadPoolExecutor(max_workers=size)
+        self._lock = Lock()
+        self._closed = False
+
+        for _ in range(size):
+            self._clusters.put(self._executor.submit(self._create_cluster))
+
+    def __enter__(self) -> 'ClusterPool':
+        """
+        Enter a context manager.
+        The context manager receives this ``ClusterPool`` instance.
+        """
+        return self
+
+    def _create_cluster(self) -> Cluster:
+        """
+        Create a cluster with the configuration of this pool.
+        """
+        return admitted_cluster(
+            scheduler=self._scheduler,
+            **self._cluster_kwargs
+        )
+
+    def _replace_cluster(self, cluster: Cluster) -> Cluster:
+        """
+        Destroy a cluster and create a new one to take its place.
+        """
+        cluster.destroy()
+        return self._create_cluster()
+
+    def _release(self, cluster: Optional[Cluster]) -> None:
+        """
+        Return a cluster to the pool.
+
+        The cluster is destroyed and a replacement is created in the
+        background. If the pool is closed, the cluster is destroyed and it is
+        not replaced.
+
+        Args:
+            cluster: The cluster to release, or `None` if the cluster could
+                not be created.
+        """
+        with self._lock:
+            if self._closed:
+                if cluster is not None:
+                    cluster.destroy()
+                return
+
+            if cluster is None:
+                future = self._executor.submit(self._create_cluster)
+            else:
+                future = self._executor.submit(self._replace_cluster, cluster)
+            self._clusters.put(future)
+
+    @contextmanager
+    def lease(self) -> Iterator[Cluster]:
+        """
+        Lease a cluster from the pool, waiting for one to be ready if
+        necessary.
+
+        The cluster is released when the context is exited.
+        It must not be used after that.
+
+        Raises:
+            RuntimeError: The pool is closed, or it is closed while waiting
+                for a cluster.
+            CalledProcessError: The cluster could not be created.
+        """
+        if self._closed:
+            raise RuntimeError('The cluster pool is closed.')
+
+        future = self._clusters.get()
+        if future is _CLOSED:
+            # Leave the marker for any other waiting callers.
+            self._clusters.put(_CLOSED)
+            raise RuntimeError('The cluster pool is closed.')
+
+        try:
+            cluster = future.result()
+        except Exception:
+            self._release(cluster=None)
+            raise
+
+        try:
+            yield cluster
+        finally:
+            self._release(cluster=cluster)
+
+    def close(self) -> None:
+        """
+        Destroy all clusters which are not leased.
+
+        Leased clusters are destroyed when they are released.
+        Callers which are waiting to lease a cluster are woken, and they raise
+        a ``RuntimeError``.
+        """
+        with self._lock:
+            self._closed = True
+
+        while not self._clusters.empty():
+            future = self._clusters.get()
+            if future is _CLOSED:
+                # The pool was already closed.
+                continue
+            try:
+                cluster = future.result()
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception('A pooled cluster could not be created.')
+                continue
+            cluster.destroy()
+
+        self._clusters.put(_CLOSED)
+        self._executor.shutdown(wait=True)
+
+    def __exit__(
+        self,
+        exc_type: Optional[type],
+        exc_value: Optional[Exception],
+        traceback: Any,
+    ) -> None:
+        """
+        On exiting, destroy all clusters which are not leased.
+        """
+        self.close()
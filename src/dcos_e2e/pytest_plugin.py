@@ -0,0 +1,85 @@
+"""
+A ``pytest`` plugin which gives tests one cluster which is shared by all
+``pytest-xdist`` workers in a test run.
+
+Enable the plugin in a ``conftest.py`` file with::
+
+    pytest_plugins = ['dcos_e2e.pytest_plugin']
+
+The first worker to need the cluster creates it, and the other workers attach
+to it.
+The cluster is destroyed when the last worker is finished with it.
+Override the ``dcos_cluster_kwargs`` fixture to choose how the cluster is
+created.
+"""
+
+import uuid
+from typing import Any, Dict, Iterator
+
+import pytest
+
+from .cluster import Cluster
+from .sharing import shared_cluster
+
+
+def pytest_addoption(parser: Any) -> None:
+    """
+    Add an option to choose which shared cluster to use.
+    """
+    parser.addoption(
+        '--dcos-e2e-cluster-key',
+        default=None,
+        help='The name of the shared cluster to use. Test runs given the '
+        'same name share a cluster. By default, all workers in one test '
+        'run share a cluster.',
+    )
+
+
+def _cluster_key(config: Any) -> str:
+    """
+    Return the name of the shared cluster for a test run.
+    """
+    key = config.getoption('--dcos-e2e-cluster-key')
+    if key is not None:
+        return str(key)
+
+    # ``pytest-xdist`` gives workers the same ID for each test run.
+    # Old versions of ``pytest-xdist`` call workers slaves.
+    worker_input = getattr(
+        config,
+        'workerinput',
+        getattr(config, 'slaveinput', {}),
+    )
+    if 'testrunuid' in worker_input:
+        return str(worker_input['testrunuid'])
+    # The tests are not run by ``pytest-xdist`` workers, so there is no
+    # other process to share the cluster with.
+    return str(uuid.uuid4())
+
+
+@pytest.fixture(scope='session')
+def dcos_cluster_kwargs() -> Dict[str, Any]:
+    """
+    Return the keyword arguments to create the shared cluster with.
+
+    Override this fixture to change them.
+    """
+    return {}
+
+
+@pytest.fixture(scope='session')
+def dcos_cluster(
+    request: Any,
+    dcos_cluster_kwargs: Dict[str, Any],
+) -> Iterator[Cluster]:
+    """
+    Return a cluster which is shared by all workers in this test run.
+    """
+    cluster = shared_cluster(
+        name=_cluster_key(config=request.config),
+        **dcos_cluster_kwargs
+    )
+    try:
+        yield cluster
+    finally:
+        cluster.detach()
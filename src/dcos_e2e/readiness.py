@@ -0,0 +1,161 @@
+"""
+Tools for finding out when the nodes of a cluster are ready to use.
+"""
+
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import CalledProcessError
+from threading import Condition, Event
+from typing import Iterable, Iterator, List, Optional, Set
+
+from ._common import Node
+
+LOGGER = logging.getLogger(__name__)
+
+# The number of seconds to wait for nodes to be ready when a cluster is
+# created or used.
+# This is much longer than DC/OS usually takes to start.
+READINESS_TIMEOUT = 60 * 30
+
+
+def probe_delays(
+    initial_delay: float=1,
+    max_delay: float=30,
+) -> Iterator[float]:
+    """
+    Yield the number of seconds to wait after each failed probe of a node.
+
+    The delay doubles with each failure, up to a maximum.
+
+    Args:
+        initial_delay: The number of seconds to wait after the first failed
+            probe.
+        max_delay: The maximum number of seconds to wait between probes.
+    """
+    delay = initial_delay
+    while True:
+        # Jitter stops all nodes from being probed at the same time.
+        yield delay * random.uniform(0.5, 1)
+        delay = min(delay * 2, max_delay)
+
+
+class ReadinessMonitor:
+    """
+    Probes nodes in the background until each node is ready.
+
+    Each node is probed independently, so nodes which become ready early can
+    be used before other nodes are ready.
+    After a failed probe, the node is probed again after a delay which grows
+    with each failure, so that slow nodes are not probed more than needed.
+    """
+
+    def __init__(
+        self,
+        nodes: Iterable[Node],
+        probe_args: List[str],
+        initial_delay: float=1,
+        max_delay: float=30,
+    ) -> None:
+        """
+        Start probing nodes.
+
+        Args:
+            nodes: The nodes to probe.
+            probe_args: A command which succeeds on a node when the node is
+                ready.
+            initial_delay: The number of seconds to wait after the first
+                failed probe of a node.
+            max_delay: The maximum number of seconds to wait between probes
+                of a node.
+        """
+        self._probe_args = probe_args
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+        self._ready = {node: False for node in nodes}
+        self._condition = Condition()
+        self._stopped = Event()
+        self._executor = ThreadPoolExecutor(max_workers=len(self._ready) or 1)
+        for node in self._ready:
+            self._executor.submit(self._probe_until_ready, node)
+
+    def _probe_until_ready(self, node: Node) -> None:
+        """
+        Probe a node until it is ready or until this monitor is stopped.
+        """
+        delays = probe_delays(
+            initial_delay=self._initial_delay,
+            max_delay=self._max_delay,
+        )
+        while not self._stopped.is_set():
+            try:
+                node.run_as_root(args=self._probe_args)
+            except CalledProcessError as exc:
+                LOGGER.debug(
+                    'Node %s is not ready: exit code %d.',
+                    node.ip_address,
+                    exc.returncode,
+                )
+            else:
+                with self._condition:
+                    self._ready[node] = True
+                    self._condition.notify_all()
+                return
+
+            self._stopped.wait(timeout=next(delays))
+
+    @property
+    def ready_nodes(self) -> Set[Node]:
+        """
+        Return the nodes which are ready.
+        """
+        with self._condition:
+            return set(node for node, ready in self._ready.items() if ready)
+
+    def wait(
+        self,
+        nodes: Optional[Iterable[Node]]=None,
+        timeout: Optional[float]=None,
+    ) -> None:
+        """
+        Wait for nodes to be ready.
+
+        Args:
+            nodes: The nodes to wait for. By default, all nodes are waited
+                for.
+            timeout: The maximum number of seconds to wait for, or `None` to
+                wait forever.
+
+        Raises:
+            ValueError: A node is not probed by this monitor.
+            TimeoutError: The nodes were not ready in time.
+        """
+        wanted = set(self._ready) if nodes is None else set(nodes)
+        unknown = wanted - set(self._ready)
+        if unknown:
+            ip_addresses = ', '.join(str(node.ip_address) for node in unknown)
+            message = 'Nodes are not monitored: {ip_addresses}.'.format(
+                ip_addresses=ip_addresses,
+            )
+            raise ValueError(message)
+
+        with self._condition:
+            ready = self._condition.wait_for(
+                lambda: all(self._ready[node] for node in wanted),
+                timeout=timeout,
+            )
+        if not ready:
+            message = '{count} nodes were not ready after {timeout} seconds.'
+            raise TimeoutError(
+                message.format(
+                    count=len(wanted - self.ready_nodes),
+                    timeout=timeout,
+                )
+            )
+
+    def stop(self) -> None:
+        """
+        Stop probing nodes.
+        """
+        self._stopped.set()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,512 @@
+"""
+Tools for running integration tests in shards on many nodes at once.
+
+The tests selected by a ``pytest`` command are collected on one node and
+split into one shard for each node.
+Each node runs its shard, and the results are merged.
+Nodes can be masters of one cluster or masters of many clusters.
+"""
+
+import re
+import statistics
+import uuid
+from pathlib import Path
+from subprocess import CalledProcessError
+from tempfile import TemporaryDirectory
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from xml.etree import ElementTree
+
+from ._common import (
+    INTEGRATION_TEST_OUTPUT_LINES,
+    Node,
+    integration_test_args,
+    map_nodes,
+)
+from .cluster import Cluster
+from .readiness import READINESS_TIMEOUT
+
+# A ``pytest`` plugin which is loaded on nodes to collect and select tests.
+# Tests are matched by their exact IDs after other plugins, such as the one
+# for ``-k``, have selected tests.
+# This means that the ``pytest`` command given by the user is not changed,
+# so that options which this harness does not know about keep their values.
+_PLUGIN_NAME = 'dcos_e2e_shard'
+_PLUGIN_SOURCE = """\
+import os
+
+import pytest
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(config, items):
+    collected_path = os.environ.get('DCOS_E2E_COLLECTED_TESTS')
+    if collected_path is not None:
+        with open(collected_path, 'w') as collected_file:
+            collected_file.writelines(item.nodeid + '\\n' for item in items)
+        return
+
+    with open(os.environ['DCOS_E2E_SHARD_TESTS']) as shard_file:
+        selected = set(shard_file.read().splitlines())
+    deselected = [item for item in items if item.nodeid not in selected]
+    items[:] = [item for item in items if item.nodeid in selected]
+    config.hook.pytest_deselected(items=deselected)
+"""
+
+ShardResult = NamedTuple(
+    'ShardResult',
+    [
+        # The node which ran the shard.
+        ('node', Node),
+        # The IDs of the tests in the shard.
+        ('test_ids', List[str]),
+        # The exit code of ``pytest``.
+        ('returncode', int),
+        # The output of ``pytest``. Only the last lines of very long output
+        # are kept.
+        ('stdout', bytes),
+        ('stderr', bytes),
+        # The JUnit XML report written by ``pytest``, or `None` if no report
+        # was written.
+        ('junit_xml', Optional[str]),
+    ],
+)
+
+ShardedTestResult = NamedTuple(
+    'ShardedTestResult',
+    [
+        # ``0`` if every shard passed, otherwise the highest exit code of any
+        # shard.
+        ('returncode', int),
+        # The result of each shard.
+        ('shards', List[ShardResult]),
+        # One JUnit XML report with the test cases of every shard.
+        ('junit_xml', str),
+        # How long each test took, in seconds, by test ID.
+        # This can be given to later runs to balance shards.
+        ('durations', Dict[str, float]),
+    ],
+)
+
+
+def collect_test_ids(
+    node: Node,
+    pytest_command: List[str],
+) -> List[str]:
+    """
+    Return the IDs of the integration tests selected by a ``pytest`` command.
+
+    Args:
+        node: The node to collect tests on.
+        pytest_command: The ``pytest`` command which selects the tests.
+
+    Raises:
+        CalledProcessError: Tests could not be collected, or no tests were
+            selected.
+        ValueError: ``pytest`` did not report any tests.
+    """
+    directory = _shard_directory()
+    collected_path = directory / 'collected.txt'
+    _send_shard_files(node=node, directory=directory, test_ids=None)
+    args = integration_test_args(
+        pytest_command=_plugin_command(
+            pytest_command=pytest_command + ['--collect-only'],
+            directory=directory,
+            variable='DCOS_E2E_COLLECTED_TESTS',
+            path=collected_path,
+        ),
+    )
+    try:
+        node.run_as_root(
+            args=args,
+            max_output_lines=INTEGRATION_TEST_OUTPUT_LINES,
+        )
+        result = node.run_as_root(args=['cat', str(collected_path)])
+    finally:
+        node.run_as_root(args=['rm', '-rf', str(directory)])
+
+    test_ids = result.stdout.decode('utf-8', 'replace').splitlines()
+    if not test_ids:
+        message = 'No tests were collected by: {command}'.format(
+            command=' '.join(pytest_command),
+        )
+        raise ValueError(message)
+    return test_ids
+
+
+def split_tests(
+    test_ids: List[str],
+    shards: int,
+    durations: Optional[Dict[str, float]]=None,
+) -> List[List[str]]:
+    """
+    Split tests into shards which take about the same time to run.
+
+    If no test has a known duration, tests are split into runs of
+    neighbouring tests with the same number of tests in each shard, so that
+    tests which share fixtures are usually in the same shard.
+    Otherwise, the longest tests are split first, each into the shard with
+    the least total duration.
+    Tests with no known duration are assumed to take the mean known
+    duration.
+
+    Args:
+        test_ids: The IDs of the tests to split, in the order that they
+            were collected.
+        shards: The number of shards.
+        durations: How long tests took in earlier runs, in seconds, by test
+            ID.
+
+    Returns:
+        ``shards`` lists of test IDs. Tests are in the order that they were
+        collected within each list. Some lists are empty if there are fewer
+        tests than shards.
+
+    Raises:
+        ValueError: ``shards`` is less than one.
+    """
+    if shards < 1:
+        raise ValueError('There must be at least one shard.')
+
+    durations = durations or {}
+    known = [
+        durations[test_id] for test_id in test_ids if test_id in durations
+    ]
+    split = [[] for _ in range(shards)]  # type: List[List[str]]
+    if not known:
+        size, remainder = divmod(len(test_ids), shards)
+        start = 0
+        for index in range(shards):
+            end = start + size + (1 if index < remainder else 0)
+            split[index] = test_ids[start:end]
+            start = end
+        return split
+
+    default = statistics.mean(known)
+    loads = [0.0] * shards
+    for test_id in sorted(
+        test_ids,
+        key=lambda test_id: durations.get(test_id, default),
+        reverse=True,
+    ):
+        index = loads.index(min(loads))
+        split[index].append(test_id)
+        loads[index] += durations.get(test_id, default)
+
+    positions = {test_id: index for index, test_id in enumerate(test_ids)}
+    return [sorted(shard, key=positions.__getitem__) for shard in split]
+
+
+def _junit_key(test_id: str) -> Tuple[str, str]:
+    """
+    Return the class name and name which ``pytest`` gives a test in JUnit
+    XML reports.
+    """
+    path, bracket, parameters = test_id.partition('[')
+    names = [name for name in path.split('::') if name != '()']
+    names[0] = re.sub(r'\.py$', '', names[0].replace('/', '.'))
+    names[-1] += bracket + parameters
+    return '.'.join(names[:-1]), names[-1]
+
+
+def _shard_directory() -> Path:
+    """
+    Return a new path for a directory on a node which holds the files of one
+    collection or shard.
+    """
+    return Path('/tmp/dcos-e2e-shard-{random}'.format(random=uuid.uuid4()))
+
+
+def _write_shard_files(
+    directory: Path,
+    test_ids: Optional[List[str]],
+) -> List[Path]:
+    """
+    Write the files which a node needs to collect tests or to run a shard.
+
+    Args:
+        directory: The local directory to write files in.
+        test_ids: The IDs of the tests in a shard, or `None` to collect
+            tests.
+
+    Returns:
+        The paths of the files written.
+    """
+    plugin_path = directory / (_PLUGIN_NAME + '.py')
+    plugin_path.write_text(_PLUGIN_SOURCE)
+    paths = [plugin_path]
+    if test_ids is not None:
+        tests_path = directory / 'tests.txt'
+        tests_path.write_text(''.join(test_id + '\n' for test_id in test_ids))
+        paths.append(tests_path)
+    return paths
+
+
+def _send_shard_files(
+    node: Node,
+    directory: Path,
+    test_ids: Optional[List[str]],
+) -> None:
+    """
+    Copy the files which a node needs to collect tests or to run a shard into
+    a directory on the node.
+
+    See ``_write_shard_files``.
+    """
+    with TemporaryDirectory() as tmp_dir:
+        node.send_files(
+            sources=_write_shard_files(
+                directory=Path(tmp_dir),
+                test_ids=test_ids,
+            ),
+            destination=directory,
+        )
+
+
+def _plugin_command(
+    pytest_command: List[str],
+    directory: Path,
+    variable: str,
+    path: Path,
+) -> List[str]:
+    """
+    Return a ``pytest`` command which is run with the plugin which collects
+    or selects tests.
+
+    The arguments are joined with spaces and run by a shell.
+
+    Args:
+        pytest_command: The ``pytest`` command given by the user. It is run
+            with the plugin and is otherwise not changed.
+        directory: A directory which has the files from
+            ``_write_shard_files``.
+        variable: ``DCOS_E2E_COLLECTED_TESTS`` to record the IDs of collected
+            tests, or ``DCOS_E2E_SHARD_TESTS`` to run only the tests of a
+            shard.
+        path: The file to record test IDs in, or which has the test IDs of
+            the shard.
+    """
+    return [
+        'PYTHONPATH={directory}:"$PYTHONPATH"'.format(directory=directory),
+        '{variable}={path}'.format(variable=variable, path=path),
+    ] + pytest_command + ['-p', _PLUGIN_NAME]
+
+
+def _run_shard(
+    node: Node,
+    pytest_command: List[str],
+    test_ids: List[str],
+    log_output_live: bool,
+) -> ShardResult:
+    """
+    Run a shard of tests on a node.
+    """
+    directory = _shard_directory()
+    report_path = directory / 'report.xml'
+    _send_shard_files(node=node, directory=directory, test_ids=test_ids)
+    args = integration_test_args(
+        pytest_command=_plugin_command(
+            pytest_command=pytest_command +
+            ['--junitxml={path}'.format(path=report_path)],
+            directory=directory,
+            variable='DCOS_E2E_SHARD_TESTS',
+            path=directory / 'tests.txt',
+        ),
+    )
+    try:
+        result = node.run_as_root(
+            args=args,
+            log_output_live=log_output_live,
+            max_output_lines=INTEGRATION_TEST_OUTPUT_LINES,
+        )
+    except CalledProcessError as exc:
+        returncode = exc.returncode
+        stdout = exc.output
+        stderr = exc.stderr
+    else:
+        returncode = result.returncode
+        stdout = result.stdout
+        stderr = result.stderr
+
+    # There is no report if ``pytest`` failed before running tests.
+    report = node.run_as_root(
+        args=[
+            'cat',
+            str(report_path),
+            '2>/dev/null',
+            ';',
+            'rm',
+            '-rf',
+            str(directory),
+        ],
+    )
+    junit_xml = report.stdout.decode('utf-8') or None
+    return ShardResult(
+        node=node,
+        test_ids=test_ids,
+        returncode=returncode,
+        stdout=stdout or b'',
+        stderr=stderr or b'',
+        junit_xml=junit_xml,
+    )
+
+
+def _merge_reports(shards: List[ShardResult]) -> str:
+    """
+    Return one JUnit XML report with the test cases of every shard.
+    """
+    counts = {'tests': 0, 'errors': 0, 'failures': 0, 'skipped': 0}
+    total_time = 0.0
+    merged_suite = ElementTree.Element('testsuite', name='pytest')
+    for shard in shards:
+        if shard.junit_xml is None:
+            continue
+        root = ElementTree.fromstring(shard.junit_xml)
+        # Old versions of ``pytest`` write a ``testsuite`` root element and
+        # new versions write a ``testsuites`` root element.
+        for suite in root.iter('testsuite'):
+            for attribute in counts:
+                counts[attribute] += int(suite.get(attribute, '0'))
+            total_time += float(suite.get('time', '0'))
+            merged_suite.extend(suite.findall('testcase'))
+
+    for attribute, count in counts.items():
+        merged_suite.set(attribute, str(count))
+    merged_suite.set('time', '{:.3f}'.format(total_time))
+    merged = ElementTree.Element('testsuites')
+    merged.append(merged_suite)
+    return ElementTree.tostring(merged, encoding='unicode')
+
+
+def _shard_durations(shard: ShardResult) -> Dict[str, float]:
+    """
+    Return how long each test in a shard took, by test ID.
+    """
+    if shard.junit_xml is None:
+        return {}
+
+    times = {}  # type: Dict[Tuple[str, str], float]
+    for case in ElementTree.fromstring(shard.junit_xml).iter('testcase'):
+        key = (case.get('classname', ''), case.get('name', ''))
+        times[key] = float(case.get('time', '0'))
+
+    durations = {}
+    for test_id in shard.test_ids:
+        key = _junit_key(test_id=test_id)
+        if key in times:
+            durations[test_id] = times[key]
+    return durations
+
+
+def run_sharded_tests(
+    nodes: Iterable[Node],
+    pytest_command: List[str],
+    durations: Optional[Dict[str, float]]=None,
+    log_output_live: bool=False,
+) -> ShardedTestResult:
+    """
+    Run integration tests split into one shard for each node, on all nodes
+    at once.
+
+    Each shard is run with ``pytest_command`` unchanged, and a plugin which
+    deselects the tests which are not in the shard.
+
+    Args:
+        nodes: The nodes to run tests on. Tests are collected on one of
+            them.
+        pytest_command: The ``pytest`` command which selects the tests.
+        durations: How long tests took in earlier runs, in seconds, by test
+            ID, for example from the ``durations`` of an earlier result.
+        log_output_live: See ``Node.run_as_root``.
+
+    Returns:
+        The merged results of all shards. Failing tests do not raise an
+        exception.
+
+    Raises:
+        ValueError: No nodes are given, or ``pytest`` did not report any
+            tests.
+        CalledProcessError: Tests could not be collected, or no tests were
+            selected.
+    """
+    nodes = list(nodes)
+    if not nodes:
+        raise ValueError('Tests must be run on at least one node.')
+
+    test_ids = collect_test_ids(node=nodes[0], pytest_command=pytest_command)
+    split = split_tests(
+        test_ids=test_ids,
+        shards=len(nodes),
+        durations=durations,
+    )
+    shard_tests = {
+        node: shard
+        for node, shard in zip(nodes, split) if shard
+    }  # type: Dict[Node, List[str]]
+
+    results = map_nodes(
+        function=lambda node: _run_shard(
+            node=node,
+            pytest_command=pytest_command,
+            test_ids=shard_tests[node],
+            log_output_live=log_output_live,
+        ),
+        nodes=shard_tests,
+    )
+    shards = []  # type: List[ShardResult]
+    for node in shard_tests:
+        result = results[node]
+        if isinstance(result, Exception):
+            raise result
+        shards.append(result)
+
+    returncode = max(shard.returncode for shard in shards)
+
+    merged_durations = {}  # type: Dict[str, float]
+    for shard in shards:
+        merged_durations.update(_shard_durations(shard=shard))
+
+    return ShardedTestResult(
+        returncode=returncode,
+        shards=shards,
+        junit_xml=_merge_reports(shards=shards),
+        durations=merged_durations,
+    )
+
+
+def run_sharded_integration_tests(
+    cluster: Cluster,
+    pytest_command: List[str],
+    durations: Optional[Dict[str, float]]=None,
+    log_output_live: bool=False,
+) -> ShardedTestResult:
+    """
+    Run integration tests split across all master nodes of a cluster at
+    once, when every node of the cluster is ready.
+
+    See ``run_sharded_tests`` for how tests are split, and to split tests
+    across the masters of many clusters.
+
+    Args:
+        cluster: The cluster to run tests on.
+        pytest_command: The ``pytest`` command which selects the tests.
+        durations: How long tests took in earlier runs, in seconds, by test
+            ID.
+        log_output_live: See ``Node.run_as_root``.
+
+    Returns:
+        The merged results of all shards. Failing tests do not raise an
+        exception.
+
+    Raises:
+        ValueError: ``pytest`` did not report any tests.
+        CalledProcessError: Tests could not be collected, or no tests were
+            selected.
+    """
+    # Integration tests use every node in the cluster.
+    cluster.wait_for_nodes(timeout=READINESS_TIMEOUT)
+    return run_sharded_tests(
+        nodes=cluster.masters,
+        pytest_command=pytest_command,
+        durations=durations,
+        log_output_live=log_output_live,
+    )
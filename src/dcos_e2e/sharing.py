@@ -0,0 +1,56 @@
+"""
+Tools for sharing one DC/OS cluster between many processes.
+"""
+
+from typing import Any, Optional
+
+from ._registry import ClusterAttachError, creation_lock, find
+from .cluster import Cluster
+
+
+def find_shared_cluster(name: str) -> Optional[str]:
+    """
+    Return the ID of the shared cluster with a given name, or `None` if there
+    is no such cluster.
+
+    Args:
+        name: The name given to ``Cluster.share``.
+    """
+    return find(name=name)
+
+
+def shared_cluster(name: str, **kwargs: Any) -> Cluster:
+    """
+    Attach to the shared cluster with a given name, or create and share it
+    if there is no such cluster.
+
+    When many processes call this at once with the same name, one process
+    creates the cluster and the others wait for it and then attach to it.
+
+    Args:
+        name: The name of the shared cluster.
+        kwargs: Keyword arguments to create a ``Cluster`` with. The same
+            arguments should be given by every process.
+
+    Returns:
+        The cluster. Call ``detach`` on it, or use it as a context manager,
+        so that it is destroyed when the last process is finished with it.
+    """
+    with creation_lock(name=name):
+        cluster_id = find(name=name)
+        if cluster_id is not None:
+            try:
+                return Cluster.attach(
+                    cluster_id=cluster_id,
+                    log_output_live=kwargs.get('log_output_live', False),
+                    destroy_on_error=kwargs.get('destroy_on_error', True),
+                    on_phase=kwargs.get('on_phase'),
+                    diagnostics_path=kwargs.get('diagnostics_path'),
+                )
+            except ClusterAttachError:
+                # The cluster was destroyed after it was found.
+                pass
+
+        cluster = Cluster(**kwargs)
+        cluster.share(name=name)
+        return cluster
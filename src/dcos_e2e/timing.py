@@ -0,0 +1,173 @@
+"""
+Tools for measuring how long each phase of a cluster's lifecycle takes.
+"""
+
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    MutableSequence,
+    NamedTuple,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+PhaseTiming = NamedTuple(
+    'PhaseTiming',
+    [
+        # The name of the phase, for example ``make_install``.
+        ('phase', str),
+        # The time at which the phase started, in seconds since the epoch.
+        ('started', float),
+        # How long the phase took, in seconds.
+        ('duration', float),
+        # Whether the phase finished without raising an exception.
+        ('succeeded', bool),
+    ],
+)
+
+
+class _PhaseTotal:
+    """
+    The number of times that a phase finished, and how long it took in
+    total.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, duration: float) -> None:
+        """
+        Count one more finished phase.
+
+        Args:
+            duration: How long the phase took, in seconds.
+        """
+        self.count += 1
+        self.total += duration
+        self.maximum = max(self.maximum, duration)
+
+
+class PhaseTimer:
+    """
+    A record of how long phases took.
+
+    Only the most recent timings are kept, so that a long-lived cluster which
+    runs many commands does not use more and more memory.
+    Totals for each phase include every phase which finished.
+
+    This is safe to use from many threads at once.
+    """
+
+    def __init__(
+        self,
+        callbacks: Iterable[Callable[[PhaseTiming], None]]=(),
+        max_timings: int=10000,
+    ) -> None:
+        """
+        Args:
+            callbacks: Functions to call with each ``PhaseTiming`` as soon as
+                the phase finishes.
+            max_timings: The number of most recent timings to keep.
+        """
+        self._callbacks = list(callbacks)
+        self._timings = deque(
+            maxlen=max_timings,
+        )  # type: MutableSequence[PhaseTiming]
+        self._totals = {}  # type: Dict[str, _PhaseTotal]
+        self._lock = Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time the code run in this context as a phase.
+
+        Args:
+            name: The name of the phase.
+        """
+        started = time.time()
+        # A monotonic clock is not affected by changes to the system clock.
+        start = time.monotonic()
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            timing = PhaseTiming(
+                phase=name,
+                started=started,
+                duration=time.monotonic() - start,
+                succeeded=succeeded,
+            )
+            with self._lock:
+                self._timings.append(timing)
+                total = self._totals.setdefault(name, _PhaseTotal())
+                total.add(duration=timing.duration)
+            LOGGER.debug(
+                'Phase %s took %.3f seconds.',
+                timing.phase,
+                timing.duration,
+            )
+            for callback in self._callbacks:
+                callback(timing)
+
+    @property
+    def timings(self) -> List[PhaseTiming]:
+        """
+        Return the timings of the most recent finished phases, in the order
+        that they finished.
+        """
+        with self._lock:
+            return list(self._timings)
+
+    def durations(self) -> Dict[str, List[float]]:
+        """
+        Return a mapping of phase names to the durations of the most recent
+        finished phases with that name, in seconds.
+        """
+        durations = {}  # type: Dict[str, List[float]]
+        for timing in self.timings:
+            durations.setdefault(timing.phase, []).append(timing.duration)
+        return durations
+
+    def report(self) -> str:
+        """
+        Return a human readable summary of the time taken by each phase.
+        """
+        with self._lock:
+            totals = [
+                (phase, total.count, total.total, total.maximum)
+                for phase, total in self._totals.items()
+            ]
+
+        lines = [
+            '{phase:<24} {count:>6} {total:>10} {mean:>10} {maximum:>10}'.
+            format(
+                phase='phase',
+                count='count',
+                total='total (s)',
+                mean='mean (s)',
+                maximum='max (s)',
+            ),
+        ]
+        for phase, count, total, maximum in sorted(totals):
+            lines.append(
+                '{phase:<24} {count:>6} {total:>10.3f} {mean:>10.3f} '
+                '{maximum:>10.3f}'.format(
+                    phase=phase,
+                    count=count,
+                    total=total,
+                    mean=total / count,
+                    maximum=maximum,
+                )
+            )
+        return '\n'.join(lines)
@@ -0,0 +1,147 @@
+"""
+Tests for admitting clusters only when the host has resources for them.
+"""
+
+import json
+import os
+from subprocess import CalledProcessError
+from typing import Any, List
+
+import pytest
+
+from dcos_e2e._fake import Fake
+from dcos_e2e.admission import (
+    _RESERVATIONS_PATH,
+    FAKE_COSTS,
+    AdmissionScheduler,
+    NodeCosts,
+    Resources,
+)
+from dcos_e2e.cluster import Backends
+from dcos_e2e.creation import admitted_cluster, create_clusters
+
+
+def _reserved() -> List[Resources]:
+    """
+    Return the resources which are reserved by this process.
+    """
+    reservations = []
+    for path in _RESERVATIONS_PATH.glob('*.json'):
+        record = json.loads(path.read_text())
+        if record['owner_pid'] == os.getpid():
+            reservations.append(Resources(*record['resources']))
+    return reservations
+
+
+class TestAdmissionScheduler:
+    """
+    Tests for admitting clusters only when the host has resources for them.
+    """
+
+    def test_cost(self) -> None:
+        """
+        The cost of a cluster is the sum of the costs of its nodes.
+        """
+        scheduler = AdmissionScheduler(
+            costs=NodeCosts(
+                master=Resources(memory=4, cpus=1.0, disk=8),
+                agent=Resources(memory=2, cpus=0.5, disk=4),
+                public_agent=Resources(memory=1, cpus=0.25, disk=2),
+            ),
+        )
+        cost = scheduler.cost(masters=3, agents=2, public_agents=1)
+        assert cost == Resources(memory=17, cpus=4.25, disk=34)
+
+    def test_wait_for_resources(self) -> None:
+        """
+        A cluster which does not fit is not admitted while another cluster
+        is being created, and it is admitted alone otherwise.
+        """
+        scheduler = AdmissionScheduler(
+            costs=FAKE_COSTS,
+            headroom=Resources(memory=2**60, cpus=0.0, disk=0),
+            poll_interval=0.1,
+        )
+        with scheduler.admit():
+            with pytest.raises(TimeoutError):
+                with scheduler.admit(timeout=0.5):
+                    pass
+
+        with scheduler.admit(timeout=0):
+            pass
+
+    def test_create_clusters(self) -> None:
+        """
+        Clusters can be created through a scheduler.
+        """
+        clusters = create_clusters(
+            specs=[
+                {'backend': Backends.FAKE, 'agents': 0, 'public_agents': 0},
+                {'backend': Backends.FAKE, 'agents': 1, 'public_agents': 0},
+            ],
+            scheduler=AdmissionScheduler(costs=FAKE_COSTS),
+        )
+        assert [len(cluster.agents) for cluster in clusters] == [0, 1]
+        for cluster in clusters:
+            cluster.destroy()
+
+    def test_lazy_start(self) -> None:
+        """
+        Fake clusters are admitted with the costs of fake nodes, and with
+        ``start=False`` the resources are held until ``wait`` finishes.
+        """
+        scheduler = AdmissionScheduler()
+        cluster = admitted_cluster(
+            scheduler=scheduler,
+            backend=Backends.FAKE,
+            agents=0,
+            public_agents=0,
+            start=False,
+        )
+        try:
+            expected_cost = scheduler.cost(
+                masters=1,
+                agents=0,
+                public_agents=0,
+                costs=FAKE_COSTS,
+            )
+            assert _reserved() == [expected_cost]
+            cluster.wait()
+            assert _reserved() == []
+        finally:
+            cluster.destroy()
+
+    def test_failed_lazy_start(self, monkeypatch: Any) -> None:
+        """
+        The resources of a cluster whose creation failed are held until the
+        cluster is resumed and created, or destroyed.
+        """
+        attempts = []  # type: List[Fake]
+        create_containers = Fake.create_containers
+
+        def fail_once(self: Fake) -> None:
+            """
+            Fail the first attempt to create containers.
+            """
+            attempts.append(self)
+            if len(attempts) == 1:
+                raise CalledProcessError(returncode=1, cmd=['docker', 'run'])
+            create_containers(self)
+
+        monkeypatch.setattr(Fake, 'create_containers', fail_once)
+        cluster = admitted_cluster(
+            scheduler=AdmissionScheduler(),
+            backend=Backends.FAKE,
+            agents=0,
+            public_agents=0,
+            start=False,
+        )
+        try:
+            with pytest.raises(CalledProcessError):
+                cluster.wait()
+            assert len(_reserved()) == 1
+            cluster.resume()
+            cluster.wait()
+            assert _reserved() == []
+        finally:
+            cluster.destroy()
@@ -0,0 +1,130 @@
+"""
+Tests for managing clusters with ``asyncio``.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import CalledProcessError
+from typing import Any, List
+
+import pytest
+
+from dcos_e2e.async_cluster import AsyncCluster
+from dcos_e2e.cluster import Backends
+
+
+class TestAsyncCluster:
+    """
+    Tests for managing clusters with ``asyncio``.
+    """
+
+    def test_concurrent_clusters(self) -> None:
+        """
+        Many clusters can be created and used from one event loop at once.
+        """
+
+        async def use_cluster() -> bytes:
+            """
+            Create a cluster and run a command on its master.
+            """
+            async with AsyncCluster(agents=0, public_agents=0) as cluster:
+                (master, ) = cluster.masters
+                result = await master.run_as_root(args=['echo', '$USER'])
+
+                with pytest.raises(CalledProcessError):
+                    await master.run_as_root(args=['unset_command'])
+
+            return result.stdout
+
+        loop = asyncio.get_event_loop()
+        outputs = loop.run_until_complete(
+            asyncio.gather(use_cluster(), use_cluster()),
+        )
+        assert [output.strip() for output in outputs] == [b'root', b'root']
+
+    def test_reuse_ssh_connections(self) -> None:
+        """
+        Commands run at once on a node can share an SSH connection which is
+        started without blocking the event loop.
+        """
+
+        async def use_cluster() -> List[bytes]:
+            """
+            Create a cluster and run commands on its master at once.
+            """
+            async with AsyncCluster(
+                agents=0,
+                public_agents=0,
+                reuse_ssh_connections=True,
+            ) as cluster:
+                (master, ) = cluster.masters
+                results = await asyncio.gather(
+                    *[
+                        master.run_as_root(args=['echo', '$USER'])
+                        for _ in range(5)
+                    ]
+                )
+            return [result.stdout.strip() for result in results]
+
+        loop = asyncio.get_event_loop()
+        assert loop.run_until_complete(use_cluster()) == [b'root'] * 5
+
+    def test_readiness_probed_on_loop(self) -> None:
+        """
+        Waiting for nodes to be ready does not hold threads of the event
+        loop's executor, so many clusters can be waited for at once with a
+        small executor.
+        """
+
+        async def use_cluster() -> None:
+            """
+            Create a cluster and wait for all of its nodes.
+            """
+            async with AsyncCluster(
+                backend=Backends.FAKE,
+                wait_for_roles=(),
+            ) as cluster:
+                await cluster.wait_for_nodes()
+
+        default_loop = asyncio.get_event_loop()
+        loop = asyncio.new_event_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(
+                asyncio.wait_for(
+                    asyncio.gather(*[use_cluster() for _ in range(3)]),
+                    timeout=300,
+                ),
+            )
+        finally:
+            loop.close()
+            asyncio.set_event_loop(default_loop)
+
+    def test_not_ready_destroyed(self, monkeypatch: Any) -> None:
+        """
+        If nodes are not ready in time when the context is entered, the
+        cluster is destroyed.
+        """
+        monkeypatch.setattr('dcos_e2e.async_cluster.READINESS_TIMEOUT', 1)
+        monkeypatch.setattr(
+            'dcos_e2e._fake.Fake.readiness_probe_args',
+            ['false'],
+        )
+        cluster = AsyncCluster(
+            backend=Backends.FAKE,
+            agents=0,
+            public_agents=0,
+        )
+
+        async def use_cluster() -> None:
+            """
+            Enter the cluster's context.
+            """
+            async with cluster:
+                pass
+
+        loop = asyncio.get_event_loop()
+        with pytest.raises(TimeoutError):
+            loop.run_until_complete(use_cluster())
+        assert 'destroy' in [timing.phase for timing in cluster.timings]
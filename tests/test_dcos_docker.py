@@ -0,0 +1,99 @@
+"""
+Tests for the DC/OS Docker backend.
+"""
+
+import errno
+import os
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from dcos_e2e._dcos_docker import DCOS_Docker
+from dcos_e2e._dcos_docker_directory import _link_or_copy
+from dcos_e2e.cluster import Cluster
+from dcos_e2e.timing import PhaseTimer, PhaseTiming
+
+from .utils import dcos_docker_kwargs
+
+
+class TestLinkOrCopy:
+    """
+    Tests for making installers available to clusters without copying them.
+    """
+
+    def test_link(self, tmpdir: Any) -> None:
+        """
+        On the same file system, the file is hard linked.
+        """
+        src = Path(str(tmpdir)) / 'src'
+        dst = Path(str(tmpdir)) / 'dst'
+        src.write_text('content')
+        _link_or_copy(src=src, dst=dst)
+        assert dst.read_text() == 'content'
+        assert dst.stat().st_ino == src.stat().st_ino
+
+    def test_copy(self, tmpdir: Any, monkeypatch: Any) -> None:
+        """
+        If a hard link cannot be made, for example because the paths are on
+        different file systems, the file is copied.
+        """
+
+        def link(src: str, dst: str) -> None:
+            """
+            Fail as linking across file systems does.
+            """
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV), src, dst)
+
+        monkeypatch.setattr(os, 'link', link)
+        src = Path(str(tmpdir)) / 'src'
+        dst = Path(str(tmpdir)) / 'dst'
+        src.write_text('content')
+        _link_or_copy(src=src, dst=dst)
+        assert dst.read_text() == 'content'
+        assert dst.stat().st_ino != src.stat().st_ino
+
+
+class TestNodeDiscovery:
+    """
+    Tests for finding the nodes of a cluster.
+    """
+
+    def test_nodes_cached(self) -> None:
+        """
+        Once every node of a cluster is running, the nodes are found once and
+        not looked up again each time they are used.
+        """
+        timings = []  # type: List[PhaseTiming]
+        with Cluster(on_phase=timings.append) as cluster:
+            for _ in range(3):
+                assert len(cluster.masters) == 1
+                assert len(cluster.agents) == 1
+                assert len(cluster.public_agents) == 1
+
+        discoveries = [
+            timing for timing in timings if timing.phase == 'discover_nodes'
+        ]
+        assert len(discoveries) == 1
+
+    def test_missing_nodes(self) -> None:
+        """
+        If a cluster does not have the expected number of nodes, a
+        ``ValueError`` is raised, and the nodes are looked up again the next
+        time that they are used.
+        """
+        timer = PhaseTimer()
+        backend = DCOS_Docker(**dcos_docker_kwargs(timer=timer))
+        try:
+            # No containers have been created.
+            for _ in range(2):
+                with pytest.raises(ValueError):
+                    backend.masters  # pylint: disable=pointless-statement
+        finally:
+            backend.destroy()
+
+        discoveries = [
+            timing for timing in timer.timings
+            if timing.phase == 'discover_nodes'
+        ]
+        assert len(discoveries) == 2
@@ -0,0 +1,85 @@
+"""
+Tests for collecting diagnostics from nodes.
+"""
+
+import tarfile
+from pathlib import Path
+from subprocess import CalledProcessError
+from typing import Any
+
+import pytest
+
+from dcos_e2e.cluster import Backends, Cluster, wait_for_teardown
+
+
+class TestDiagnostics:
+    """
+    Tests for collecting logs from nodes.
+    """
+
+    def test_collect_diagnostics(self, tmpdir: Any) -> None:
+        """
+        Logs are copied from every node into a directory for that node.
+        """
+        destination = Path(str(tmpdir))
+        with Cluster(backend=Backends.FAKE) as cluster:
+            results = cluster.collect_diagnostics(destination=destination)
+            nodes = cluster.masters | cluster.agents | cluster.public_agents
+            assert results == {node: None for node in nodes}
+            (master, ) = cluster.masters
+
+        master_path = destination / 'master' / str(master.ip_address)
+        with tarfile.open(str(master_path / 'var-log.tar.gz')) as archive:
+            assert archive.getnames()
+        assert (master_path / 'journal.log.gz').exists()
+        for role in ('agent', 'public_agent'):
+            assert len(list((destination / role).iterdir())) == 1
+
+    def test_collect_on_error(self, tmpdir: Any) -> None:
+        """
+        If a ``diagnostics_path`` is given, logs are collected when there is
+        an error in the context of the cluster.
+        """
+        destination = Path(str(tmpdir))
+        with pytest.raises(ValueError):
+            with Cluster(
+                backend=Backends.FAKE,
+                agents=0,
+                public_agents=0,
+                diagnostics_path=destination,
+            ):
+                raise ValueError()
+
+        (master_path, ) = (destination / 'master').iterdir()
+        assert (master_path / 'journal.log.gz').exists()
+
+    def test_collection_error(self, tmpdir: Any) -> None:
+        """
+        If collecting logs fails, the original error is raised and the
+        cluster is still destroyed.
+        """
+
+        class _FailingCluster(Cluster):
+            """
+            A cluster which cannot collect logs.
+            """
+
+            def collect_diagnostics(self, *args: Any, **kwargs: Any) -> Any:
+                """
+                Raise an error.
+                """
+                raise OSError()
+
+        with pytest.raises(ValueError):
+            with _FailingCluster(
+                backend=Backends.FAKE,
+                agents=0,
+                public_agents=0,
+                diagnostics_path=Path(str(tmpdir)),
+            ) as cluster:
+                (master, ) = cluster.masters
+                raise ValueError()
+
+        wait_for_teardown()
+        with pytest.raises(CalledProcessError):
+            master.run_as_root(args=['echo', 'hello'])
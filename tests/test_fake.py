@@ -0,0 +1,74 @@
+"""
+Tests for the fake backend.
+"""
+
+from subprocess import CalledProcessError
+
+import pytest
+
+from dcos_e2e.cluster import (
+    Backends,
+    Cluster,
+    UnsupportedOperation,
+    wait_for_teardown,
+)
+
+
+class TestFakeBackend:
+    """
+    Tests for the fake backend.
+    """
+
+    def test_run_as_root(self) -> None:
+        """
+        Clusters with the fake backend have the requested number of nodes,
+        and commands can be run on those nodes as root.
+        """
+        with Cluster(
+            masters=1,
+            agents=2,
+            public_agents=1,
+            backend=Backends.FAKE,
+        ) as cluster:
+            assert len(cluster.masters) == 1
+            assert len(cluster.agents) == 2
+            assert len(cluster.public_agents) == 1
+
+            (master, ) = cluster.masters
+            result = master.run_as_root(args=['echo', '$USER'])
+            assert result.stdout.strip() == b'root'
+
+            with pytest.raises(CalledProcessError) as excinfo:
+                master.run_as_root(args=['unset_command'])
+            assert excinfo.value.returncode == 127
+
+        wait_for_teardown()
+        with pytest.raises(CalledProcessError):
+            master.run_as_root(args=['echo', 'hello'])
+
+    def test_snapshot_unsupported(self) -> None:
+        """
+        Fake clusters cannot be snapshotted.
+        """
+        with Cluster(
+            backend=Backends.FAKE,
+            agents=0,
+            public_agents=0,
+        ) as cluster:
+            with pytest.raises(UnsupportedOperation):
+                cluster.snapshot(name='fake')
+
+    def test_reconfigure_unsupported(self) -> None:
+        """
+        Fake clusters cannot be reconfigured, and their nodes are still
+        monitored afterwards.
+        """
+        with Cluster(
+            backend=Backends.FAKE,
+            agents=0,
+            public_agents=0,
+        ) as cluster:
+            with pytest.raises(UnsupportedOperation):
+                cluster.reconfigure(extra_config={})
+            cluster.wait_for_nodes(nodes=cluster.masters)
+            assert cluster.ready_nodes == cluster.masters
@@ -0,0 +1,94 @@
+"""
+Tests for caching generated DC/OS configuration.
+"""
+
+from pathlib import Path
+from typing import Any, Dict
+
+from pytest_capturelog import CaptureLogFuncArg
+
+from dcos_e2e.cluster import Cluster, wait_for_teardown
+from dcos_e2e.genconf_cache import GenconfCache
+
+
+class TestGenconfCache:
+    """
+    Tests for caching generated configuration.
+    """
+
+    def test_store_and_restore(self, tmpdir: Any) -> None:
+        """
+        Output stored for a key is restored only for the same key, and the
+        least recently used output is evicted when the cache is too big.
+        """
+        cache = GenconfCache(path=Path(str(tmpdir / 'cache')), max_size=30)
+        genconf = Path(str(tmpdir.mkdir('genconf')))
+        (genconf / 'config.yaml').write_text('example: true')
+        key = cache.key(artifact_digest='artifact', genconf_path=genconf)
+        assert not cache.restore(key=key, genconf_path=genconf)
+
+        (genconf / 'serve').mkdir()
+        (genconf / 'serve' / 'output').write_text('output')
+        cache.store(key=key, genconf_path=genconf)
+
+        new_genconf = Path(str(tmpdir.mkdir('new_genconf')))
+        (new_genconf / 'config.yaml').write_text('example: true')
+        new_key = cache.key(
+            artifact_digest='artifact',
+            genconf_path=new_genconf,
+        )
+        assert new_key == key
+        assert cache.restore(key=key, genconf_path=new_genconf)
+        assert (new_genconf / 'serve' / 'output').read_text() == 'output'
+
+        other_key = cache.key(artifact_digest='other', genconf_path=genconf)
+        assert other_key != key
+        cache.store(key=other_key, genconf_path=genconf)
+        assert not cache.restore(key=key, genconf_path=new_genconf)
+        assert cache.restore(key=other_key, genconf_path=new_genconf)
+
+    def test_cluster_uses_cache(
+        self,
+        tmpdir: Any,
+        caplog: CaptureLogFuncArg,
+    ) -> None:
+        """
+        A cluster created after an identical cluster is destroyed reuses the
+        configuration generated for the first cluster.
+        """
+        cache = GenconfCache(path=Path(str(tmpdir / 'cache')))
+        entries_path = cache.path / 'entries'
+        cached_message = 'Using cached configuration'
+        kwargs = {
+            'agents': 0,
+            'public_agents': 0,
+            'genconf_cache': cache,
+            'log_output_live': True,
+        }  # type: Dict[str, Any]
+
+        with Cluster(**kwargs) as cluster:
+            (master, ) = cluster.masters
+            first_ip_address = master.ip_address
+            master.run_as_root(args=['true'])
+
+        assert len(list(entries_path.iterdir())) == 1
+        assert not any(
+            cached_message in record.getMessage()
+            for record in caplog.records()
+        )
+
+        # Docker gives the new cluster's containers the addresses which the
+        # destroyed cluster's containers had, so the generated configuration
+        # is the same.
+        wait_for_teardown()
+        with Cluster(**kwargs) as cluster:
+            (master, ) = cluster.masters
+            assert master.ip_address == first_ip_address
+            master.run_as_root(args=['true'])
+
+        assert len(list(entries_path.iterdir())) == 1
+        assert any(
+            cached_message in record.getMessage()
+            for record in caplog.records()
+        )
+        wait_for_teardown()
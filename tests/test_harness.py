@@ -6,12 +6,20 @@ long time to run.
 """
 
 import logging
+import time
+from pathlib import Path
 from subprocess import CalledProcessError
+from typing import Any, List
 
 import pytest
+import yaml
 from pytest_capturelog import CaptureLogFuncArg
 
-from dcos_e2e.cluster import Cluster
+from dcos_e2e._dcos_docker import DCOS_Docker
+from dcos_e2e.cluster import Backends, Cluster, Transports, wait_for_teardown
+from dcos_e2e.creation import create_clusters
+
+from .utils import dcos_docker_kwargs
 
 
 class TestNode:
@@ -65,6 +73,151 @@ class TestNode:
                         found_expected_error = True
             assert found_expected_error
 
+    def test_reuse_ssh_connections(self) -> None:
+        """
+        Commands can share one SSH connection to a node, and that connection
+        is closed when the cluster is destroyed.
+        """
+        with Cluster(
+            agents=0, public_agents=0, reuse_ssh_connections=True
+        ) as cluster:
+            (master, ) = cluster.masters
+            for _ in range(3):
+                result = master.run_as_root(args=['echo', '$USER'])
+                assert result.stdout.strip() == b'root'
+
+            with pytest.raises(CalledProcessError):
+                master.run_as_root(args=['unset_command'])
+
+        wait_for_teardown()
+        with pytest.raises(CalledProcessError):
+            master.run_as_root(args=['echo', 'hello'])
+
+    def test_fresh_ssh_is_prompt(self) -> None:
+        """
+        A command which starts a shared SSH connection returns when the
+        command finishes, rather than when the shared connection closes.
+        """
+        with Cluster(
+            agents=0, public_agents=0, reuse_ssh_connections=True
+        ) as cluster:
+            (master, ) = cluster.masters
+            master.close_connection()
+            start = time.monotonic()
+            master.run_as_root(args=['echo', 'hello'], log_output_live=True)
+            # The shared connection stays open for ten minutes.
+            assert time.monotonic() - start < 60
+
+    def test_docker_exec_transport(self, tmpdir: Any) -> None:
+        """
+        Commands can be run on node containers with ``docker exec`` rather
+        than over SSH, with the same results.
+        """
+        with Cluster(
+            agents=0,
+            public_agents=0,
+            transport=Transports.DOCKER_EXEC,
+        ) as cluster:
+            (master, ) = cluster.masters
+            result = master.run_as_root(args=['echo', '$USER'])
+            assert result.stdout.strip() == b'root'
+            assert result.stderr == b''
+
+            with pytest.raises(CalledProcessError) as excinfo:
+                master.run_as_root(args=['unset_command'])
+            assert excinfo.value.returncode == 127
+
+            # Input is passed to commands.
+            source = Path(str(tmpdir.join('example.txt')))
+            source.write_text('example')
+            master.send_files(sources=[source], destination=Path('/tmp'))
+            result = master.run_as_root(args=['cat', '/tmp/example.txt'])
+            assert result.stdout == b'example'
+
+    def test_output_callback(self) -> None:
+        """
+        Each line of output is given to ``output_callback`` as text.
+        """
+        lines = []  # type: List[str]
+        with Cluster(
+            backend=Backends.FAKE, agents=0, public_agents=0
+        ) as cluster:
+            (master, ) = cluster.masters
+            result = master.run_as_root(
+                args=['echo', 'first', '&&', 'echo', 'second'],
+                output_callback=lines.append,
+            )
+        assert result.stdout == b'first\nsecond\n'
+        assert lines == ['first', 'second']
+
+    def test_max_output_lines(self) -> None:
+        """
+        With ``max_output_lines``, only the last lines of output are kept.
+        """
+        with Cluster(
+            backend=Backends.FAKE, agents=0, public_agents=0
+        ) as cluster:
+            (master, ) = cluster.masters
+            result = master.run_as_root(
+                args=['seq', '1', '100'],
+                max_output_lines=2,
+            )
+            assert result.stdout == b'99\n100\n'
+
+            with pytest.raises(CalledProcessError) as excinfo:
+                master.run_as_root(
+                    args=['seq', '1', '100', '&&', 'false'],
+                    max_output_lines=2,
+                )
+            assert excinfo.value.stdout == b'99\n100\n'
+
+    @pytest.mark.parametrize('stop_on_failure', [False, True])
+    def test_run_batch(self, stop_on_failure: bool) -> None:
+        """
+        Many commands can be run with one connection, with the result of
+        each command.
+        """
+        with Cluster(backend=Backends.FAKE) as cluster:
+            (master, ) = cluster.masters
+            commands = [
+                ['cd', '/tmp', '&&', 'echo', '$USER'],
+                ['pwd'],
+                ['printf', "'a\\nb\\n\\n'"],
+                ['echo', 'error', '>&2', ';', 'exit', '3'],
+                ['cat'],
+            ]
+            results = master.run_batch(
+                commands=commands,
+                stop_on_failure=stop_on_failure,
+            )
+
+        assert [result.args for result in results] == commands[:len(results)]
+        assert results[0].stdout == b'root\n'
+        # Changes to the working directory do not affect later commands.
+        assert results[1].stdout != b'/tmp\n'
+        assert results[2].stdout == b'a\nb\n\n'
+        assert results[3].returncode == 3
+        assert results[3].stderr == b'error\n'
+        if stop_on_failure:
+            assert len(results) == 4
+        else:
+            # Commands have no input.
+            assert results[4].returncode == 0
+            assert results[4].stdout == b''
+
+    def test_run_batch_large(self) -> None:
+        """
+        A batch whose script and output are both larger than a pipe holds
+        does not block.
+        """
+        with Cluster(backend=Backends.FAKE) as cluster:
+            (master, ) = cluster.masters
+            commands = [['printf', '%0100d', '0']] * 1000
+            results = master.run_batch(commands=commands)
+
+        assert len(results) == 1000
+        assert all(result.stdout == b'0' * 100 for result in results)
+
 
 class TestIntegrationTests:
     """
@@ -145,6 +298,55 @@ class TestExtendConfig:
                     args=['test', '-f', path], log_output_live=True
                 )
 
+    def test_reconfigure(self, path: str) -> None:
+        """
+        The configuration of a cluster can be changed without creating a new
+        cluster.
+        """
+        config = {
+            'cluster_docker_credentials': {
+                'auths': {
+                    'https://index.docker.io/v1/': {
+                        'auth': 'redacted'
+                    },
+                },
+            },
+            'cluster_docker_credentials_enabled': True,
+        }
+
+        with Cluster(agents=0, public_agents=0) as cluster:
+            (master, ) = cluster.masters
+            cluster.reconfigure(extra_config=config)
+            master.run_as_root(args=['test', '-f', path])
+
+            cluster.reconfigure(extra_config={})
+            with pytest.raises(CalledProcessError):
+                master.run_as_root(args=['test', '-f', path])
+
+    def test_reconfigure_restores_base(self) -> None:
+        """
+        A value in the base configuration which extra configuration replaced
+        is used again when the cluster is reconfigured without it.
+        """
+        backend = DCOS_Docker(
+            **dcos_docker_kwargs(
+                extra_config={'resolvers': ['8.8.4.4']},
+            )
+        )
+        # pylint: disable=protected-access
+        config_path = backend._directory.config_path
+        try:
+            backend.create_containers()
+            config = yaml.safe_load(config_path.read_text())
+            assert config['resolvers'] == ['8.8.4.4']
+
+            backend.reconfigure(extra_config={})
+            config = yaml.safe_load(config_path.read_text())
+            assert config['resolvers']
+            assert config['resolvers'] != ['8.8.4.4']
+        finally:
+            backend.destroy()
+
 
 class TestClusterSize:
     """
@@ -189,7 +391,7 @@ class TestClusterLogging:
     """
 
     @pytest.fixture()
-    def two_clusters_error(self) -> bytes:
+    def two_clusters_error(self) -> str:
         """
         Return part of the error message shown when trying to create a cluster
         with two masters.
@@ -197,7 +399,7 @@ class TestClusterLogging:
         This is prone to being broken as it is a string in the DC/OS
         repository.
         """
-        return b'Must have 1, 3, 5, 7, or 9 masters'
+        return 'Must have 1, 3, 5, 7, or 9 masters'
 
     def test_live_logging(
         self, two_clusters_error: str, caplog: CaptureLogFuncArg
@@ -212,7 +414,7 @@ class TestClusterLogging:
 
         encountered_error = False
         for record in caplog.records():
-            if two_clusters_error in record.msg:
+            if two_clusters_error in record.getMessage():
                 encountered_error = True
         assert encountered_error
 
@@ -230,7 +432,7 @@ class TestClusterLogging:
 
         encountered_error = False
         for record in caplog.records():
-            if two_clusters_error in record.msg:
+            if two_clusters_error in record.getMessage():
                 encountered_error = True
         assert not encountered_error
 
@@ -248,6 +450,30 @@ class TestMultipleClusters:
             with Cluster():
                 pass
 
+    def test_create_clusters(self) -> None:
+        """
+        It is possible to create many clusters at once.
+        """
+        specs = [
+            {
+                'agents': 0,
+                'public_agents': 0,
+            },
+            {
+                'agents': 1,
+                'public_agents': 0,
+            },
+        ]
+        clusters = create_clusters(specs=specs, max_workers=2)
+        try:
+            assert [len(cluster.agents) for cluster in clusters] == [0, 1]
+            for cluster in clusters:
+                (master, ) = cluster.masters
+                master.run_as_root(args=['echo', 'hello'])
+        finally:
+            for cluster in clusters:
+                cluster.destroy()
+
 
 class TestDestroyOnError:
     """
@@ -263,6 +489,7 @@ class TestDestroyOnError:
                 (master, ) = cluster.masters
                 raise Exception()
 
+        wait_for_teardown()
         with pytest.raises(CalledProcessError):
             master.run_as_root(args=['echo', 'hello'])
 
@@ -291,5 +518,6 @@ class TestDestroyOnError:
         ) as cluster:
             (master, ) = cluster.masters
 
+        wait_for_teardown()
         with pytest.raises(CalledProcessError):
             master.run_as_root(args=['echo', 'hello'])
@@ -0,0 +1,49 @@
+"""
+Tests for removing the resources of stale clusters.
+"""
+
+from subprocess import CalledProcessError
+
+import docker
+import pytest
+
+from dcos_e2e.cluster import Backends, Cluster
+from dcos_e2e.janitor import (
+    CLUSTER_ID_LABEL,
+    is_stale,
+    labeled_clusters,
+    reclaim,
+)
+
+
+class TestJanitor:
+    """
+    Tests for reclaiming clusters which were not destroyed.
+    """
+
+    def test_reclaim(self) -> None:
+        """
+        Clusters are labeled with their owner, clusters owned by a running
+        process are not stale, and clusters can be reclaimed.
+        """
+        cluster = Cluster(backend=Backends.FAKE, agents=1, public_agents=0)
+        (master, ) = cluster.masters
+        client = docker.from_env()
+        (master_container, ) = [
+            container for container in client.containers.list(
+                filters={'label': CLUSTER_ID_LABEL},
+            ) if container.attrs['NetworkSettings']['IPAddress'] ==
+            str(master.ip_address)
+        ]
+        (labeled, ) = [
+            labeled for labeled in labeled_clusters()
+            if master_container.name in labeled.container_names
+        ]
+        assert len(labeled.container_names) == 2
+        assert not is_stale(cluster=labeled)
+        assert is_stale(cluster=labeled, max_age=0)
+
+        reclaim(clusters=[labeled])
+        with pytest.raises(CalledProcessError):
+            master.run_as_root(args=['echo', 'hello'])
+        cluster.destroy().result()
@@ -0,0 +1,140 @@
+"""
+Tests for creating clusters in the background.
+"""
+
+import asyncio
+from subprocess import CalledProcessError
+from threading import Event
+from typing import Any, List
+
+import docker
+import pytest
+
+from dcos_e2e._dcos_docker import DCOS_Docker
+from dcos_e2e._fake import Fake
+from dcos_e2e.cluster import Backends, Cluster
+
+from .utils import dcos_docker_kwargs
+
+
+class TestLazyStart:
+    """
+    Tests for creating clusters in the background.
+    """
+
+    def test_wait(self) -> None:
+        """
+        With ``start=False``, a cluster is created in the background and it
+        can be used once ``wait`` returns.
+        """
+        with Cluster(backend=Backends.FAKE, start=False) as cluster:
+            cluster.wait()
+            (master, ) = cluster.masters
+            result = master.run_as_root(args=['echo', 'hello'])
+            assert result.stdout.strip() == b'hello'
+            assert cluster.ready_nodes == (
+                cluster.masters | cluster.agents | cluster.public_agents
+            )
+
+    def test_await(self) -> None:
+        """
+        A cluster which is created in the background can be awaited.
+        """
+
+        async def create() -> Cluster:
+            cluster = Cluster(backend=Backends.FAKE, start=False)
+            await cluster
+            return cluster
+
+        loop = asyncio.get_event_loop()
+        with loop.run_until_complete(create()) as cluster:
+            (master, ) = cluster.masters
+            master.run_as_root(args=['true'])
+
+    def test_wait_for_nodes_timeout(self, monkeypatch: Any) -> None:
+        """
+        Waiting for the nodes of a cluster which is being created in the
+        background stops after the given timeout.
+        """
+        release = Event()
+        create_containers = Fake.create_containers
+
+        def slow_create_containers(self: Fake) -> None:
+            """
+            Create containers once the test allows it.
+            """
+            release.wait()
+            create_containers(self)
+
+        monkeypatch.setattr(Fake, 'create_containers', slow_create_containers)
+        with Cluster(backend=Backends.FAKE, start=False) as cluster:
+            with pytest.raises(TimeoutError):
+                cluster.wait_for_nodes(timeout=0.1)
+            release.set()
+            cluster.wait_for_nodes(timeout=60)
+
+    def test_resume_created(self) -> None:
+        """
+        Only a cluster whose creation failed can be resumed.
+        """
+        with Cluster(backend=Backends.FAKE) as cluster:
+            with pytest.raises(RuntimeError):
+                cluster.resume()
+
+    def test_resume_after_failed_phase(self) -> None:
+        """
+        If a phase of creating a cluster fails, resuming creation runs that
+        phase again but does not run the phases which finished before it.
+        """
+        made = []  # type: List[List[str]]
+
+        class _FailingGenconf(DCOS_Docker):
+            """
+            A cluster whose first attempt to generate configuration fails.
+            """
+
+            def _make(self, target: str) -> None:
+                """
+                Record the ``make`` arguments, and fail the first time that
+                configuration is generated.
+                """
+                args = self._make_args(target=target)
+                made.append(args)
+                if target == 'genconf' and len(made) == 2:
+                    raise CalledProcessError(returncode=1, cmd=args)
+                super()._make(target=target)
+
+        backend = _FailingGenconf(**dcos_docker_kwargs())
+        client = docker.from_env()
+        filters = {'name': backend.cluster_id}
+        try:
+            with pytest.raises(CalledProcessError):
+                backend.create_containers()
+            assert backend.completed_phases == ['start']
+            containers = client.containers.list(all=True, filters=filters)
+            assert containers
+
+            backend.create_containers()
+            targets = [args[-1] for args in made]
+            assert targets == ['start', 'genconf', 'genconf', 'install']
+            # Finished phases are not run again as prerequisites.
+            assert '--assume-old=start' in made[2]
+            assert '--assume-old=genconf' in made[3]
+            assert backend.completed_phases == ['start', 'genconf', 'install']
+            # The containers were not created again.
+            resumed = client.containers.list(all=True, filters=filters)
+            assert {container.id for container in resumed} == {
+                container.id for container in containers
+            }
+        finally:
+            backend.destroy()
+
+    def test_destroy_while_creating(self) -> None:
+        """
+        A cluster can be destroyed while it is being created.
+        """
+        cluster = Cluster(backend=Backends.FAKE, start=False)
+        cluster.destroy().result()
+        client = docker.from_env()
+        filters = {'name': cluster.cluster_id}
+        assert not client.containers.list(all=True, filters=filters)
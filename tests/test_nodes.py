@@ -0,0 +1,183 @@
+"""
+Tests for running commands on and copying files to many nodes at once.
+"""
+
+import tarfile
+from pathlib import Path
+from subprocess import CalledProcessError, CompletedProcess
+from typing import Any, List
+
+import pytest
+
+from dcos_e2e._common import _checked_members
+from dcos_e2e.cluster import Backends, Cluster
+from dcos_e2e.nodes import run_on_nodes, send_files
+
+
+class TestRunOnNodes:
+    """
+    Tests for running a command on many nodes at once.
+    """
+
+    def test_run_on_nodes(self) -> None:
+        """
+        The result of running a command on each node is given, including
+        failures.
+        """
+        with Cluster(agents=1, public_agents=1) as cluster:
+            nodes = cluster.masters | cluster.agents | cluster.public_agents
+            results = run_on_nodes(
+                nodes=nodes,
+                args=['echo', '$USER'],
+                max_workers=2,
+            )
+            assert set(results.keys()) == nodes
+            for result in results.values():
+                assert isinstance(result, CompletedProcess)
+                assert result.stdout.strip() == b'root'
+
+            results = run_on_nodes(
+                nodes=nodes,
+                args=['unset_command'],
+            )
+            for result in results.values():
+                assert isinstance(result, CalledProcessError)
+                assert result.returncode == 127
+
+    def test_output_callback(self) -> None:
+        """
+        Lines of output are given to ``output_callback`` with the node which
+        produced them.
+        """
+        lines = []  # type: List[Any]
+        with Cluster(backend=Backends.FAKE, public_agents=0) as cluster:
+            nodes = cluster.masters | cluster.agents
+            run_on_nodes(
+                nodes=nodes,
+                args=['echo', 'hello'],
+                output_callback=lambda node, line: lines.append((node, line)),
+            )
+        assert sorted(lines, key=str) == sorted(
+            [(node, 'hello') for node in nodes],
+            key=str,
+        )
+
+
+class TestFileTransfer:
+    """
+    Tests for copying files to and from nodes.
+    """
+
+    def test_send_and_fetch(self, tmpdir: Any) -> None:
+        """
+        Files and directories can be copied to many nodes at once, and back
+        from a node.
+        """
+        source_dir = Path(str(tmpdir.mkdir('source')))
+        (source_dir / 'nested').mkdir()
+        (source_dir / 'nested' / 'example.txt').write_text('example')
+        (source_dir / 'top.txt').write_text('top')
+        sources = [source_dir / 'nested', source_dir / 'top.txt']
+        destination = Path('/etc/dcos-e2e-test')
+
+        with Cluster(backend=Backends.FAKE, agents=2) as cluster:
+            nodes = cluster.masters | cluster.agents
+            results = send_files(
+                nodes=nodes,
+                sources=sources,
+                destination=destination,
+            )
+            assert results == {node: None for node in nodes}
+
+            for node in nodes:
+                result = node.run_as_root(
+                    args=['cat', str(destination / 'nested' / 'example.txt')],
+                )
+                assert result.stdout == b'example'
+
+            agent = next(iter(cluster.agents))
+            fetched = Path(str(tmpdir.mkdir('fetched')))
+            agent.fetch_files(
+                sources=[destination / 'top.txt', destination / 'nested'],
+                destination=fetched,
+            )
+            assert (fetched / 'top.txt').read_text() == 'top'
+            fetched_example = fetched / 'nested' / 'example.txt'
+            assert fetched_example.read_text() == 'example'
+
+            with pytest.raises(CalledProcessError):
+                agent.fetch_files(
+                    sources=[destination / 'missing'],
+                    destination=fetched,
+                )
+
+    @pytest.mark.parametrize(
+        'name,linktype,linkname',
+        [
+            ('/etc/example', None, None),
+            ('../example', None, None),
+            ('nested/../../example', None, None),
+            ('example', tarfile.LNKTYPE, '../example'),
+            ('example', tarfile.SYMTYPE, '/etc'),
+            ('example', tarfile.SYMTYPE, '../..'),
+        ],
+    )
+    def test_unsafe_archive_members(
+        self,
+        tmpdir: Any,
+        name: str,
+        linktype: Any,
+        linkname: Any,
+    ) -> None:
+        """
+        Fetched archives are not extracted if a member, or the target of a
+        link, is outside of the destination.
+        """
+        archive_path = str(tmpdir / 'archive.tar')
+        with tarfile.open(archive_path, mode='w') as archive:
+            member = tarfile.TarInfo(name=name)
+            if linktype is not None:
+                member.type = linktype
+                member.linkname = linkname
+            archive.addfile(member)
+
+        destination = str(tmpdir.mkdir('fetched'))
+        with tarfile.open(archive_path, mode='r|') as archive:
+            with pytest.raises(ValueError):
+                archive.extractall(
+                    path=destination,
+                    members=_checked_members(
+                        archive=archive,
+                        destination=Path(destination),
+                    ),
+                )
+        assert not list(Path(destination).iterdir())
+
+    def test_member_through_symlink(self, tmpdir: Any) -> None:
+        """
+        Fetched archives are not extracted through a symbolic link from
+        earlier in the archive, even one which points inside the
+        destination.
+        """
+        archive_path = str(tmpdir / 'archive.tar')
+        with tarfile.open(archive_path, mode='w') as archive:
+            directory = tarfile.TarInfo(name='directory')
+            directory.type = tarfile.DIRTYPE
+            link = tarfile.TarInfo(name='link')
+            link.type = tarfile.SYMTYPE
+            link.linkname = 'directory'
+            archive.addfile(directory)
+            archive.addfile(link)
+            archive.addfile(tarfile.TarInfo(name='link/passwd'))
+
+        destination = Path(str(tmpdir.mkdir('fetched')))
+        with tarfile.open(archive_path, mode='r|') as archive:
+            with pytest.raises(ValueError):
+                archive.extractall(
+                    path=str(destination),
+                    members=_checked_members(
+                        archive=archive,
+                        destination=destination,
+                    ),
+                )
+        assert not list((destination / 'directory').iterdir())
@@ -0,0 +1,79 @@
+"""
+Tests for pools of clusters.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import CalledProcessError
+
+import pytest
+
+from dcos_e2e.cluster import Backends, Transports, wait_for_teardown
+from dcos_e2e.pool import ClusterPool
+
+
+class TestClusterPool:
+    """
+    Tests for leasing clusters from a ``ClusterPool``.
+    """
+
+    def test_lease(self) -> None:
+        """
+        Leased clusters are ready to use and they are destroyed when they are
+        released.
+        """
+        with ClusterPool(size=1, agents=0, public_agents=0) as pool:
+            with pool.lease() as cluster:
+                (master, ) = cluster.masters
+                master.run_as_root(args=['echo', 'hello'])
+
+            # The released cluster is replaced.
+            with pool.lease() as cluster:
+                (new_master, ) = cluster.masters
+                new_master.run_as_root(args=['echo', 'hello'])
+
+        wait_for_teardown()
+        with pytest.raises(CalledProcessError):
+            new_master.run_as_root(args=['echo', 'hello'])
+
+    def test_empty(self) -> None:
+        """
+        A pool must have at least one cluster.
+        """
+        with pytest.raises(ValueError):
+            ClusterPool(size=0)
+
+    def test_close_wakes_waiters(self) -> None:
+        """
+        Clusters are created with the pool's backend and transport, and
+        closing the pool wakes callers which are waiting for a cluster.
+        """
+        pool = ClusterPool(
+            size=1,
+            agents=0,
+            public_agents=0,
+            backend=Backends.FAKE,
+            transport=Transports.DOCKER_EXEC,
+        )
+
+        def lease_cluster() -> None:
+            with pool.lease():
+                pass
+
+        with pool.lease() as cluster:
+            (master, ) = cluster.masters
+            assert master.command_args(args=['true'])[0] == 'docker'
+            master.run_as_root(args=['echo', 'hello'])
+
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                waiters = [executor.submit(lease_cluster) for _ in range(2)]
+                # Give the waiters time to wait for a cluster.
+                time.sleep(1)
+                pool.close()
+                for waiter in waiters:
+                    with pytest.raises(RuntimeError):
+                        waiter.result(timeout=60)
+
+        wait_for_teardown()
+        with pytest.raises(CalledProcessError):
+            master.run_as_root(args=['echo', 'hello'])
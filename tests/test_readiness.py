@@ -0,0 +1,125 @@
+"""
+Tests for waiting for nodes to be ready.
+"""
+
+from ipaddress import IPv4Address
+from subprocess import CalledProcessError
+from typing import Any, List
+
+import docker
+import pytest
+
+from dcos_e2e._common import Node, Transport
+from dcos_e2e._fake import Fake
+from dcos_e2e.cluster import Backends, Cluster, Roles, wait_for_teardown
+from dcos_e2e.readiness import ReadinessMonitor
+
+
+class _LocalTransport(Transport):
+    """
+    Runs commands on this host, as if it were a node.
+    """
+
+    def command_args(self, args: List[str]) -> List[str]:
+        """
+        Return the arguments for a local process which runs a command.
+        """
+        return ['bash', '-c', ' '.join(args)]
+
+
+class TestReadiness:
+    """
+    Tests for waiting for nodes to be ready.
+    """
+
+    def test_equal_nodes(self) -> None:
+        """
+        Nodes can be waited for with other ``Node``s which have the same IP
+        addresses, such as nodes which are found again after agents are
+        added.
+        """
+        ip_address = IPv4Address('172.17.0.2')
+        probed = Node(ip_address=ip_address, transport=_LocalTransport())
+        monitor = ReadinessMonitor(nodes=[probed], probe_args=['true'])
+        try:
+            found_again = Node(
+                ip_address=ip_address,
+                transport=_LocalTransport(),
+            )
+            monitor.wait(nodes=[found_again], timeout=60)
+            assert found_again in monitor.ready_nodes
+        finally:
+            monitor.stop()
+
+    def test_wait_for_masters(self) -> None:
+        """
+        A cluster can be used as soon as its masters are ready, and other
+        nodes can be waited for later.
+        """
+        with Cluster(
+            agents=1,
+            public_agents=0,
+            wait_for_roles=[Roles.MASTER],
+        ) as cluster:
+            (master, ) = cluster.masters
+            assert master in cluster.ready_nodes
+            result = master.run_as_root(args=['echo', 'hello'])
+            assert result.stdout.strip() == b'hello'
+
+            cluster.wait_for_nodes(nodes=cluster.agents)
+            assert cluster.ready_nodes == cluster.masters | cluster.agents
+
+    def test_fake_nodes_ready(self) -> None:
+        """
+        All nodes of a fake cluster are ready when the cluster is created.
+        """
+        with Cluster(backend=Backends.FAKE, agents=2) as cluster:
+            all_nodes = (
+                cluster.masters | cluster.agents | cluster.public_agents
+            )
+            assert cluster.ready_nodes == all_nodes
+
+    def test_not_ready_destroyed(self, monkeypatch: Any) -> None:
+        """
+        If nodes are not ready in time when a cluster is created, the cluster
+        is destroyed.
+        """
+        monkeypatch.setattr('dcos_e2e.cluster.READINESS_TIMEOUT', 1)
+        monkeypatch.setattr(
+            'dcos_e2e._fake.Fake.readiness_probe_args',
+            ['false'],
+        )
+        client = docker.from_env()
+        filters = {'name': 'dcos-fake'}
+        before = client.containers.list(all=True, filters=filters)
+        with pytest.raises(TimeoutError):
+            Cluster(backend=Backends.FAKE, agents=0, public_agents=0)
+        wait_for_teardown()
+        after = client.containers.list(all=True, filters=filters)
+        assert {container.id for container in after} <= {
+            container.id for container in before
+        }
+
+    def test_not_created_destroyed(self, monkeypatch: Any) -> None:
+        """
+        If a cluster cannot be created, the nodes which were created are
+        destroyed.
+        """
+        run_container = Fake._run_container  # pylint: disable=protected-access
+
+        def fail_for_agents(self: Fake, name: str) -> None:
+            if '-agent-' in name:
+                raise CalledProcessError(returncode=1, cmd=['docker', 'run'])
+            run_container(self, name)
+
+        monkeypatch.setattr(Fake, '_run_container', fail_for_agents)
+        client = docker.from_env()
+        filters = {'name': 'dcos-fake'}
+        before = client.containers.list(all=True, filters=filters)
+        with pytest.raises(CalledProcessError):
+            Cluster(backend=Backends.FAKE, agents=1, public_agents=0)
+        wait_for_teardown()
+        after = client.containers.list(all=True, filters=filters)
+        assert {container.id for container in after} <= {
+            container.id for container in before
+        }
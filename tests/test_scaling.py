@@ -0,0 +1,64 @@
+"""
+Tests for changing the number of agents in a cluster.
+"""
+
+import docker
+import pytest
+
+from dcos_e2e._dcos_docker import DCOS_Docker
+from dcos_e2e.cluster import Backends, Cluster
+
+from .utils import dcos_docker_kwargs
+
+
+class TestScaleAgents:
+    """
+    Tests for adding and removing agents.
+    """
+
+    @pytest.mark.parametrize('backend', [Backends.DCOS_DOCKER, Backends.FAKE])
+    def test_scale_agents(self, backend: Backends) -> None:
+        """
+        Agents can be added to and removed from a cluster, and the remaining
+        agents are kept.
+        """
+        with Cluster(agents=1, public_agents=0, backend=backend) as cluster:
+            (original, ) = cluster.agents
+
+            cluster.scale_agents(agents=3)
+            assert len(cluster.agents) == 3
+            assert original.ip_address in set(
+                node.ip_address for node in cluster.agents
+            )
+            for node in cluster.agents:
+                node.run_as_root(args=['true'])
+
+            cluster.scale_agents(agents=1)
+            (agent, ) = cluster.agents
+            assert agent.ip_address == original.ip_address
+
+    def test_negative(self) -> None:
+        """
+        A cluster cannot have fewer than 0 agents.
+        """
+        with Cluster(backend=Backends.FAKE) as cluster:
+            with pytest.raises(ValueError):
+                cluster.scale_agents(agents=-1)
+
+    def test_no_agent_to_copy(self) -> None:
+        """
+        On DC/OS Docker, agents are not added to a cluster with no agents,
+        even if it has a public agent.
+        """
+        backend = DCOS_Docker(**dcos_docker_kwargs(public_agents=1))
+        client = docker.from_env()
+        filters = {'name': backend.cluster_id}
+        backend._make(target='start')  # pylint: disable=protected-access
+        try:
+            containers = client.containers.list(all=True, filters=filters)
+            with pytest.raises(ValueError):
+                backend.scale_agents(agents=1)
+            new_containers = client.containers.list(all=True, filters=filters)
+            assert len(new_containers) == len(containers)
+        finally:
+            backend.destroy()
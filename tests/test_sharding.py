@@ -0,0 +1,196 @@
+"""
+Tests for running integration tests in shards.
+"""
+
+import sys
+from pathlib import Path
+from subprocess import CalledProcessError
+from typing import Any, List
+from xml.etree import ElementTree
+
+import pytest
+
+from dcos_e2e._common import run_subprocess
+from dcos_e2e.cluster import Cluster
+from dcos_e2e.sharding import (
+    _junit_key,
+    _plugin_command,
+    _write_shard_files,
+    run_sharded_integration_tests,
+    split_tests,
+)
+
+
+class TestRunShardedIntegrationTests:
+    """
+    Tests for running integration tests split across the masters of a
+    cluster.
+    """
+
+    def test_run_sharded(self) -> None:
+        """
+        Integration tests can be split across masters, and the results of
+        each shard are merged.
+        """
+        with Cluster(masters=3, agents=0, public_agents=0) as cluster:
+            pytest_command = ['pytest', '-k', 'test_auth']
+            result = run_sharded_integration_tests(
+                cluster=cluster,
+                pytest_command=pytest_command,
+            )
+            test_ids = [
+                test_id for shard in result.shards
+                for test_id in shard.test_ids
+            ]
+            assert test_ids
+            assert len(test_ids) == len(set(test_ids))
+            assert set(result.durations) == set(test_ids)
+            report = ElementTree.fromstring(result.junit_xml)
+            assert len(report.findall('testsuite/testcase')) == len(test_ids)
+
+            # As with `pytest`, the exit code is 5 when no tests are
+            # collected.
+            pytest_command = ['pytest', '-k', 'no_such_test']
+            with pytest.raises(CalledProcessError) as excinfo:
+                run_sharded_integration_tests(
+                    cluster=cluster,
+                    pytest_command=pytest_command,
+                )
+            assert excinfo.value.returncode == 5
+
+    def test_run_sharded_with_path(self) -> None:
+        """
+        If the ``pytest`` command selects tests by path, each test is still
+        run in only one shard.
+        """
+        with Cluster(masters=3, agents=0, public_agents=0) as cluster:
+            result = run_sharded_integration_tests(
+                cluster=cluster,
+                pytest_command=['pytest', '-k', 'test_auth', 'test_auth.py'],
+            )
+            test_ids = [
+                test_id for shard in result.shards
+                for test_id in shard.test_ids
+            ]
+            assert len(result.shards) > 1
+            report = ElementTree.fromstring(result.junit_xml)
+            cases = [
+                (case.get('classname'), case.get('name'))
+                for case in report.findall('testsuite/testcase')
+            ]
+            assert sorted(cases) == sorted(
+                _junit_key(test_id=test_id) for test_id in test_ids
+            )
+
+
+class TestSplitTests:
+    """
+    Tests for splitting tests into shards.
+    """
+
+    def test_shard_plugin(self, tmpdir: Any) -> None:
+        """
+        The ``pytest`` command is run unchanged, with a plugin which records
+        the IDs of the tests which it selects, or which runs only the tests
+        of a shard.
+        """
+        directory = Path(str(tmpdir))
+        (directory / 'test_example.py').write_text(
+            'import pytest\n'
+            'def test_a(): pass\n'
+            'def test_ab(): pass\n'
+            '@pytest.mark.parametrize("value", ["x y", "z"])\n'
+            'def test_abc(value): pass\n'
+            'def test_other(): pass\n',
+        )
+        _write_shard_files(
+            directory=directory,
+            test_ids=[
+                'test_example.py::test_a',
+                'test_example.py::test_abc[x y]',
+            ],
+        )
+        # Options with values which this harness does not know about, and
+        # options which change the output, are kept.
+        pytest_command = [
+            sys.executable,
+            '-m',
+            'pytest',
+            '-qq',
+            '-p',
+            'no:cacheprovider',
+            '-k',
+            'test_a',
+            'test_example.py',
+        ]
+
+        def run(command: List[str]) -> None:
+            run_subprocess(
+                args=['bash', '-c', ' '.join(command)],
+                log_output_live=False,
+                cwd=str(directory),
+            )
+
+        collected_path = directory / 'collected.txt'
+        run(
+            _plugin_command(
+                pytest_command=pytest_command + ['--collect-only'],
+                directory=directory,
+                variable='DCOS_E2E_COLLECTED_TESTS',
+                path=collected_path,
+            ),
+        )
+        assert collected_path.read_text().splitlines() == [
+            'test_example.py::test_a',
+            'test_example.py::test_ab',
+            'test_example.py::test_abc[x y]',
+            'test_example.py::test_abc[z]',
+        ]
+
+        report_path = directory / 'report.xml'
+        run(
+            _plugin_command(
+                pytest_command=pytest_command +
+                ['--junitxml={path}'.format(path=report_path)],
+                directory=directory,
+                variable='DCOS_E2E_SHARD_TESTS',
+                path=directory / 'tests.txt',
+            ),
+        )
+        report = ElementTree.parse(str(report_path))
+        names = [case.get('name') for case in report.iter('testcase')]
+        assert names == ['test_a', 'test_abc[x y]']
+
+    def test_no_durations(self) -> None:
+        """
+        Without durations, neighbouring tests are kept together in shards of
+        about the same size.
+        """
+        test_ids = ['a.py::1', 'a.py::2', 'a.py::3', 'b.py::1', 'b.py::2']
+        assert split_tests(test_ids=test_ids, shards=2) == [
+            ['a.py::1', 'a.py::2', 'a.py::3'],
+            ['b.py::1', 'b.py::2'],
+        ]
+        assert split_tests(test_ids=['a.py::1'], shards=2) == [['a.py::1'], []]
+
+    def test_durations(self) -> None:
+        """
+        With durations, shards take about the same time to run, and tests
+        are in the order that they were collected within each shard.
+        """
+        durations = {'a': 10.0, 'b': 1.0, 'c': 4.0, 'd': 5.0}
+        split = split_tests(
+            test_ids=['a', 'b', 'c', 'd', 'e'],
+            shards=2,
+            durations=durations,
+        )
+        # ``e`` has no known duration so it is assumed to take the mean
+        # duration, 5 seconds.
+        assert split == [['a', 'c'], ['b', 'd', 'e']]
+
+    def test_no_shards(self) -> None:
+        """
+        There must be at least one shard.
+        """
+        with pytest.raises(ValueError):
+            split_tests(test_ids=['a'], shards=0)
@@ -0,0 +1,68 @@
+"""
+Tests for sharing clusters between processes.
+"""
+
+from subprocess import CalledProcessError
+
+import pytest
+
+from dcos_e2e.cluster import (
+    Backends,
+    Cluster,
+    UnsupportedOperation,
+    wait_for_teardown,
+)
+from dcos_e2e.sharing import find_shared_cluster, shared_cluster
+
+
+class TestClusterSharing:
+    """
+    Tests for sharing clusters between processes.
+    """
+
+    def test_attach(self) -> None:
+        """
+        A shared cluster can be attached to, and it is destroyed when the
+        last owner detaches.
+        """
+        cluster = Cluster(backend=Backends.FAKE, agents=0, public_agents=0)
+        cluster_id = cluster.share()
+        assert cluster_id == cluster.cluster_id
+        (master, ) = cluster.masters
+
+        attached = Cluster.attach(cluster_id=cluster_id)
+        (attached_master, ) = attached.masters
+        assert attached_master.ip_address == master.ip_address
+        result = attached_master.run_as_root(args=['echo', 'hello'])
+        assert result.stdout.strip() == b'hello'
+
+        with pytest.raises(UnsupportedOperation):
+            attached.snapshot(name='attached')
+        with pytest.raises(UnsupportedOperation):
+            attached.reconfigure(extra_config={})
+        with pytest.raises(UnsupportedOperation):
+            attached.scale_agents(agents=1)
+
+        assert attached.detach() is None
+        master.run_as_root(args=['true'])
+
+        future = cluster.detach()
+        assert future is not None
+        future.result()
+        with pytest.raises(CalledProcessError):
+            master.run_as_root(args=['true'])
+
+    def test_shared_cluster(self) -> None:
+        """
+        ``shared_cluster`` creates a cluster with a given name, and later
+        calls with the same name attach to it.
+        """
+        name = 'test-shared-cluster'
+        kwargs = {'backend': Backends.FAKE, 'agents': 0, 'public_agents': 0}
+        with shared_cluster(name=name, **kwargs) as creator:
+            assert find_shared_cluster(name=name) == creator.cluster_id
+            with shared_cluster(name=name, **kwargs) as attached:
+                assert attached.cluster_id == creator.cluster_id
+
+        wait_for_teardown()
+        assert find_shared_cluster(name=name) is None
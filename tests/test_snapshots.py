@@ -0,0 +1,99 @@
+"""
+Tests for cluster snapshots.
+"""
+
+from pathlib import Path
+
+import docker
+import pytest
+
+from dcos_e2e.cluster import (
+    Cluster,
+    SnapshotRestoreError,
+    remove_snapshot,
+    wait_for_teardown,
+)
+
+
+class TestSnapshot:
+    """
+    Tests for creating clusters from snapshots.
+    """
+
+    def test_snapshot_and_restore(self) -> None:
+        """
+        A cluster created from a snapshot has the state of the cluster which
+        the snapshot was taken from.
+        """
+        name = 'test-snapshot-and-restore'
+        path = '/etc/snapshot_example'
+        with Cluster(agents=0, public_agents=0) as cluster:
+            (master, ) = cluster.masters
+            master.run_as_root(args=['touch', path])
+            cluster.snapshot(name=name)
+
+        try:
+            with Cluster.from_snapshot(name=name) as cluster:
+                (master, ) = cluster.masters
+                master.run_as_root(args=['test', '-f', path])
+        finally:
+            remove_snapshot(name=name)
+
+        with pytest.raises(SnapshotRestoreError):
+            Cluster.from_snapshot(name=name)
+
+    def test_restore_after_destroy(self) -> None:
+        """
+        A snapshot can be restored after the cluster which it was taken from
+        is destroyed, and files which were bind mounted from that cluster's
+        directory are bind mounted from the new cluster's directory.
+        """
+        name = 'test-restore-after-source-destroyed'
+        with Cluster(agents=0, public_agents=0) as cluster:
+            old_cluster_id = cluster.cluster_id
+            cluster.snapshot(name=name)
+
+        # The source cluster's directory is removed by its teardown.
+        wait_for_teardown()
+        client = docker.from_env()
+        try:
+            with Cluster.from_snapshot(name=name) as cluster:
+                (master, ) = cluster.masters
+                master.run_as_root(args=['echo', 'hello'])
+                containers = client.containers.list(
+                    filters={'name': cluster.cluster_id},
+                )
+                assert containers
+                for container in containers:
+                    for mount in container.attrs['Mounts']:
+                        if mount['Type'] != 'bind':
+                            continue
+                        assert old_cluster_id not in mount['Source']
+                        assert Path(mount['Source']).exists()
+        finally:
+            remove_snapshot(name=name)
+
+    def test_address_in_use(self) -> None:
+        """
+        A snapshot cannot be restored while a container has an IP address
+        which a node in the snapshot needs.
+        """
+        name = 'test-snapshot-address-in-use'
+        with Cluster(agents=0, public_agents=0) as cluster:
+            cluster.snapshot(name=name)
+            try:
+                with pytest.raises(SnapshotRestoreError):
+                    Cluster.from_snapshot(name=name)
+            finally:
+                remove_snapshot(name=name)
+
+    @pytest.mark.parametrize('name', ['', '..', 'nested/name', '../name'])
+    def test_invalid_name(self, name: str) -> None:
+        """
+        Snapshot names must be one path component, so that snapshots are
+        only read from the snapshots directory.
+        """
+        with pytest.raises(ValueError):
+            Cluster.from_snapshot(name=name)
+        with pytest.raises(ValueError):
+            remove_snapshot(name=name)
@@ -0,0 +1,34 @@
+"""
+Tests for running subprocesses.
+"""
+
+from typing import IO, List
+
+from dcos_e2e._common import run_streaming_subprocess
+
+
+class TestStreamingSubprocess:
+    """
+    Tests for running processes whose input and output are streams.
+    """
+
+    def test_large_input_and_output(self) -> None:
+        """
+        A process which writes more output than a pipe holds before it has
+        read all of its input does not block.
+        """
+        data = b'x' * 1024 * 1024
+        output = []  # type: List[bytes]
+
+        def write_data(stream: IO[bytes]) -> None:
+            stream.write(data)
+
+        def read_output(stream: IO[bytes]) -> None:
+            output.append(stream.read())
+
+        run_streaming_subprocess(
+            args=['cat'],
+            write_stdin=write_data,
+            read_stdout=read_output,
+        )
+        assert output == [data]
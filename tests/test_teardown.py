@@ -0,0 +1,60 @@
+"""
+Tests for destroying clusters in the background.
+"""
+
+from subprocess import CalledProcessError
+
+import docker
+import pytest
+
+from dcos_e2e._dcos_docker import DCOS_Docker
+from dcos_e2e.cluster import Backends, Cluster
+
+from .utils import dcos_docker_kwargs
+
+
+class TestTeardown:
+    """
+    Tests for destroying clusters in the background.
+    """
+
+    def test_destroy_in_background(self) -> None:
+        """
+        ``destroy`` returns before the cluster is destroyed, with a future
+        which is done when the cluster is destroyed.
+        """
+        cluster = Cluster(backend=Backends.FAKE, agents=0, public_agents=0)
+        (master, ) = cluster.masters
+        future = cluster.destroy()
+        future.result()
+        assert 'destroy' in [timing.phase for timing in cluster.timings]
+
+        with pytest.raises(CalledProcessError):
+            master.run_as_root(args=['echo', 'hello'])
+
+    def test_destroy_incomplete_cluster(self) -> None:
+        """
+        A cluster which does not have all of its nodes, for example because
+        creating it failed, is destroyed even if SSH connections are reused.
+        """
+        backend = DCOS_Docker(
+            **dcos_docker_kwargs(
+                agents=1,
+                reuse_ssh_connections=True,
+            )
+        )
+        client = docker.from_env()
+        filters = {'name': backend.cluster_id}
+        # Only some nodes are created.
+        backend._make(target='start')  # pylint: disable=protected-access
+        (agent, ) = [
+            container
+            for container in client.containers.list(filters=filters)
+            if 'agent' in container.name
+        ]
+        agent.remove(force=True)
+        with pytest.raises(ValueError):
+            backend.agents  # pylint: disable=pointless-statement
+
+        backend.destroy()
+        assert not client.containers.list(all=True, filters=filters)
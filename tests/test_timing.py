@@ -0,0 +1,105 @@
+"""
+Tests for timing the phases of a cluster's lifecycle.
+"""
+
+import asyncio
+from typing import List, Set
+
+import pytest
+
+from dcos_e2e.async_cluster import AsyncCluster
+from dcos_e2e.cluster import Backends, Cluster, wait_for_teardown
+from dcos_e2e.timing import PhaseTimer, PhaseTiming
+
+
+class TestTiming:
+    """
+    Tests for timing phases of a cluster's lifecycle.
+    """
+
+    def test_phases_timed(self) -> None:
+        """
+        Each phase of creating, using and destroying a cluster is timed and
+        given to the ``on_phase`` callback.
+        """
+        timings = []  # type: List[PhaseTiming]
+        with Cluster(
+            extra_config={},
+            agents=0,
+            public_agents=0,
+            on_phase=timings.append,
+        ) as cluster:
+            (master, ) = cluster.masters
+            master.run_as_root(args=['true'])
+
+        # The cluster is destroyed in the background.
+        wait_for_teardown()
+
+        def phases(timings: List[PhaseTiming]) -> Set[str]:
+            return set(timing.phase for timing in timings)
+
+        assert timings == cluster.timings
+        assert phases(timings) >= {
+            'prepare',
+            'make_start',
+            'make_genconf',
+            'make_install',
+            'run_as_root',
+            'destroy',
+        }
+        assert all(timing.succeeded for timing in timings)
+        assert 'make_install' in cluster.timing_report()
+
+    def test_failed_phase(self) -> None:
+        """
+        A phase which raises an exception is recorded as not succeeding.
+        """
+        timer = PhaseTimer()
+        with pytest.raises(ValueError):
+            with timer.phase('example'):
+                raise ValueError()
+
+        (timing, ) = timer.timings
+        assert timing.phase == 'example'
+        assert not timing.succeeded
+        assert timer.durations() == {'example': [timing.duration]}
+
+    def test_recent_timings_kept(self) -> None:
+        """
+        Only the most recent timings are kept, but the report counts every
+        phase.
+        """
+        timer = PhaseTimer(max_timings=2)
+        for name in ('first', 'second', 'second'):
+            with timer.phase(name):
+                pass
+
+        assert [timing.phase for timing in timer.timings] == [
+            'second',
+            'second',
+        ]
+        (_, first, second) = timer.report().splitlines()
+        assert first.split()[:2] == ['first', '1']
+        assert second.split()[:2] == ['second', '2']
+
+    def test_async_commands_timed(self) -> None:
+        """
+        Commands run on the nodes of an ``AsyncCluster`` are timed.
+        """
+
+        async def use_cluster() -> List[PhaseTiming]:
+            """
+            Create a cluster and run a command on its master.
+            """
+            async with AsyncCluster(
+                agents=0,
+                public_agents=0,
+                backend=Backends.FAKE,
+            ) as cluster:
+                (master, ) = cluster.masters
+                await master.run_as_root(args=['true'])
+            return cluster.timings
+
+        loop = asyncio.get_event_loop()
+        timings = loop.run_until_complete(use_cluster())
+        assert 'run_as_root' in [timing.phase for timing in timings]
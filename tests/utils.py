@@ -0,0 +1,32 @@
+"""
+Helpers for tests of the test harness.
+"""
+
+from pathlib import Path
+from typing import Any, Dict
+
+
+def dcos_docker_kwargs(**kwargs: Any) -> Dict[str, Any]:
+    """
+    Return keyword arguments to create a ``DCOS_Docker`` backend with, for
+    tests which use the backend without a ``Cluster``.
+
+    By default, the backend is for a cluster with one master and no other
+    nodes.
+
+    Args:
+        kwargs: Keyword arguments which replace the defaults.
+    """
+    defaults = {
+        'masters': 1,
+        'agents': 0,
+        'public_agents': 0,
+        'extra_config': {},
+        'generate_config_path': Path('/tmp/dcos_generate_config.sh'),
+        'dcos_docker_path': Path('/tmp/dcos-docker'),
+        'custom_ca_key': None,
+        'log_output_live': False,
+        'files_to_copy_to_installer': {},
+    }  # type: Dict[str, Any]
+    defaults.update(kwargs)
+    return defaults